@@ -89,10 +89,11 @@ class TemporaryDownloadedFile(TemporaryUploadedFile):
 
     The FileSystemStorage backend treats this object the same as a TemporaryUploadedFile. The
     storage backend attempts to link the file to its final location. If the final location is on a
-    different physical drive, the file is copied to its final destination.
+    different physical drive, the file is copied to its final destination. Only files owned by Pulp
+    are moved.
     """
 
-    def __init__(self, file, name=None):
+    def __init__(self, file, name=None, owned=True):
         """
         A constructor that does not create a blank temporary file.
 
@@ -102,8 +103,11 @@ class TemporaryDownloadedFile(TemporaryUploadedFile):
         Args:
             file (file): An open file
             name (str): Name of the file
+            owned (bool): Whether the file was created by Pulp, so it may be moved into the
+                storage.
         """
         self.file = file
+        self.owned = owned
         if name is None:
             name = getattr(file, "name", None)
         self.name = name
@@ -0,0 +1,126 @@
+from gettext import gettext as _
+import random
+import time
+
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+
+from pulpcore.app.models import (
+    Content,
+    Repository,
+    RepositoryContent,
+    RepositoryVersion,
+    RepositoryVersionContentSnapshot,
+)
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    """
+    Django management command for timing the content queries of repository versions.
+    """
+
+    help = _(
+        "Time the content queries of repository versions with and without content snapshots on a "
+        "synthetic repository with a deep version history. Everything is created in a transaction "
+        "which is rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--content", type=int, default=100000, help=_("The content units of each version.")
+        )
+        parser.add_argument(
+            "--versions", type=int, default=100, help=_("The number of versions to create.")
+        )
+        parser.add_argument(
+            "--churn",
+            type=int,
+            default=1000,
+            help=_("The content units removed and added by each version."),
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=5, help=_("The number of times each query is timed.")
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._benchmark(**options)
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def _benchmark(self, content, versions, churn, repeat, **options):
+        self.stdout.write(
+            _("Creating {versions} versions of {content} content units...").format(
+                versions=versions, content=content
+            )
+        )
+        units = [Content(pulp_type="core.benchmark") for i in range(content + versions * churn)]
+        Content.objects.bulk_create(units, batch_size=10000)
+        pks = [unit.pk for unit in units]
+
+        repository = Repository.objects.create(name="benchmark-{}".format(time.time()))
+        present = pks[:content]
+        unused = pks[content:]
+        version = self._create_version(repository, add=present)
+        for i in range(versions - 1):
+            removed = random.sample(present, churn)
+            added, unused = unused[:churn], unused[churn:]
+            removed_set = set(removed)
+            present = [pk for pk in present if pk not in removed_set] + added
+            version = self._create_version(repository, add=added, remove=removed)
+
+        # Autovacuum does not see the rows of this transaction, so the planner would assume the
+        # tables are empty.
+        with connection.cursor() as cursor:
+            for model in (Content, RepositoryContent, RepositoryVersionContentSnapshot):
+                cursor.execute("ANALYZE {}".format(model._meta.db_table))
+
+        latest = RepositoryVersion.objects.get(pk=version.pk)
+        first = repository.versions.get(number=1)
+        contained = Content(pk=random.choice(present))
+
+        queries = [
+            (_("count content"), lambda v: v.content.count()),
+            (_("list content pks"), lambda v: len(list(v.content.values_list("pk", flat=True)))),
+            (_("contains"), lambda v: v.contains(contained)),
+            (_("added since first version"), lambda v: v.added(first).count()),
+            (_("removed since first version"), lambda v: v.removed(first).count()),
+        ]
+        self.stdout.write(
+            "{:<32}{:>16}{:>16}".format(_("query"), _("relations (ms)"), _("snapshot (ms)"))
+        )
+        for name, query in queries:
+            timings = []
+            for snapshot in (False, True):
+                latest._content_snapshot_exists = first._content_snapshot_exists = snapshot
+                timings.append(self._time(query, latest, repeat))
+            self.stdout.write("{:<32}{:>16.1f}{:>16.1f}".format(name, *timings))
+
+    @staticmethod
+    def _create_version(repository, add=(), remove=()):
+        version = repository.new_version()
+        if remove:
+            version.remove_content(Content.objects.filter(pk__in=remove))
+        if add:
+            version.add_content(Content.objects.filter(pk__in=add))
+        version.complete = True
+        version.save()
+        repository.next_version = version.number + 1
+        repository.save()
+        version._create_content_snapshot()
+        return version
+
+    @staticmethod
+    def _time(query, version, repeat):
+        # Run the query once to warm up the caches.
+        query(version)
+        started = time.perf_counter()
+        for i in range(repeat):
+            query(version)
+        return (time.perf_counter() - started) / repeat * 1000
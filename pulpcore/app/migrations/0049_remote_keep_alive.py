@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-17 07:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0048_fips_checksums'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='remote',
+            name='keep_alive',
+            field=models.BooleanField(default=True),
+        ),
+    ]
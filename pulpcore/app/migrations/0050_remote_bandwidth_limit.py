@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-17 07:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0049_remote_keep_alive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='remote',
+            name='bandwidth_limit',
+            field=models.PositiveIntegerField(null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.28 on 2026-10-17 07:34
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0050_remote_bandwidth_limit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='profile',
+            field=django.contrib.postgres.fields.jsonb.JSONField(null=True),
+        ),
+    ]
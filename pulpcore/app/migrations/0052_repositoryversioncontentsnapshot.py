@@ -0,0 +1,22 @@
+# Generated by Django 2.2.28 on 2026-10-17 07:40
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0051_task_profile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RepositoryVersionContentSnapshot',
+            fields=[
+                ('repository_version', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='content_snapshot', serialize=False, to='core.RepositoryVersion')),
+                ('content_ids', django.contrib.postgres.fields.ArrayField(base_field=models.UUIDField(), size=None)),
+            ],
+        ),
+    ]
@@ -45,6 +45,7 @@ from .repository import (  # noqa
     RepositoryContent,
     RepositoryVersion,
     RepositoryVersionContentDetails,
+    RepositoryVersionContentSnapshot,
 )
 
 from .status import ContentAppStatus  # noqa
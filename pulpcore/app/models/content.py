@@ -16,7 +16,7 @@ from itertools import chain
 from django.conf import settings
 from django.core import validators
 from django.core.files.storage import default_storage
-from django.db import IntegrityError, models, transaction
+from django.db import IntegrityError, connections, models, transaction
 from django.forms.models import model_to_dict
 
 from pulpcore.constants import ALL_KNOWN_CONTENT_CHECKSUMS
@@ -66,33 +66,223 @@ class BulkCreateManager(models.Manager):
         """
         Insert the list of objects into the database and get existing objects from the database.
 
-        Do *not* call save() on each of the instances, do not send any pre/post_save signals,
-        and do not set the primary key attribute if it is an autoincrement field (except if
-        features.can_return_ids_from_bulk_insert=True). Multi-table models are not supported.
+        Do *not* call save() on each of the instances and do not send any pre/post_save signals.
+        Multi-table models are not supported, see bulk_get_or_create_detail().
 
-        If an IntegrityError is raised while performing a bulk insert, this method falls back to
-        inserting each instance individually. The already-existing instances are retrieved from
-        the database and returned with the other newly created instances.
+        Rows conflicting with existing ones are skipped (ON CONFLICT DO NOTHING), and the
+        already-existing instances are retrieved from the database with a single query and
+        returned with the other newly created instances. Only the instances which cannot be
+        matched to an existing one are then inserted individually.
 
         Args:
             objs (iterable of models.Model): an iterable of Django Model instances
             batch_size (int): how many are created in a single query
 
         Returns:
-            List of instances that were inserted into the database.
+            List of instances that were inserted into, or retrieved from, the database, in the
+            order of `objs`.
         """
         objs = list(objs)
+        if not objs:
+            return objs
+        inserted = self._insert_ignoring_conflicts(self.model, objs, batch_size=batch_size)
+        conflicting = []
+        for i, obj in enumerate(objs):
+            if obj.pk in inserted:
+                obj._state.adding = False
+                obj._state.db = self.db
+            else:
+                conflicting.append(i)
+        for i, existing in zip(conflicting, self._get_existing([objs[i] for i in conflicting])):
+            objs[i] = existing or self._get_or_create(objs[i])
+        return objs
+
+    def bulk_get_or_create_detail(self, objs, batch_size=None):
+        """
+        Insert the list of detail objects into the database and get existing ones from it.
+
+        Django's bulk_create() does not support multi-table models, so the rows of each table are
+        inserted in bulk, from the master table down to the detail table. Detail rows conflicting
+        with existing ones are skipped, the existing objects are retrieved from the database with
+        a single query and returned in place of the unsaved ones, and the parent rows inserted for
+        them are deleted.
+
+        Like bulk_get_or_create(), do *not* call save() on each of the instances and do not send
+        any pre/post_save signals. All the objects must be of the model of this manager.
+
+        Args:
+            objs (iterable of MasterModel): an iterable of detail model instances
+            batch_size (int): how many are created in a single query
+
+        Returns:
+            List of instances that were inserted into, or retrieved from, the database, in the
+            order of `objs`.
+        """
+        model = self.model
+        objs = list(objs)
+        if not objs:
+            return objs
+
+        for obj in objs:
+            if not obj.pulp_type:
+                obj.pulp_type = obj.get_pulp_type()
+        parent_models = list(reversed(model._meta.get_parent_list()))
+        for table_model in parent_models + [model]:
+            for parent, link in table_model._meta.parents.items():
+                for obj in objs:
+                    setattr(obj, link.attname, getattr(obj, parent._meta.pk.attname))
+
+        for table_model in parent_models:
+            table_model._base_manager.using(self.db).bulk_create(objs, batch_size=batch_size)
+        inserted = self._insert_ignoring_conflicts(model, objs, batch_size=batch_size)
+        conflicting = []
+        for i, obj in enumerate(objs):
+            if obj.pk in inserted:
+                obj._state.adding = False
+                obj._state.db = self.db
+            else:
+                # bulk_create() marked the object as saved along with its parent rows.
+                obj._state.adding = True
+                conflicting.append(i)
+        if not conflicting:
+            return objs
+
+        # Parent rows were inserted for objects whose detail row already existed.
+        orphans = [objs[i].pk for i in conflicting]
+        for table_model in reversed(parent_models):
+            table_model._base_manager.using(self.db).filter(pk__in=orphans)._raw_delete(self.db)
+        for i, existing in zip(conflicting, self._get_existing([objs[i] for i in conflicting])):
+            objs[i] = existing or self._get_or_create(objs[i])
+        return objs
+
+    def _insert_ignoring_conflicts(self, model, objs, batch_size=None):
+        """
+        Insert the rows of the table of a model, skipping those conflicting with existing rows.
+
+        Only the fields local to the table of `model` are inserted. The rows are inserted in the
+        order of their unique key, so concurrent inserts of the same rows wait for each other
+        instead of deadlocking.
+
+        The statement is built from the public field APIs rather than with Django's InsertQuery,
+        whose support for conflicts and returned primary keys changes between Django versions.
+
+        Args:
+            model (models.Model): The model whose table the rows are inserted into
+            objs (list of models.Model): The instances to insert
+            batch_size (int): how many are inserted in a single query
+
+        Returns:
+            set: The primary keys of the rows inserted.
+        """
+        connection = connections[self.db]
+        opts = model._meta
+        fields = opts.local_concrete_fields
+        batch_size = batch_size or max(connection.ops.bulk_batch_size(fields, objs), 1)
+        unique_keys = self._unique_keys(model)
+        if unique_keys:
+            objs = sorted(objs, key=lambda obj: tuple(str(getattr(obj, a)) for a in unique_keys[0]))
+        quote_name = connection.ops.quote_name
+        table = quote_name(opts.db_table)
+        columns = ", ".join(quote_name(field.column) for field in fields)
+        row = "({})".format(", ".join(["%s"] * len(fields)))
+        inserted = set()
+        with connection.cursor() as cursor:
+            for i in range(0, len(objs), batch_size):
+                batch = objs[i : i + batch_size]
+                params = [
+                    field.get_db_prep_save(field.pre_save(obj, True), connection=connection)
+                    for obj in batch
+                    for field in fields
+                ]
+                # Have the database return the primary keys of the rows actually inserted.
+                cursor.execute(
+                    "INSERT INTO {table} ({columns}) VALUES {rows} "
+                    "ON CONFLICT DO NOTHING RETURNING {pk}".format(
+                        table=table,
+                        columns=columns,
+                        rows=", ".join([row] * len(batch)),
+                        pk=quote_name(opts.pk.column),
+                    ),
+                    params,
+                )
+                inserted.update(opts.pk.to_python(returned[0]) for returned in cursor.fetchall())
+        return inserted
+
+    @staticmethod
+    def _unique_keys(model):
+        """
+        Get the unique keys of a model.
+
+        Args:
+            model (models.Model): The model
+
+        Returns:
+            list: The tuples of the attnames of the unique together fields and unique fields,
+                except the primary key.
+        """
+        opts = model._meta
+        unique_keys = [
+            tuple(opts.get_field(name).attname for name in names) for names in opts.unique_together
+        ]
+        unique_keys += [
+            (field.attname,)
+            for field in opts.concrete_fields
+            if field.unique and not field.primary_key
+        ]
+        return unique_keys
+
+    def _get_existing(self, objs):
+        """
+        Get the existing objects which conflict with unsaved objects, with a single query.
+
+        Objects conflict when they have the same values for any of the unique fields or unique
+        together fields of the model.
+
+        Args:
+            objs (list of models.Model): The unsaved instances
+
+        Returns:
+            list: The existing instance conflicting with each of `objs`, or None.
+        """
+        unique_keys = self._unique_keys(self.model)
+
+        def keys(obj):
+            for key in unique_keys:
+                values = tuple(getattr(obj, attname) for attname in key)
+                if None not in values:
+                    yield key, values
+
+        q = models.Q(pk__in=[])
+        for obj in objs:
+            for key, values in keys(obj):
+                q |= models.Q(**dict(zip(key, values)))
+        existing_by_key = {}
+        if objs:
+            for existing in self.filter(q).iterator():
+                for key, values in keys(existing):
+                    existing_by_key[key, values] = existing
+        return [
+            next((existing_by_key[k] for k in keys(obj) if k in existing_by_key), None)
+            for obj in objs
+        ]
+
+    @staticmethod
+    def _get_or_create(obj):
+        """
+        Save an object, or get the existing object if saving it fails.
+
+        Args:
+            obj (models.Model): The unsaved instance
+
+        Returns:
+            The instance saved, or the existing one.
+        """
         try:
             with transaction.atomic():
-                return super().bulk_create(objs, batch_size=batch_size)
+                obj.save()
         except IntegrityError:
-            for i in range(len(objs)):
-                try:
-                    with transaction.atomic():
-                        objs[i].save()
-                except IntegrityError:
-                    objs[i] = objs[i].__class__.objects.get(objs[i].q())
-        return objs
+            obj = obj.__class__.objects.get(obj.q())
+        return obj
 
 
 class QueryMixin:
@@ -313,6 +503,31 @@ class Artifact(HandleTempFilesMixin, BaseModel):
         temp_file.delete()
         return artifact
 
+    def fill_missing_digests(self):
+        """
+        Compute the digests of the file which are not set, and store them in the database.
+
+        Artifacts downloaded while ``LAZY_ARTIFACT_DIGESTS`` is enabled only have their sha256
+        digest and their expected digests set.
+
+        Returns:
+            list: The names of the digests filled.
+        """
+        missing = [algorithm for algorithm in self.DIGEST_FIELDS if not getattr(self, algorithm)]
+        if not missing:
+            return missing
+
+        hashers = {algorithm: hashlib.new(algorithm) for algorithm in missing}
+        with self.file.open("rb"):
+            for chunk in self.file.chunks():
+                for hasher in hashers.values():
+                    hasher.update(chunk)
+        digests = {algorithm: hasher.hexdigest() for algorithm, hasher in hashers.items()}
+        Artifact.objects.filter(pk=self.pk).update(**digests)
+        for algorithm, digest in digests.items():
+            setattr(self, algorithm, digest)
+        return missing
+
 
 class PulpTemporaryFile(HandleTempFilesMixin, BaseModel):
     """
@@ -4,10 +4,24 @@ from gettext import gettext as _
 from django.conf import settings
 from django.db.models import FileField, Lookup
 from django.db.models.fields import Field
+from django.db.models.fields.files import FieldFile
 
 from pulpcore.app.files import TemporaryDownloadedFile
 
 
+class ArtifactFieldFile(FieldFile):
+    """
+    The FieldFile of an ArtifactFileField.
+
+    Attributes:
+        owned (bool): Whether the file was created by Pulp, e.g. downloaded to a temporary file, so
+            it may be moved into the storage. Set it to False for files which must be left in place,
+            e.g. read by the FileDownloader, which are then linked or copied. Defaults to True.
+    """
+
+    owned = True
+
+
 class ArtifactFileField(FileField):
     """
     A custom FileField that always saves files to location specified by 'upload_to'.
@@ -16,6 +30,8 @@ class ArtifactFileField(FileField):
     moved or copied to the location specified by 'upload_to' field parameter.
     """
 
+    attr_class = ArtifactFieldFile
+
     def pre_save(self, model_instance, add):
         """
         Return FieldFile object which specifies path to the file to be stored in database.
@@ -48,7 +64,9 @@ class ArtifactFileField(FileField):
             artifact_storage_path,
             os.path.join(settings.MEDIA_ROOT, artifact_storage_path),
         ]
-        is_in_artifact_storage = file.name.startswith(os.path.join(settings.MEDIA_ROOT, "artifact"))
+        is_in_artifact_storage = file.name.startswith(
+            os.path.join(settings.MEDIA_ROOT, "artifact", "")
+        )
 
         if not already_in_place and is_in_artifact_storage:
             raise ValueError(
@@ -62,7 +80,7 @@ class ArtifactFileField(FileField):
         move = file._committed and file.name != artifact_storage_path
         if move:
             if not already_in_place:
-                file._file = TemporaryDownloadedFile(open(file.name, "rb"))
+                file._file = TemporaryDownloadedFile(open(file.name, "rb"), owned=file.owned)
             file._committed = False
 
         return super().pre_save(model_instance, add)
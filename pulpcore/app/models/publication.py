@@ -1,10 +1,12 @@
 from django.db import IntegrityError, models, transaction
+from django_lifecycle import hook
 
 from .base import MasterModel, BaseModel
 from .content import Artifact, Content, ContentArtifact
 from .repository import Remote, Repository, RepositoryVersion
 from .task import CreatedResource
 from pulpcore.app.files import PulpTemporaryUploadedFile
+from pulpcore.app.util import notify_content_app
 
 
 class Publication(MasterModel):
@@ -46,6 +48,11 @@ class Publication(MasterModel):
 
     repository_version = models.ForeignKey("RepositoryVersion", on_delete=models.CASCADE)
 
+    @hook("after_save")
+    @hook("after_delete")
+    def invalidate_content_app_cache(self):
+        notify_content_app()
+
     @classmethod
     def create(cls, repository_version, pass_through=False):
         """
@@ -244,6 +251,11 @@ class ContentGuard(MasterModel):
     name = models.TextField(db_index=True, unique=True)
     description = models.TextField(null=True)
 
+    @hook("after_save")
+    @hook("after_delete")
+    def invalidate_content_app_cache(self):
+        notify_content_app()
+
     def permit(self, request):
         """
         Authorize the specified web request.
@@ -286,6 +298,11 @@ class BaseDistribution(MasterModel):
     content_guard = models.ForeignKey(ContentGuard, null=True, on_delete=models.SET_NULL)
     remote = models.ForeignKey(Remote, null=True, on_delete=models.SET_NULL)
 
+    @hook("after_save")
+    @hook("after_delete")
+    def invalidate_content_app_cache(self):
+        notify_content_app()
+
     def content_handler(self, path):
         """
         Handler to serve extra, non-Artifact content for this Distribution
@@ -7,10 +7,14 @@ from os import path
 import logging
 
 import django
-from django.db import models, transaction
+from django.conf import settings
+from django.contrib.postgres.fields import ArrayField
+from django.db import connection, models, transaction
 from django.urls import reverse
+from django.utils import timezone
+from django_lifecycle import hook
 
-from pulpcore.app.util import batch_qs, get_view_name_for_model
+from pulpcore.app.util import batch_qs, get_view_name_for_model, notify_content_app
 from pulpcore.download.factory import DownloaderFactory
 from pulpcore.exceptions import ResourceImmutableError
 
@@ -54,6 +58,10 @@ class Repository(MasterModel):
     class Meta:
         verbose_name_plural = "repositories"
 
+    @hook("after_delete")
+    def invalidate_content_app_cache(self):
+        notify_content_app()
+
     def save(self, *args, **kwargs):
         """
         Saves Repository model and creates an initial repository version.
@@ -207,6 +215,10 @@ class Remote(MasterModel):
         password (models.TextField): The password to be used for authentication when syncing.
         download_concurrency (models.PositiveIntegerField): Total number of
             simultaneous connections.
+        keep_alive (models.BooleanField): If True, connections are kept alive and reused by
+            subsequent requests.
+        bandwidth_limit (models.PositiveIntegerField): The optional maximum number of bytes per
+            second downloaded from the remote.
         policy (models.TextField): The policy to use when downloading content.
     """
 
@@ -247,8 +259,15 @@ class Remote(MasterModel):
 
     proxy_url = models.TextField(null=True)
     download_concurrency = models.PositiveIntegerField(default=10)
+    keep_alive = models.BooleanField(default=True)
+    bandwidth_limit = models.PositiveIntegerField(null=True)
     policy = models.TextField(choices=POLICY_CHOICES, default=IMMEDIATE)
 
+    @hook("after_save")
+    @hook("after_delete")
+    def invalidate_content_app_cache(self):
+        notify_content_app()
+
     @property
     def download_factory(self):
         """
@@ -424,6 +443,13 @@ class RepositoryVersion(BaseModel):
         get_latest_by = "number"
         ordering = ("number",)
 
+    # Whether the version has a RepositoryVersionContentSnapshot, None until it is checked.
+    _content_snapshot_exists = None
+
+    @hook("after_delete")
+    def invalidate_content_app_cache(self):
+        notify_content_app()
+
     def _content_relationships(self):
         """
         Returns a set of repository_content for a repository version
@@ -454,7 +480,91 @@ class RepositoryVersion(BaseModel):
             >>>     ...
             >>>
         """
-        return Content.objects.filter(version_memberships__in=self._content_relationships())
+        return self._filter_content(Content.objects)
+
+    def _has_content_snapshot(self):
+        """
+        Snapshots are only looked up while ``REPOSITORY_VERSION_CONTENT_SNAPSHOTS`` is set, so
+        versions do not query for them otherwise.
+
+        Returns:
+            bool: Whether the version has a :class:`RepositoryVersionContentSnapshot` to use.
+        """
+        if self._content_snapshot_exists is None:
+            if not settings.REPOSITORY_VERSION_CONTENT_SNAPSHOTS or not self.complete:
+                return False
+            self._content_snapshot_exists = RepositoryVersionContentSnapshot.objects.filter(
+                repository_version=self
+            ).exists()
+        return self._content_snapshot_exists
+
+    def _content_snapshot_ids(self):
+        """
+        Returns:
+            django.db.models.QuerySet: The pks of the content of the version, from its
+                :class:`RepositoryVersionContentSnapshot`.
+        """
+        return (
+            RepositoryVersionContentSnapshot.objects.filter(repository_version=self)
+            .annotate(
+                content_id=models.Func(
+                    models.F("content_ids"), function="unnest", output_field=models.UUIDField()
+                )
+            )
+            .values("content_id")
+        )
+
+    def _filter_content(self, content_qs):
+        """
+        Restrict a Content queryset to the content of this version.
+
+        Args:
+            content_qs (django.db.models.QuerySet): The Content queryset to restrict.
+
+        Returns:
+            django.db.models.QuerySet: The content of `content_qs` contained within this version.
+        """
+        if self._has_content_snapshot():
+            return content_qs.filter(pk__in=self._content_snapshot_ids())
+        return content_qs.filter(version_memberships__in=self._content_relationships())
+
+    def _exclude_content(self, content_qs):
+        """
+        Exclude the content of this version from a Content queryset.
+
+        Args:
+            content_qs (django.db.models.QuerySet): The Content queryset to restrict.
+
+        Returns:
+            django.db.models.QuerySet: The content of `content_qs` not contained within this
+                version.
+        """
+        if self._has_content_snapshot():
+            return content_qs.exclude(pk__in=self._content_snapshot_ids())
+        return content_qs.exclude(version_memberships__in=self._content_relationships())
+
+    def _create_content_snapshot(self):
+        """
+        Store the pks of the content of this complete version in a
+        :class:`RepositoryVersionContentSnapshot`.
+        """
+        sql, params = (
+            self._content_relationships()
+            .order_by("content_id")
+            .values("content_id")
+            .query.sql_with_params()
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO {table} (repository_version_id, content_ids) "
+                "VALUES (%s, ARRAY({sql})) "
+                "ON CONFLICT (repository_version_id) DO UPDATE "
+                "SET content_ids = EXCLUDED.content_ids".format(
+                    table=RepositoryVersionContentSnapshot._meta.db_table, sql=sql
+                ),
+                (self.pk,) + params,
+            )
+        self._content_snapshot_exists = True
 
     def content_batch_qs(self, content_qs=None, order_by_params=("pk",), batch_size=1000):
         """
@@ -470,8 +580,10 @@ class RepositoryVersion(BaseModel):
             * This generator is not safe against changes (i.e. add/remove content) during
               the iteration!
 
-            * As the method uses slices internally, the queryset must be ordered to yield
-              stable results. By default, it is ordered by primary key.
+            * The batches are found by seeking past the ordering key of the previous batch, see
+              :func:`~pulpcore.app.util.batch_qs`, unless the ordering uses nullable fields or
+              fields of related models. The primary key is appended to the ordering to make it
+              unique. By default, it is ordered by primary key.
 
         Args:
             content_qs (:class:`django.db.models.QuerySet`): The queryset for Content that will be
@@ -509,9 +621,7 @@ class RepositoryVersion(BaseModel):
         """
         if content_qs is None:
             content_qs = Content.objects
-        version_content_qs = content_qs.filter(
-            version_memberships__in=self._content_relationships()
-        ).order_by(*order_by_params)
+        version_content_qs = self._filter_content(content_qs).order_by(*order_by_params)
         yield from batch_qs(version_content_qs, batch_size=batch_size)
 
     @property
@@ -535,9 +645,7 @@ class RepositoryVersion(BaseModel):
         if not base_version:
             return Content.objects.filter(version_memberships__version_added=self)
 
-        return Content.objects.filter(
-            version_memberships__in=self._content_relationships()
-        ).exclude(version_memberships__in=base_version._content_relationships())
+        return base_version._exclude_content(self.content)
 
     def removed(self, base_version=None):
         """
@@ -550,9 +658,7 @@ class RepositoryVersion(BaseModel):
         if not base_version:
             return Content.objects.filter(version_memberships__version_removed=self)
 
-        return Content.objects.filter(
-            version_memberships__in=base_version._content_relationships()
-        ).exclude(version_memberships__in=self._content_relationships())
+        return self._exclude_content(base_version.content)
 
     def contains(self, content):
         """
@@ -561,7 +667,8 @@ class RepositoryVersion(BaseModel):
         Returns:
             bool: True if the repository version contains the content, False otherwise
         """
-        return self.content.filter(pk=content.pk).exists()
+        # A lookup of one content unit by index is faster than a scan of the snapshot.
+        return self._content_relationships().filter(content_id=content.pk).exists()
 
     def add_content(self, content):
         """
@@ -578,27 +685,27 @@ class RepositoryVersion(BaseModel):
         if self.complete:
             raise ResourceImmutableError(self)
 
-        repo_content = []
-        to_add = set(content.exclude(pk__in=self.content).values_list("pk", flat=True))
-
         # Normalize representation if content has already been removed in this version and
         # is re-added: Undo removal by setting version_removed to None.
-        for removed in batch_qs(self.removed().order_by("pk").values_list("pk", flat=True)):
-            to_readd = to_add.intersection(set(removed))
-            if to_readd:
-                RepositoryContent.objects.filter(
-                    content__in=to_readd, repository=self.repository, version_removed=self
-                ).update(version_removed=None)
-                to_add = to_add - to_readd
-
-        for content_pk in to_add:
-            repo_content.append(
-                RepositoryContent(
-                    repository=self.repository, content_id=content_pk, version_added=self
-                )
-            )
+        RepositoryContent.objects.filter(
+            repository=self.repository, content_id__in=content, version_removed=self
+        ).update(version_removed=None)
 
-        RepositoryContent.objects.bulk_create(repo_content)
+        # Insert the relations of the content not in the version yet in a single statement. The
+        # pk of a relation is derived from its content and version, which are unique together.
+        to_add = content.exclude(pk__in=self.content).order_by().values("pk").distinct()
+        sql, params = to_add.query.sql_with_params()
+        now = timezone.now()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO {table} (pulp_id, pulp_created, pulp_last_updated, content_id, "
+                "repository_id, version_added_id) "
+                "SELECT md5(to_add.content_id::text || %s)::uuid, %s, %s, to_add.content_id, "
+                "%s, %s FROM ({sql}) AS to_add(content_id)".format(
+                    table=RepositoryContent._meta.db_table, sql=sql
+                ),
+                (str(self.pk), now, now, self.repository_id, self.pk) + params,
+            )
 
     def remove_content(self, content):
         """
@@ -615,7 +722,7 @@ class RepositoryVersion(BaseModel):
         if self.complete:
             raise ResourceImmutableError(self)
 
-        if not content or not content.count():
+        if content is None:
             return
 
         # Normalize representation if content has already been added in this version.
@@ -752,28 +859,97 @@ class RepositoryVersion(BaseModel):
         Count records are stored as :class:`~pulpcore.app.models.RepositoryVersionContentDetails`.
         This method deletes existing :class:`~pulpcore.app.models.RepositoryVersionContentDetails`
         objects and makes new ones with each call.
+
+        The present counts are the present counts of the previous version plus the added counts
+        minus the removed counts, so the cost is proportional to the changes of the version rather
+        than to the size of the repository.
         """
-        with transaction.atomic():
-            counts_list = []
-            for value, name in RepositoryVersionContentDetails.COUNT_TYPE_CHOICES:
-                RepositoryVersionContentDetails.objects.filter(repository_version=self).delete()
-                if value == RepositoryVersionContentDetails.ADDED:
-                    qs = self.added()
-                elif value == RepositoryVersionContentDetails.PRESENT:
-                    qs = self.content
-                elif value == RepositoryVersionContentDetails.REMOVED:
-                    qs = self.removed()
-                annotated = qs.values("pulp_type").annotate(count=models.Count("pulp_type"))
-                for item in annotated:
-                    count_obj = RepositoryVersionContentDetails(
-                        content_type=item["pulp_type"],
-                        repository_version=self,
-                        count=item["count"],
-                        count_type=value,
+        added = self._count_by_type(self.added())
+        removed = self._count_by_type(self.removed())
+        present = self._previous_present_counts()
+        if present is not None:
+            for content_type, count in added.items():
+                present[content_type] = present.get(content_type, 0) + count
+            for content_type, count in removed.items():
+                present[content_type] = present.get(content_type, 0) - count
+        if present is None or any(count < 0 for count in present.values()):
+            present = self._count_by_type(self.content)
+
+        counts_list = []
+        for count_type, counts in (
+            (RepositoryVersionContentDetails.ADDED, added),
+            (RepositoryVersionContentDetails.PRESENT, present),
+            (RepositoryVersionContentDetails.REMOVED, removed),
+        ):
+            for content_type, count in counts.items():
+                if count:
+                    counts_list.append(
+                        RepositoryVersionContentDetails(
+                            content_type=content_type,
+                            repository_version=self,
+                            count=count,
+                            count_type=count_type,
+                        )
                     )
-                    counts_list.append(count_obj)
+        with transaction.atomic():
+            RepositoryVersionContentDetails.objects.filter(repository_version=self).delete()
             RepositoryVersionContentDetails.objects.bulk_create(counts_list)
 
+    @staticmethod
+    def _count_by_type(content_qs):
+        """
+        Count content units by type.
+
+        Args:
+            content_qs (django.db.models.QuerySet): The content to count.
+
+        Returns:
+            dict: The number of content units of `content_qs`, keyed on their `pulp_type`.
+        """
+        annotated = content_qs.values("pulp_type").annotate(count=models.Count("pulp_type"))
+        return {item["pulp_type"]: item["count"] for item in annotated}
+
+    def _previous_present_counts(self):
+        """
+        Get the present counts of the previous version.
+
+        Returns:
+            dict: The number of content units of the previous version keyed on their type, which is
+                empty if there is no previous version, or None if the previous version has content
+                but no counts.
+        """
+        try:
+            previous = self.previous()
+        except RepositoryVersion.DoesNotExist:
+            return {}
+        counts = list(previous.counts.all())
+        if not counts and previous.content.exists():
+            return None
+        return {
+            count.content_type: count.count
+            for count in counts
+            if count.count_type == RepositoryVersionContentDetails.PRESENT
+        }
+
+    def _has_changes(self):
+        """
+        Check whether this version adds or removes content.
+
+        The relations of the version are looked up by index, without going through the content of
+        the repository. Stages add and remove content from several threads, so the relations are
+        always checked rather than counted on the instance.
+
+        Returns:
+            bool: True if the version adds or removes content, False otherwise.
+        """
+        return (
+            RepositoryContent.objects.filter(
+                models.Q(version_added=self) | models.Q(version_removed=self)
+            )
+            .order_by()
+            .exists()
+        )
+
     def __enter__(self):
         """
         Create the repository version
@@ -793,12 +969,11 @@ class RepositoryVersion(BaseModel):
             try:
                 repository = self.repository.cast()
                 repository.finalize_new_version(self)
-                no_change = not self.added() and not self.removed()
-                if no_change:
+                if not self._has_changes():
                     self.delete()
                 else:
                     content_types_seen = set(
-                        self.content.values_list("pulp_type", flat=True).distinct()
+                        self.added().values_list("pulp_type", flat=True).distinct()
                     )
                     content_types_supported = set(
                         ctype.get_pulp_type() for ctype in repository.CONTENT_TYPES
@@ -815,6 +990,8 @@ class RepositoryVersion(BaseModel):
                     self.repository.save()
                     self.save()
                     self._compute_counts()
+                    if settings.REPOSITORY_VERSION_CONTENT_SNAPSHOTS:
+                        self._create_content_snapshot()
             except Exception:
                 self.delete()
                 raise
@@ -823,6 +1000,34 @@ class RepositoryVersion(BaseModel):
         return "<Repository: {}; Version: {}>".format(self.repository.name, self.number)
 
 
+class RepositoryVersionContentSnapshot(models.Model):
+    """
+    The content of a complete repository version, stored in a single row.
+
+    The content of a version is otherwise the :class:`RepositoryContent` added up to and not
+    removed up to the version, which takes a range join over the whole history of the repository.
+    The snapshot keeps the sorted pks of the content of the version, which a query reads at once.
+    Snapshots are stored when versions complete if the ``REPOSITORY_VERSION_CONTENT_SNAPSHOTS``
+    setting is set, and versions without one keep using :class:`RepositoryContent`.
+
+    Fields:
+
+        content_ids (ArrayField): The sorted pks of the content of the version.
+
+    Relations:
+
+        repository_version (models.OneToOneField): The repository version.
+    """
+
+    repository_version = models.OneToOneField(
+        "RepositoryVersion",
+        primary_key=True,
+        related_name="content_snapshot",
+        on_delete=models.CASCADE,
+    )
+    content_ids = ArrayField(models.UUIDField())
+
+
 class RepositoryVersionContentDetails(models.Model):
     ADDED = "A"
     PRESENT = "P"
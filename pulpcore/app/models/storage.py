@@ -1,3 +1,5 @@
+import errno
+import fcntl
 import os
 from uuid import uuid4
 
@@ -6,14 +8,63 @@ from django.core.files import locks
 from django.core.files.move import file_move_safe
 from django.core.files.storage import FileSystemStorage
 
+# The FICLONE ioctl request of Linux, which clones a file on filesystems supporting reflinks.
+FICLONE = 0x40049409
+
+
+def _clone_or_copy_file(source_fd, destination_fd):
+    """
+    Copy the data of a file to another file in the kernel, without going through user space.
+
+    The file is cloned on filesystems supporting reflinks, e.g. XFS or Btrfs, so both files share
+    their data blocks until either of them is modified. Otherwise the data is copied with
+    sendfile().
+
+    Args:
+        source_fd (int): The file descriptor of the file to copy, open for reading.
+        destination_fd (int): The file descriptor of the empty file to copy to, open for writing.
+
+    Returns:
+        bool: False if the data could not be copied in the kernel, and nothing was copied.
+    """
+    try:
+        fcntl.ioctl(destination_fd, FICLONE, source_fd)
+        return True
+    except OSError:
+        pass
+
+    if not hasattr(os, "sendfile"):
+        return False
+    offset = 0
+    size = os.fstat(source_fd).st_size
+    while offset < size:
+        try:
+            sent = os.sendfile(destination_fd, source_fd, offset, size - offset)
+        except OSError as exc:
+            if offset == 0 and exc.errno in (
+                errno.EINVAL,
+                errno.ENOSYS,
+                errno.ENOTSOCK,
+                errno.EOPNOTSUPP,
+            ):
+                return False
+            raise
+        if not sent:
+            break
+        offset += sent
+    return True
+
 
 class FileSystem(FileSystemStorage):
     """
     Django's FileSystemStorage with modified _save() and get_available_name behaviors
 
-    The _save() will check if the file is saved in MEDIA_ROOT first. If it is, a move is used. This
-    will move all files created by the Downloaders and uploaded files from the user. If it is saved
-    in-memory or outside of MEDIA_ROOT, the data is written in chunks to the new location.
+    The _save() will check if the file is owned by Pulp and saved in MEDIA_ROOT first. If it is, a
+    move is used. This will move all files created by the Downloaders and uploaded files from the
+    user. Otherwise, e.g. for files read by the FileDownloader, even in MEDIA_ROOT, it is hard
+    linked when ``ARTIFACT_HARDLINKS`` is enabled, or cloned or copied by the kernel, and left in
+    place. If it is saved in-memory, or the kernel cannot copy it, the data is written in chunks to
+    the new location.
     """
 
     def get_available_name(self, name, max_length=None):
@@ -33,7 +84,8 @@ class FileSystem(FileSystemStorage):
 
     def _save(self, name, content, max_length=None):
         """
-        Create dirs to the destination, move the file if already in MEDIA_ROOT, or copy otherwise.
+        Create dirs to the destination, move the file if owned by Pulp and in MEDIA_ROOT, or link or
+        copy it otherwise.
 
         Args:
             name (str): Target path to which the file is copied.
@@ -61,11 +113,14 @@ class FileSystem(FileSystemStorage):
         except FileExistsError:
             raise FileExistsError("%s exists and is not a directory." % directory)
 
+        linked = False
         try:
-            if hasattr(content, "temporary_file_path") and content.temporary_file_path().startswith(
-                settings.MEDIA_ROOT
-            ):
+            if hasattr(content, "temporary_file_path") and self._movable(content):
                 file_move_safe(content.temporary_file_path(), full_path)
+            elif hasattr(content, "temporary_file_path") and self._link(
+                content.temporary_file_path(), full_path
+            ):
+                linked = True
             else:
                 # This is a normal uploaded file that we can stream.
 
@@ -74,11 +129,16 @@ class FileSystem(FileSystemStorage):
                 _file = None
                 try:
                     locks.lock(fd, locks.LOCK_EX)
-                    for chunk in content.chunks():
-                        if _file is None:
-                            mode = "wb" if isinstance(chunk, bytes) else "wt"
-                            _file = os.fdopen(fd, mode)
-                        _file.write(chunk)
+                    copied = False
+                    if hasattr(content, "temporary_file_path"):
+                        with open(content.temporary_file_path(), "rb") as source:
+                            copied = _clone_or_copy_file(source.fileno(), fd)
+                    if not copied:
+                        for chunk in content.chunks():
+                            if _file is None:
+                                mode = "wb" if isinstance(chunk, bytes) else "wt"
+                                _file = os.fdopen(fd, mode)
+                            _file.write(chunk)
                 finally:
                     locks.unlock(fd)
                     if _file is not None:
@@ -89,12 +149,53 @@ class FileSystem(FileSystemStorage):
             # It's a content addressable store so if the file is already in place we can do nothing
             pass
 
-        if self.file_permissions_mode is not None:
+        # Hard links share the permissions of the file linked, which is left untouched.
+        if self.file_permissions_mode is not None and not linked:
             os.chmod(full_path, self.file_permissions_mode)
 
         # Store filenames with forward slashes, even on Windows.
         return str(name).replace("\\", "/")
 
+    @staticmethod
+    def _movable(content):
+        """
+        Whether a temporary file can be moved into the storage.
+
+        Args:
+            content (File): A file with a `temporary_file_path()`.
+
+        Returns:
+            bool: True if the file is owned by Pulp and within MEDIA_ROOT.
+        """
+        return getattr(content, "owned", True) and content.temporary_file_path().startswith(
+            os.path.join(settings.MEDIA_ROOT, "")
+        )
+
+    def _link(self, source_path, full_path):
+        """
+        Hard link a file into the storage, if ``ARTIFACT_HARDLINKS`` is enabled.
+
+        Args:
+            source_path (str): The path of the file to link.
+            full_path (str): The absolute path of the link to create.
+
+        Returns:
+            bool: True if the file was linked. False when it is disabled, or when the file is on
+                another filesystem or cannot be linked.
+
+        Raises:
+            FileExistsError: When a file already exists at `full_path`.
+        """
+        if not settings.ARTIFACT_HARDLINKS:
+            return False
+        try:
+            os.link(source_path, full_path)
+        except FileExistsError:
+            raise
+        except OSError:
+            return False
+        return True
+
 
 def get_artifact_path(sha256digest):
     """
@@ -324,6 +324,8 @@ class Task(BaseModel, AutoDeleteObjPermsMixin, AutoAddObjPermsMixin):
         started_at (models.DateTimeField): The time the task started executing
         finished_at (models.DateTimeField): The time the task finished executing
         error (pulpcore.app.fields.JSONField): Fatal errors generated by the task
+        profile (pulpcore.app.fields.JSONField): Statistics of the work of the task, like the
+            profiles of the Stages API pipelines it ran
 
     Relations:
 
@@ -338,6 +340,7 @@ class Task(BaseModel, AutoDeleteObjPermsMixin, AutoAddObjPermsMixin):
     finished_at = models.DateTimeField(null=True)
 
     error = JSONField(null=True)
+    profile = JSONField(null=True)
     worker = models.ForeignKey("Worker", null=True, related_name="tasks", on_delete=models.SET_NULL)
 
     parent_task = models.ForeignKey(
@@ -107,6 +107,18 @@ class RemoteSerializer(ModelSerializer):
     download_concurrency = serializers.IntegerField(
         help_text="Total number of simultaneous connections.", required=False, min_value=1
     )
+    keep_alive = serializers.BooleanField(
+        help_text="If True, connections are kept alive and reused by subsequent requests. "
+        "Disable for servers which do not handle persistent connections correctly.",
+        required=False,
+    )
+    bandwidth_limit = serializers.IntegerField(
+        help_text="The maximum number of bytes per second downloaded from the remote, shared by "
+        "all of its downloads. Unlimited if not set.",
+        required=False,
+        allow_null=True,
+        min_value=1,
+    )
     policy = serializers.ChoiceField(
         help_text="The policy to use when downloading content.",
         choices=((models.Remote.IMMEDIATE, "When syncing, download all metadata and content now.")),
@@ -155,6 +167,8 @@ class RemoteSerializer(ModelSerializer):
             "password",
             "pulp_last_updated",
             "download_concurrency",
+            "keep_alive",
+            "bandwidth_limit",
             "policy",
         )
 
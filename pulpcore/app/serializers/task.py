@@ -69,6 +69,13 @@ class TaskSerializer(ModelSerializer):
         ),
         read_only=True,
     )
+    profile = serializers.JSONField(
+        help_text=_(
+            "A JSON Object of statistics of the work of this task, like the profiles of the "
+            "Stages API pipelines it ran."
+        ),
+        read_only=True,
+    )
     worker = RelatedField(
         help_text=_(
             "The worker associated with this task."
@@ -110,6 +117,7 @@ class TaskSerializer(ModelSerializer):
             "started_at",
             "finished_at",
             "error",
+            "profile",
             "worker",
             "parent_task",
             "child_tasks",
@@ -202,6 +202,17 @@ DRF_ACCESS_POLICY = {"reusable_conditions": "pulpcore.app.global_access_conditio
 
 CONTENT_PATH_PREFIX = "/pulp/content/"
 CONTENT_APP_TTL = 30
+CONTENT_APP_DB_THREADS = 10
+CONTENT_APP_DISTRIBUTION_CACHE_TTL = 60
+CONTENT_APP_CONTENT_ARTIFACT_CACHE_SIZE = 10000
+CONTENT_APP_DIRECTORY_INDEX_CACHE_SIZE = 32
+
+DOWNLOAD_KEEPALIVE_TIMEOUT = 15
+DOWNLOAD_HASHING_THREADS = None
+DOWNLOAD_BANDWIDTH_LIMIT = None
+DOWNLOAD_PARTIAL_FILE_MAX_AGE = 7 * 24 * 60 * 60  # 1 week
+LAZY_ARTIFACT_DIGESTS = False
+ARTIFACT_HARDLINKS = False
 
 REMOTE_USER_ENVIRON_NAME = "REMOTE_USER"
 
@@ -209,7 +220,13 @@ ALLOWED_IMPORT_PATHS = []
 
 ALLOWED_EXPORT_PATHS = []
 
-PROFILE_STAGES_API = False
+PROFILE_STAGES_API = True
+
+REPOSITORY_VERSION_CONTENT_SNAPSHOTS = False
+
+STAGES_API_QUEUE_MAXBYTES = 32 * 1024 * 1024  # 32 MB
+STAGES_API_DB_THREADS = 8
+STAGES_API_DB_BATCHES = 2
 
 SPECTACULAR_SETTINGS = {
     "SERVE_URLCONF": ROOT_URLCONF,
@@ -0,0 +1,41 @@
+import logging
+from gettext import gettext as _
+
+from django.db.models import Q
+
+from pulpcore.app.models import Artifact, ProgressReport
+
+log = logging.getLogger(__name__)
+
+
+def fill_missing_artifact_digests(artifact_pks=None):
+    """
+    Compute and store the digests missing from Artifacts.
+
+    Artifacts downloaded while ``LAZY_ARTIFACT_DIGESTS`` is enabled only have their sha256 digest
+    and their expected digests set. This fills in the other digests allowed by
+    ``ALLOWED_CONTENT_CHECKSUMS``.
+
+    Args:
+        artifact_pks (list): The primary keys of the Artifacts to fill, e.g. the ones a sync
+            downloaded. All the Artifacts missing digests are filled if None.
+    """
+    missing = Q()
+    for algorithm in Artifact.DIGEST_FIELDS:
+        missing |= Q(**{algorithm: None})
+    artifacts = Artifact.objects.filter(missing)
+    if artifact_pks is not None:
+        artifacts = artifacts.filter(pk__in=artifact_pks)
+
+    with ProgressReport(
+        message="Compute missing Artifact digests",
+        code="fill.artifact.digests",
+        total=artifacts.count(),
+    ) as progress_report:
+        for artifact in artifacts.iterator():
+            try:
+                artifact.fill_missing_digests()
+            except FileNotFoundError:
+                # The artifact was deleted by an orphan cleanup meanwhile.
+                log.warning(_("The file of {artifact} was not found.").format(artifact=artifact))
+            progress_report.increment()
@@ -6,6 +6,7 @@ from pulpcore.app.models import (
     ProgressReport,
     PublishedMetadata,
 )
+from pulpcore.download.partial import remove_stale_partial_downloads
 
 
 def queryset_iterator(qs, batchsize=2000, gc_collect=True):
@@ -33,7 +34,8 @@ def orphan_cleanup():
     """
     Delete all orphan Content and Artifact records.
     Go through orphan Content multiple times to remove content from subrepos.
-    This task removes Artifact files from the filesystem as well.
+    This task removes Artifact files from the filesystem as well, and the partial downloads not
+    resumed for ``DOWNLOAD_PARTIAL_FILE_MAX_AGE`` seconds.
 
     """
     progress_bar = ProgressReport(
@@ -89,3 +91,5 @@ def orphan_cleanup():
 
     progress_bar.state = "completed"
     progress_bar.save()
+
+    remove_stale_partial_downloads()
@@ -1,9 +1,13 @@
 from django.apps import apps
 from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connection
+from django.db.models import Q
 from pkg_resources import get_distribution
 
 from pulpcore.app.apps import pulp_plugin_configs
 from pulpcore.app import models
+from pulpcore.constants import CONTENT_APP_CACHE_CHANNEL
 
 # a little cache so viewset_for_model doesn't have iterate over every app every time
 _model_viewset_cache = {}
@@ -80,6 +84,12 @@ def batch_qs(qs, batch_size=1000):
     """
     Returns a queryset batch in the given queryset.
 
+    Each batch starts after the ordering key of the last record of the previous batch instead of
+    at an offset (keyset pagination), so every batch takes the same time to query however far into
+    the queryset it is. The primary key is appended to the ordering to make it unique. Querysets
+    ordered by expressions, by nullable fields or by fields of related models are batched with
+    offsets, since records whose key is null would never be selected after another key.
+
     Usage:
         # Make sure to order your querset
         article_qs = Article.objects.order_by('id')
@@ -87,12 +97,96 @@ def batch_qs(qs, batch_size=1000):
             for article in qs:
                 print article.body
     """
+    ordering = list(qs.query.order_by or qs.model._meta.ordering)
+    if not all(_is_keyset_field(qs.model, field) for field in ordering):
+        yield from _batch_qs_by_offset(qs, batch_size)
+        return
+
+    pk_names = {"pk", qs.model._meta.pk.name}
+    if not pk_names.intersection(field.lstrip("-") for field in ordering):
+        ordering.append("pk")
+    qs = qs.order_by(*ordering)
+    fields = [field.lstrip("-") for field in ordering]
+
+    start = None
+    while True:
+        batch = qs if start is None else qs.filter(_keyset_filter(ordering, start, after=True))
+        end = list(batch.values_list(*fields)[batch_size - 1 : batch_size])
+        if not end:
+            if batch.exists():
+                yield batch
+            return
+        start = end[0]
+        yield batch.filter(_keyset_filter(ordering, start, after=False))
+
+
+def _is_keyset_field(model, field):
+    """
+    Whether an order_by field can be part of the key of a keyset pagination.
+
+    Args:
+        model (django.db.models.Model): The model of the queryset.
+        field: The order_by field, or expression.
+
+    Returns:
+        bool: True for the non null, concrete fields of the model itself.
+    """
+    if not isinstance(field, str) or field == "?":
+        return False
+    name = field.lstrip("-")
+    if name == "pk":
+        return True
+    try:
+        model_field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return False
+    if not model_field.concrete or model_field.null:
+        return False
+    # Ordering by a relation orders by the ordering of the related model, not by its key.
+    return not model_field.is_relation or name == model_field.attname
+
+
+def _batch_qs_by_offset(qs, batch_size):
     total = qs.count()
     for start in range(0, total, batch_size):
         end = min(start + batch_size, total)
         yield qs[start:end]
 
 
+def _keyset_filter(ordering, key, after):
+    """
+    Build the filter selecting the records ordered after, or up to, a key.
+
+    Args:
+        ordering (list): The order_by fields, "-" prefixed when descending.
+        key (tuple): The values of the fields of the key.
+        after (bool): Whether to select the records after the key, or the records up to and
+            including the key.
+
+    Returns:
+        django.db.models.Q: The filter.
+    """
+    q = Q() if after else Q(**{field.lstrip("-"): value for field, value in zip(ordering, key)})
+    equal = {}
+    for field, value in zip(ordering, key):
+        name = field.lstrip("-")
+        lookup = "gt" if field.startswith("-") != after else "lt"
+        q |= Q(**equal, **{"{}__{}".format(name, lookup): value})
+        equal[name] = value
+    return q
+
+
+def notify_content_app():
+    """
+    Ask the content app processes to drop their in-memory caches.
+
+    The notification is delivered when the current transaction commits, and is dropped if the
+    transaction is rolled back.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("NOTIFY {channel}".format(channel=CONTENT_APP_CACHE_CHANNEL))
+
+
 def get_version_from_model(in_model):
     """
     Return a tuple (dist-label, version) for the distribution that 'owns' the model
@@ -49,3 +49,6 @@ API_ROOT = "pulp/api/v3/"
 # adding here won't make a new type-of checksum available. sha256 MUST be here,
 # as Pulp relies on it to identify entities.
 ALL_KNOWN_CONTENT_CHECKSUMS = {"md5", "sha1", "sha224", "sha256", "sha384", "sha512"}
+
+#: The database notification channel the content app listens on to invalidate its caches.
+CONTENT_APP_CACHE_CHANNEL = "pulp_content_app_cache"
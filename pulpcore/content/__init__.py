@@ -18,6 +18,7 @@ from django.conf import settings  # noqa: E402: module level not at top of file
 from pulpcore.app.apps import pulp_plugin_configs  # noqa: E402: module level not at top of file
 from pulpcore.app.models import ContentAppStatus  # noqa: E402: module level not at top of file
 
+from .cache import listen_for_changes  # noqa: E402: module level not at top of file
 from .handler import Handler  # noqa: E402: module level not at top of file
 
 
@@ -44,6 +45,7 @@ async def _heartbeat():
 
 async def server(*args, **kwargs):
     asyncio.ensure_future(_heartbeat())
+    asyncio.ensure_future(listen_for_changes())
     for pulp_plugin in pulp_plugin_configs():
         if pulp_plugin.name != "pulpcore.app":
             content_module_name = "{name}.{module}".format(
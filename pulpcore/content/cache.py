@@ -0,0 +1,408 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from gettext import gettext as _
+
+import psycopg2
+from django.conf import settings
+from django.db import connection
+from pygtrie import StringTrie
+
+from pulpcore.app.models import BaseDistribution
+from pulpcore.constants import CONTENT_APP_CACHE_CHANNEL
+
+log = logging.getLogger(__name__)
+
+_caches_lock = threading.Lock()
+_distribution_caches = {}
+_content_artifact_cache = None
+_directory_index_cache = None
+_listening = False
+
+
+def invalidate_caches():
+    """
+    Drop everything held by the in-memory caches of this content app process.
+    """
+    with _caches_lock:
+        caches = list(_distribution_caches.values())
+        for cache in (_content_artifact_cache, _directory_index_cache):
+            if cache is not None:
+                caches.append(cache)
+    for cache in caches:
+        cache.invalidate()
+
+
+def caching_enabled():
+    """
+    Whether the in-memory caches of this content app process may be used.
+
+    The caches are only trusted while this process is listening for change notifications
+    sent by the API and the workers, see :func:`listen_for_changes`.
+
+    Returns:
+        bool: True when the caches may be used.
+    """
+    return _listening
+
+
+def get_distribution_cache(model):
+    """
+    Get the distribution cache of this content app process for a distribution model.
+
+    Args:
+        model (:class:`~pulpcore.plugin.models.BaseDistribution`): The distribution model.
+
+    Returns:
+        :class:`DistributionCache`: The cache of ``model`` distributions.
+    """
+    with _caches_lock:
+        try:
+            return _distribution_caches[model]
+        except KeyError:
+            cache = _distribution_caches[model] = DistributionCache(model)
+            return cache
+
+
+class DistributionCache:
+    """
+    An in-memory cache of the distributions served by the content app.
+
+    The base paths of all distributions of ``model`` are held in a trie, which answers whether any
+    distribution matches a path without querying the database. Matched distributions are loaded
+    on first use and kept in memory along with their publication, remote, content guard,
+    repository and repository version. The remote and the content guard are kept as detail
+    instances, so they can be cast without querying the database.
+
+    Everything is dropped when a change notification is received or after
+    ``CONTENT_APP_DISTRIBUTION_CACHE_TTL`` seconds, whichever happens first.
+
+    Args:
+        model (:class:`~pulpcore.plugin.models.BaseDistribution`): The distribution model to cache.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._loaded_at = None
+        self._trie = None
+        self._distributions = {}
+
+    def invalidate(self):
+        """
+        Drop all cached distributions.
+        """
+        with self._lock:
+            self._generation += 1
+            self._loaded_at = None
+            self._trie = None
+            self._distributions = {}
+
+    def _get_trie(self):
+        """
+        Get the trie of base paths, loading it from the database if needed.
+
+        Returns:
+            tuple: The trie mapping base paths to distribution primary keys, and the cache
+                generation it belongs to.
+        """
+        with self._lock:
+            generation = self._generation
+            ttl = settings.CONTENT_APP_DISTRIBUTION_CACHE_TTL
+            if self._trie is not None and time.monotonic() - self._loaded_at < ttl:
+                return self._trie, generation
+
+        trie = StringTrie(separator="/")
+        for base_path, pk in self.model.objects.values_list("base_path", "pk"):
+            trie[base_path] = pk
+
+        with self._lock:
+            if generation == self._generation:
+                self._generation += 1
+                generation = self._generation
+                self._loaded_at = time.monotonic()
+                self._trie = trie
+                self._distributions = {}
+        return trie, generation
+
+    def _load_distribution(self, pk):
+        """
+        Load a distribution and the objects the content app uses from it.
+
+        Args:
+            pk (uuid.UUID): The primary key of the distribution.
+
+        Returns:
+            The detail distribution.
+        """
+        distribution = self.model.objects.get(pk=pk)
+        if self.model is BaseDistribution:
+            distribution = distribution.cast()
+        if distribution.remote:
+            distribution.remote = distribution.remote.cast()
+        if distribution.content_guard:
+            distribution.content_guard = distribution.content_guard.cast()
+        for name in ("publication", "repository", "repository_version"):
+            getattr(distribution, name, None)
+        return distribution
+
+    def get(self, path):
+        """
+        Match a distribution to the path of a request.
+
+        Args:
+            path (str): The path component of the URL.
+
+        Returns:
+            The detail distribution whose base path is a parent of ``path``, or None.
+        """
+        directory = os.path.dirname(path)
+        if not directory.lstrip("/"):
+            return None
+
+        trie, generation = self._get_trie()
+        base_path, pk = trie.longest_prefix(directory)
+        if base_path is None:
+            return None
+
+        try:
+            return self._distributions[pk]
+        except KeyError:
+            pass
+
+        try:
+            distribution = self._load_distribution(pk)
+        except self.model.DoesNotExist:
+            return None
+        with self._lock:
+            if generation == self._generation:
+                self._distributions[pk] = distribution
+        return distribution
+
+
+def get_content_artifact_cache():
+    """
+    Get the content artifact cache of this content app process.
+
+    Returns:
+        :class:`ContentArtifactCache`: The cache of content artifacts.
+    """
+    global _content_artifact_cache
+
+    with _caches_lock:
+        if _content_artifact_cache is None:
+            _content_artifact_cache = ContentArtifactCache(
+                settings.CONTENT_APP_CONTENT_ARTIFACT_CACHE_SIZE
+            )
+        return _content_artifact_cache
+
+
+def get_directory_index_cache():
+    """
+    Get the directory index cache of this content app process.
+
+    Returns:
+        :class:`LRUCache`: The cache of directory indexes, see :func:`build_directory_index`.
+    """
+    global _directory_index_cache
+
+    with _caches_lock:
+        if _directory_index_cache is None:
+            _directory_index_cache = LRUCache(settings.CONTENT_APP_DIRECTORY_INDEX_CACHE_SIZE)
+        return _directory_index_cache
+
+
+def build_directory_index(relative_paths):
+    """
+    Build the directory index of a publication or repository version.
+
+    Args:
+        relative_paths (iterable): The relative paths of all the files served.
+
+    Returns:
+        dict: Maps the path of each directory, ending with a slash or empty for the top directory,
+            to the set of its entries. Subdirectory entries end with a slash.
+    """
+    index = {}
+    for relative_path in relative_paths:
+        directory = ""
+        for name in relative_path.split("/")[:-1]:
+            index.setdefault(directory, set()).add(name + "/")
+            directory = directory + name + "/"
+        index.setdefault(directory, set()).add(os.path.basename(relative_path))
+    return index
+
+
+class LRUCache:
+    """
+    A size-bounded, least recently used, in-memory cache.
+
+    The values cached must not change as long as the objects they are computed from exist, e.g.
+    values computed from complete publications and repository versions.
+
+    Args:
+        maxsize (int): The maximum number of values kept in memory.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._values = OrderedDict()
+
+    def invalidate(self):
+        """
+        Drop all cached values.
+        """
+        with self._lock:
+            self._generation += 1
+            self._values.clear()
+
+    def cacheable(self, value):
+        """
+        Whether a fetched value may be cached.
+
+        Args:
+            value: The fetched value.
+
+        Returns:
+            bool: True when the value may be cached.
+        """
+        return True
+
+    def get(self, key, fetch):
+        """
+        Get a value from the cache, or fetch it from the database.
+
+        Args:
+            key (tuple): The key identifying the value.
+            fetch (callable): Called to get the value on a cache miss. Exceptions it raises are
+                propagated.
+
+        Returns:
+            The value.
+        """
+        if not caching_enabled():
+            return fetch()
+
+        with self._lock:
+            generation = self._generation
+            try:
+                self._values.move_to_end(key)
+                return self._values[key]
+            except KeyError:
+                pass
+
+        value = fetch()
+        if self.cacheable(value):
+            with self._lock:
+                # A value fetched before the cache was invalidated may be stale.
+                if generation != self._generation:
+                    return value
+                self._values[key] = value
+                while len(self._values) > self.maxsize:
+                    self._values.popitem(last=False)
+        return value
+
+
+class ContentArtifactCache(LRUCache):
+    """
+    A size-bounded, least recently used, in-memory cache of content artifacts.
+
+    Complete publications and repository versions do not change, so the content artifact served
+    for one of their relative paths can be kept in memory, along with its artifact. The keys are
+    the model, primary key and relative path identifying the content artifact within a complete
+    publication or repository version.
+
+    Only content artifacts whose artifact is already stored are cached, as on-demand content
+    artifacts get their artifact once it is downloaded.
+
+    Args:
+        maxsize (int): The maximum number of content artifacts kept in memory.
+    """
+
+    def cacheable(self, content_artifact):
+        """
+        Whether a content artifact may be cached.
+
+        Args:
+            content_artifact (:class:`~pulpcore.plugin.models.ContentArtifact`): The content
+                artifact.
+
+        Returns:
+            bool: True when the artifact of the content artifact is stored.
+        """
+        return content_artifact.artifact_id is not None
+
+
+def _connect_listener_blocking():
+    """
+    Open a database connection listening on the content app cache channel.
+
+    Returns:
+        A psycopg2 connection in autocommit mode.
+    """
+    listener = psycopg2.connect(**connection.get_connection_params())
+    listener.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+    with listener.cursor() as cursor:
+        cursor.execute("LISTEN {channel}".format(channel=CONTENT_APP_CACHE_CHANNEL))
+    return listener
+
+
+async def listen_for_changes(retry_interval=10):
+    """
+    Listen for change notifications and invalidate the caches of this content app process.
+
+    The API and the workers send a notification whenever they change an object the content app
+    caches. While this process is not listening, the caches are invalidated and not used.
+
+    Args:
+        retry_interval (int): Number of seconds to wait before reconnecting a lost listener.
+    """
+    global _listening
+
+    loop = asyncio.get_event_loop()
+    while True:
+        try:
+            listener = await loop.run_in_executor(None, _connect_listener_blocking)
+        except psycopg2.Error as exc:
+            log.warning(
+                _("Content app cache listener could not connect, retrying in %(i)ss: %(e)s"),
+                {"i": retry_interval, "e": exc},
+            )
+            await asyncio.sleep(retry_interval)
+            continue
+
+        lost = loop.create_future()
+
+        def handle_notifications():
+            try:
+                listener.poll()
+            except psycopg2.Error as exc:
+                if not lost.done():
+                    lost.set_result(exc)
+                return
+            if listener.notifies:
+                del listener.notifies[:]
+                invalidate_caches()
+
+        fileno = listener.fileno()
+        loop.add_reader(fileno, handle_notifications)
+        invalidate_caches()
+        _listening = True
+        try:
+            exc = await lost
+            log.warning(
+                _("Content app cache listener lost its connection, retrying in %(i)ss: %(e)s"),
+                {"i": retry_interval, "e": exc},
+            )
+        finally:
+            _listening = False
+            invalidate_caches()
+            loop.remove_reader(fileno)
+            listener.close()
+        await asyncio.sleep(retry_interval)
@@ -1,12 +1,22 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import mimetypes
 import os
 import re
+import time
 from gettext import gettext as _
 
 from aiohttp.client_exceptions import ClientResponseError
 from aiohttp.web import FileResponse, StreamResponse, HTTPOk
-from aiohttp.web_exceptions import HTTPForbidden, HTTPFound, HTTPNotFound
+from aiohttp.web_exceptions import (
+    HTTPForbidden,
+    HTTPFound,
+    HTTPNotFound,
+    HTTPNotModified,
+    HTTPPartialContent,
+    HTTPRequestRangeNotSatisfiable,
+)
 
 import django
 
@@ -22,16 +32,37 @@ from django.db import (  # noqa: E402: module level not at top of file
     IntegrityError,
     transaction,
 )
+from django.utils.http import (  # noqa: E402: module level not at top of file
+    http_date,
+    parse_http_date_safe,
+)
 from pulpcore.app.models import (  # noqa: E402: module level not at top of file
     Artifact,
     BaseDistribution,
     ContentArtifact,
+    Publication,
     Remote,
     RemoteArtifact,
+    RepositoryVersion,
+)
+from pulpcore.app.tasks import (  # noqa: E402: module level not at top of file
+    fill_missing_artifact_digests,
+)
+from pulpcore.download import BaseDownloader  # noqa: E402: module level not at top of file
+from pulpcore.tasking.tasks import (  # noqa: E402: module level not at top of file
+    enqueue_with_reservation,
 )
 
 from jinja2 import Template  # noqa: E402: module level not at top of file
 
+from .cache import (  # noqa: E402: module level not at top of file
+    build_directory_index,
+    caching_enabled,
+    get_content_artifact_cache,
+    get_directory_index_cache,
+    get_distribution_cache,
+)
+
 log = logging.getLogger(__name__)
 
 
@@ -57,6 +88,457 @@ class ArtifactNotFound(Exception):
     pass
 
 
+class DownloadAbandoned(Exception):
+    """
+    No client is streaming a download of a remote artifact with the streamed policy anymore.
+    """
+
+    pass
+
+
+class FollowerLagging(Exception):
+    """
+    A request fell too far behind a download that cannot be replayed to it.
+    """
+
+    pass
+
+
+class _Replay:
+    """
+    Published to a request lagging behind a download, to read the rest of it from its file.
+
+    Args:
+        replay_file (file): The file the download is written to, opened for reading, or None if
+            it is not created yet.
+        data_handler (OffloadedDataHandler): The handler writing to `replay_file`.
+    """
+
+    def __init__(self, replay_file, data_handler):
+        self.replay_file = replay_file
+        self.data_handler = data_handler
+
+
+class SharedDownload:
+    """
+    An on-demand download of a remote artifact, streamed to every request asking for it.
+
+    The download runs in its own task and publishes the headers and each chunk of data it
+    receives. Requests for the same remote artifact arriving before the first chunk is published
+    follow the download and stream the same data to their clients. Requests arriving later replay
+    the data from the file the download is written to, then follow the download, see
+    :meth:`replay`. When the data is not written to a file, they wait for the download to finish
+    and serve the saved artifact, or start their own download if no artifact will be saved.
+
+    The download never waits for the requests following it. A request lagging too far behind
+    stops following it and replays the rest of the data from the file instead, or gets a
+    :class:`FollowerLagging` error when the data is not written to a file.
+
+    Attributes:
+        headers (asyncio.Future): The response headers of the remote.
+        result (asyncio.Future): The saved :class:`~pulpcore.plugin.models.Artifact`, or None if
+            the artifact was not saved.
+        started (bool): True once data was published, after which requests cannot follow anymore.
+        published (int): The number of bytes of data published.
+        saves_artifact (bool): Whether an artifact will be saved at the end of the download, False
+            for the streamed policy.
+        data_handler (OffloadedDataHandler): The handler writing the data to the file of the
+            download while it can be replayed, None otherwise.
+    """
+
+    #: The number of chunks a follower may lag behind before it stops following the download.
+    max_lag = 16
+
+    def __init__(self):
+        loop = asyncio.get_event_loop()
+        self.headers = loop.create_future()
+        self.result = loop.create_future()
+        self.started = False
+        self.published = 0
+        self.saves_artifact = True
+        self.data_handler = None
+        self._followers = set()
+
+    @property
+    def has_followers(self):
+        """True when requests are following this download."""
+        return bool(self._followers)
+
+    def follow(self):
+        """
+        Follow the download.
+
+        Returns:
+            asyncio.Queue: The chunks of data published, followed by None once the download is
+                complete, or by an exception if it failed.
+        """
+        # One more chunk fits, so the end of the download is always published without waiting.
+        queue = asyncio.Queue(maxsize=self.max_lag + 1)
+        self._followers.add(queue)
+        return queue
+
+    def unfollow(self, queue):
+        """
+        Stop following the download, e.g. because the client went away.
+
+        Args:
+            queue (asyncio.Queue): The queue returned by :meth:`follow`.
+        """
+        self._followers.discard(queue)
+        while not queue.empty():
+            item = queue.get_nowait()
+            if isinstance(item, _Replay) and item.replay_file is not None:
+                item.replay_file.close()
+
+    def _drop_lagging(self, queue):
+        """
+        Stop publishing to a follower lagging behind, replaying the download to it if possible.
+
+        Args:
+            queue (asyncio.Queue): The queue of the follower.
+        """
+        self.unfollow(queue)
+        data_handler = self.data_handler
+        if data_handler is None:
+            queue.put_nowait(FollowerLagging())
+        elif data_handler.downloader.path is None:
+            # Nothing was written yet, the follower opens the file once it is.
+            queue.put_nowait(_Replay(None, data_handler))
+        else:
+            # The file is opened right away, before it can be moved to the artifact storage.
+            replay_file = open(data_handler.downloader.path, "rb")
+            queue.put_nowait(_Replay(replay_file, data_handler))
+
+    async def replay(self):
+        """
+        Get a reader of the data of the download from the start, once data was published.
+
+        Returns:
+            SharedDownloadReader: The reader, or None if the data cannot be replayed because it is
+                not written to a file, or the download completed and its file is being saved.
+        """
+        replay = await self._open_replay_file()
+        if replay is None:
+            return None
+        return SharedDownloadReader(self, replay.replay_file, replay.data_handler)
+
+    async def _open_replay_file(self):
+        """
+        Open the file the download is written to, once data was written to it.
+
+        Returns:
+            _Replay: The opened file, or None if the download cannot be replayed.
+        """
+        data_handler = self.data_handler
+        if data_handler is None or not await data_handler.wait_handled(1):
+            return None
+        if self.data_handler is None:
+            return None
+        # The file is opened right away, before it can be moved to the artifact storage.
+        return _Replay(open(data_handler.downloader.path, "rb"), data_handler)
+
+    def set_headers(self, headers):
+        """
+        Publish the response headers of the remote.
+
+        Args:
+            headers (dict): The response headers.
+        """
+        if not self.headers.done():
+            self.headers.set_result(headers)
+
+    async def publish(self, data):
+        """
+        Publish a chunk of data to the followers, without waiting for any of them.
+
+        Args:
+            data (bytes): The chunk of data.
+        """
+        self.started = True
+        self.published += len(data)
+        for queue in list(self._followers):
+            if queue.qsize() >= self.max_lag:
+                self._drop_lagging(queue)
+            else:
+                queue.put_nowait(data)
+
+    async def finish(self, artifact):
+        """
+        Publish the end of the download.
+
+        Args:
+            artifact (:class:`~pulpcore.plugin.models.Artifact`): The saved artifact, or None.
+        """
+        for queue in list(self._followers):
+            queue.put_nowait(None)
+        self.result.set_result(artifact)
+
+    def fail(self, exc):
+        """
+        Publish the failure of the download.
+
+        Args:
+            exc (Exception): The exception the download failed with.
+        """
+        for queue in list(self._followers):
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(exc)
+        for future in (self.headers, self.result):
+            if not future.done():
+                future.set_exception(exc)
+                # Followers may not be waiting on it, do not log the exception as never retrieved.
+                future.exception()
+
+
+class SharedDownloadReader:
+    """
+    Read the data of a :class:`SharedDownload` from the start, for one request.
+
+    A reader created before data was published follows the download. A reader replaying a download
+    reads the data already published from the file the download is written to, and follows the
+    download once it caught up with it, so the download does not wait for the data it reads from
+    the file meanwhile. A reader lagging too far behind the download it follows replays the rest
+    of the data the same way.
+
+    Args:
+        shared_download (SharedDownload): The download to read.
+        replay_file (file): The file the download is written to, opened for reading, to replay it.
+        data_handler (OffloadedDataHandler): The handler writing to `replay_file`.
+    """
+
+    #: The number of bytes read from the replayed file at once.
+    chunk_size = 1048576
+    #: The number of bytes a replay may lag behind the download when it starts following it.
+    catch_up = 16 * 1048576
+
+    def __init__(self, shared_download, replay_file=None, data_handler=None):
+        self._shared_download = shared_download
+        self._replay_file = replay_file
+        self._data_handler = data_handler
+        self._offset = 0
+        # The number of bytes to replay from the file, known once the replay caught up.
+        self._replay_stop = None
+        self._queue = None
+        if replay_file is None:
+            self._queue = shared_download.follow()
+
+    async def read(self):
+        """
+        Read the next chunk of data.
+
+        Returns:
+            bytes: The chunk of data, or None at the end of the download.
+
+        Raises:
+            FollowerLagging: When the reader lagged behind a download it cannot replay.
+            Exception: The exception the download failed with.
+        """
+        if self._replay_file is not None:
+            if self._replay_stop is None:
+                self._catch_up()
+            if self._replay_stop is None or self._offset < self._replay_stop:
+                return await self._read_replay_file()
+        if self._queue is None:
+            return None
+        data = await self._queue.get()
+        if isinstance(data, _Replay):
+            await self._replay(data)
+            return await self.read()
+        if isinstance(data, Exception):
+            raise data
+        if data is not None:
+            self._offset += len(data)
+        return data
+
+    async def _replay(self, replay):
+        """
+        Replay the rest of the download from its file, after lagging behind it.
+        """
+        self._queue = None
+        if replay.replay_file is None:
+            replay = await self._shared_download._open_replay_file()
+            if replay is None:
+                raise FollowerLagging()
+        if self._replay_file is not None:
+            self._replay_file.close()
+        self._replay_file = replay.replay_file
+        self._replay_file.seek(self._offset)
+        self._data_handler = replay.data_handler
+        self._replay_stop = None
+
+    def _catch_up(self):
+        """
+        Follow the download once the replay is close enough to the data it published.
+        """
+        shared_download = self._shared_download
+        if shared_download.published - self._offset > self.catch_up:
+            return
+        if shared_download.result.done():
+            # Nothing will be published anymore, the rest of the data is in the file.
+            shared_download.result.result()
+        else:
+            self._queue = shared_download.follow()
+        self._replay_stop = shared_download.published
+
+    async def _read_replay_file(self):
+        stop = self._shared_download.published if self._replay_stop is None else self._replay_stop
+        size = min(self.chunk_size, stop - self._offset)
+        if not await self._data_handler.wait_handled(self._offset + size):
+            # Writing the data failed, the download fails with the same error.
+            await asyncio.shield(self._shared_download.result)
+            raise RuntimeError(_("The download stopped before its data was written."))
+        loop = asyncio.get_event_loop()
+        data = await loop.run_in_executor(None, self._replay_file.read, size)
+        if len(data) != size:
+            raise RuntimeError(_("The file of the download is truncated."))
+        self._offset += size
+        return data
+
+    def close(self):
+        """
+        Stop reading the download.
+        """
+        if self._queue is not None:
+            self._shared_download.unfollow(self._queue)
+        if self._replay_file is not None:
+            self._replay_file.close()
+
+
+class OffloadedDataHandler:
+    """
+    Write the data of a download to disk and compute its digests in worker threads.
+
+    Writing each chunk to disk and updating the digests of the downloader is CPU and I/O bound work
+    that would otherwise block the event loop. Chunks are buffered in a bounded queue and handed to
+    the downloader in order, one at a time, by the threads of the default executor of the event
+    loop. hashlib releases the GIL while hashing, so the event loop keeps streaming data meanwhile.
+
+    Only downloaders which do not override
+    :meth:`~pulpcore.plugin.download.BaseDownloader.handle_data` or
+    :meth:`~pulpcore.plugin.download.BaseDownloader.finalize` can be offloaded, see
+    :meth:`offloadable`.
+
+    Args:
+        downloader (:class:`~pulpcore.plugin.download.BaseDownloader`): The downloader whose data
+            is handled.
+    """
+
+    #: The number of chunks buffered before the download waits for them to be handled.
+    max_buffered = 4
+
+    def __init__(self, downloader):
+        self.downloader = downloader
+        #: The number of bytes written to the file of the downloader.
+        self.handled = 0
+        self._queue = asyncio.Queue(maxsize=self.max_buffered)
+        self._error = None
+        self._handled_waiters = []
+        self._consumer = asyncio.ensure_future(self._consume())
+
+    @staticmethod
+    def offloadable(downloader):
+        """
+        Whether the data handling of a downloader can be offloaded to worker threads.
+
+        Args:
+            downloader (:class:`~pulpcore.plugin.download.BaseDownloader`): The downloader.
+
+        Returns:
+            bool: True when the downloader handles data the way the BaseDownloader does.
+        """
+        return (
+            type(downloader).handle_data is BaseDownloader.handle_data
+            and type(downloader).finalize is BaseDownloader.finalize
+        )
+
+    async def _consume(self):
+        loop = asyncio.get_event_loop()
+        try:
+            while True:
+                data = await self._queue.get()
+                if data is None:
+                    return
+                if self._error is None:
+                    try:
+                        await loop.run_in_executor(None, self._handle_data_blocking, data)
+                    except Exception as exc:
+                        self._error = exc
+                        self._wake_up_waiters(stopped=True)
+                    else:
+                        self.handled += len(data)
+                        self._wake_up_waiters()
+        finally:
+            self._wake_up_waiters(stopped=True)
+
+    def _handle_data_blocking(self, data):
+        self.downloader._handle_data_blocking(data)
+        # Requests replaying the download read the data from the file meanwhile.
+        self.downloader._writer.flush()
+
+    def _wake_up_waiters(self, stopped=False):
+        waiters = []
+        for size, future in self._handled_waiters:
+            if not future.done():
+                if self.handled >= size or stopped:
+                    future.set_result(self.handled >= size)
+                else:
+                    waiters.append((size, future))
+        self._handled_waiters = waiters
+
+    async def wait_handled(self, size):
+        """
+        Wait for the first bytes of the data to be written to the file of the downloader.
+
+        Args:
+            size (int): The number of bytes to wait for.
+
+        Returns:
+            bool: True once they are written, False if the data stopped being handled before.
+        """
+        if self.handled >= size:
+            return True
+        if self._consumer.done() or self._error is not None:
+            return False
+        future = asyncio.get_event_loop().create_future()
+        self._handled_waiters.append((size, future))
+        return await future
+
+    async def handle_data(self, data):
+        """
+        Queue a chunk of data to be written and hashed.
+
+        Args:
+            data (bytes): The data to be handled by the downloader.
+
+        Raises:
+            Exception: When handling a previous chunk of data failed.
+        """
+        if self._error is not None:
+            raise self._error
+        await self._queue.put(data)
+
+    async def finalize(self):
+        """
+        Wait for all the data to be handled, then flush, close and validate the download.
+
+        Raises:
+            Exception: When handling the data failed, or any validation error.
+        """
+        await self._queue.put(None)
+        await self._consumer
+        if self._error is not None:
+            raise self._error
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self.downloader._finalize_blocking)
+
+    def cancel(self):
+        """
+        Stop handling data, e.g. because the download failed.
+        """
+        self._consumer.cancel()
+
+
 class Handler:
     """
     A default Handler for the Content App that also can be subclassed to create custom handlers.
@@ -94,6 +576,11 @@ class Handler:
 
     distribution_model = None
 
+    _db_executor = None
+
+    # The on-demand downloads in progress in this content app process, by remote and url.
+    _shared_downloads = {}
+
     @staticmethod
     def _reset_db_connection():
         """
@@ -101,6 +588,62 @@ class Handler:
         """
         connection.close_if_unusable_or_obsolete()
 
+    @classmethod
+    def _get_db_executor(cls):
+        """
+        Get the thread pool used to run database queries outside of the event loop.
+
+        The pool is shared by all Handler instances of the process and is bounded by the
+        ``CONTENT_APP_DB_THREADS`` setting. Each thread holds its own database connection.
+
+        Returns:
+            :class:`concurrent.futures.ThreadPoolExecutor`: The shared executor.
+        """
+        if Handler._db_executor is None:
+            Handler._db_executor = ThreadPoolExecutor(
+                max_workers=settings.CONTENT_APP_DB_THREADS, thread_name_prefix="content-app-db"
+            )
+        return Handler._db_executor
+
+    async def _run_in_db_thread(self, func, *args):
+        """
+        Run a blocking callable, usually an ORM query, in the database thread pool.
+
+        Running the queries in a bounded thread pool keeps a slow query from stalling every other
+        request served by the event loop of this process. The time spent waiting for a free thread
+        and the time spent running the callable are logged at the debug level.
+
+        Args:
+            func (callable): The blocking callable to run.
+            args: Positional arguments passed to ``func``.
+
+        Returns:
+            The return value of ``func``.
+        """
+        submitted = time.monotonic()
+        started = None
+
+        def run_blocking():
+            nonlocal started
+            started = time.monotonic()
+            self._reset_db_connection()
+            return func(*args)
+
+        loop = asyncio.get_event_loop()
+        try:
+            return await loop.run_in_executor(self._get_db_executor(), run_blocking)
+        finally:
+            finished = time.monotonic()
+            if started is not None:
+                log.debug(
+                    "%(func)s waited %(wait).4fs for a database thread and ran for %(run).4fs",
+                    {
+                        "func": getattr(func, "__qualname__", func),
+                        "wait": started - submitted,
+                        "run": finished - started,
+                    },
+                )
+
     async def list_distributions(self, request):
         """
         The handler for an HTML listing all distributions
@@ -111,13 +654,16 @@ class Handler:
         Returns:
             :class:`aiohttp.web.HTTPOk`: The response back to the client.
         """
-        self._reset_db_connection()
 
-        if self.distribution_model is None:
-            distributions = BaseDistribution.objects.only("base_path").all()
-        else:
-            distributions = self.distribution_model.objects.only("base_path").all()
-        directory_list = ["{}/".format(d.base_path) for d in distributions]
+        def get_base_paths_blocking():
+            if self.distribution_model is None:
+                base_paths = BaseDistribution.objects.values_list("base_path", flat=True)
+            else:
+                base_paths = self.distribution_model.objects.values_list("base_path", flat=True)
+            return list(base_paths)
+
+        base_paths = await self._run_in_db_thread(get_base_paths_blocking)
+        directory_list = ["{}/".format(base_path) for base_path in base_paths]
         return HTTPOk(headers={"Content-Type": "text/html"}, body=self.render_html(directory_list))
 
     async def stream_content(self, request):
@@ -131,10 +677,18 @@ class Handler:
             :class:`aiohttp.web.StreamResponse` or :class:`aiohttp.web.FileResponse`: The response
                 back to the client.
         """
-        self._reset_db_connection()
-
         path = request.match_info["path"]
-        return await self._match_and_stream(path, request)
+        started = time.monotonic()
+        try:
+            response = await self._match_and_stream(path, request)
+            if not response.prepared and self._not_modified(request, response.headers):
+                return HTTPNotModified(headers=self._validator_headers(response.headers))
+            return response
+        finally:
+            log.debug(
+                "Handled %(path)s in %(duration).4fs",
+                {"path": path, "duration": time.monotonic() - started},
+            )
 
     @staticmethod
     def _base_paths(path):
@@ -171,6 +725,18 @@ class Handler:
         Raises:
             PathNotResolved: when not matched.
         """
+        if caching_enabled():
+            model_class = cls.distribution_model or BaseDistribution
+            distribution = get_distribution_cache(model_class).get(path)
+            if distribution is None:
+                log.debug(
+                    _("{model_name} not matched for {path} in the distribution cache").format(
+                        model_name=model_class.__name__, path=path
+                    )
+                )
+                raise PathNotResolved(path)
+            return distribution
+
         base_paths = cls._base_paths(path)
         try:
             if cls.distribution_model is None:
@@ -231,6 +797,123 @@ class Handler:
             headers["Content-Type"] = content_type
         return headers
 
+    @staticmethod
+    def artifact_headers(artifact):
+        """
+        Get the ETag and Last-Modified headers for an artifact.
+
+        Artifacts never change, so the sha256 digest makes a strong ETag, and the creation time of
+        the artifact is the time it was last modified.
+
+        Args:
+            artifact (:class:`~pulpcore.plugin.models.Artifact`): The artifact served.
+
+        Returns:
+            headers (dict): A dictionary of response headers.
+        """
+        return {
+            "ETag": '"{}"'.format(artifact.sha256),
+            "Last-Modified": http_date(artifact.pulp_created.timestamp()),
+        }
+
+    @staticmethod
+    def _validator_headers(headers):
+        """
+        Get the headers a "304 Not Modified" response repeats from the full response.
+
+        Args:
+            headers (dict): The headers of the full response.
+
+        Returns:
+            headers (dict): The ETag and Last-Modified headers of the full response.
+        """
+        return {name: headers[name] for name in ("ETag", "Last-Modified") if name in headers}
+
+    @staticmethod
+    def _etag_matches(etags, etag, weak=True):
+        """
+        Whether an ETag matches the value of an If-None-Match or If-Range header.
+
+        Args:
+            etags (str): The comma separated ETags of the header.
+            etag (str): The ETag of the response.
+            weak (bool): Use the weak comparison, which ignores the weak indicator.
+
+        Returns:
+            bool: True when the ETag matches.
+        """
+        for value in etags.split(","):
+            value = value.strip()
+            if value == "*":
+                return True
+            if weak and value.startswith("W/"):
+                value = value[2:]
+            if value == etag:
+                return True
+        return False
+
+    def _not_modified(self, request, headers):
+        """
+        Whether the conditional headers of the request allow a "304 Not Modified" response.
+
+        Args:
+            request (:class:`aiohttp.web.Request`): The request from the client.
+            headers (dict): The headers of the response, with its ETag and Last-Modified headers
+                if it has any.
+
+        Returns:
+            bool: True when the client already has the response.
+        """
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match is not None:
+            etag = headers.get("ETag")
+            return etag is not None and self._etag_matches(if_none_match, etag)
+
+        if_modified_since = parse_http_date_safe(request.headers.get("If-Modified-Since", ""))
+        last_modified = parse_http_date_safe(headers.get("Last-Modified", ""))
+        return None not in (if_modified_since, last_modified) and last_modified <= if_modified_since
+
+    def _byte_range(self, request, etag, size):
+        """
+        Get the byte range requested by the Range header.
+
+        The Range header is ignored when it is malformed, when it requests several ranges, when
+        the size is not known, or when the If-Range header does not match, in which case the whole
+        content is served.
+
+        Args:
+            request (:class:`aiohttp.web.Request`): The request from the client.
+            etag (str): The ETag of the response, or None.
+            size (int): The size of the content, or None.
+
+        Returns:
+            tuple: The start and stop offsets of the range, or None to serve the whole content.
+
+        Raises:
+            :class:`aiohttp.web.HTTPRequestRangeNotSatisfiable`: When the range is beyond the
+                content.
+        """
+        if "Range" not in request.headers or size is None:
+            return None
+        if_range = request.headers.get("If-Range")
+        if if_range is not None and (etag is None or not self._etag_matches(if_range, etag, False)):
+            return None
+        try:
+            http_range = request.http_range
+        except ValueError:
+            return None
+
+        start, stop = http_range.start, http_range.stop
+        if start is None:
+            return None
+        if start < 0:
+            start, stop = max(size + start, 0), size
+        else:
+            stop = size if stop is None else min(stop, size)
+        if start >= stop:
+            raise HTTPRequestRangeNotSatisfiable(headers={"Content-Range": "bytes */%d" % size})
+        return start, stop
+
     @staticmethod
     def render_html(directory_list):
         """
@@ -283,27 +966,42 @@ class Handler:
             result = re.match(r"({})([^\/]*)(\/*)".format(directory_path), relative_path)
             return "{}{}".format(result.groups()[1], result.groups()[2])
 
-        directory_list = set()
+        def get_relative_paths_blocking(prefix):
+            relative_paths = []
 
-        if publication:
-            pas = publication.published_artifact.filter(relative_path__startswith=path)
-            for pa in pas:
-                directory_list.add(file_or_directory_name(path, pa.relative_path))
+            if publication:
+                pas = publication.published_artifact.filter(relative_path__startswith=prefix)
+                relative_paths.extend(pas.values_list("relative_path", flat=True))
 
-            if publication.pass_through:
+                if publication.pass_through:
+                    cas = ContentArtifact.objects.filter(
+                        content__in=publication.repository_version.content,
+                        relative_path__startswith=prefix,
+                    )
+                    relative_paths.extend(cas.values_list("relative_path", flat=True))
+
+            if repo_version:
                 cas = ContentArtifact.objects.filter(
-                    content__in=publication.repository_version.content,
-                    relative_path__startswith=path,
+                    content__in=repo_version.content, relative_path__startswith=prefix
                 )
-                for ca in cas:
-                    directory_list.add(file_or_directory_name(path, ca.relative_path))
+                relative_paths.extend(cas.values_list("relative_path", flat=True))
 
-        if repo_version:
-            cas = ContentArtifact.objects.filter(
-                content__in=repo_version.content, relative_path__startswith=path
+            return relative_paths
+
+        def get_directory_index_blocking():
+            return build_directory_index(get_relative_paths_blocking(""))
+
+        served = publication or repo_version
+        if caching_enabled() and served.complete:
+            key = (type(served), served.pk)
+            index = await self._run_in_db_thread(
+                get_directory_index_cache().get, key, get_directory_index_blocking
             )
-            for ca in cas:
-                directory_list.add(file_or_directory_name(path, ca.relative_path))
+            directory_list = set(index.get(path, ()))
+        else:
+            directory_list = set()
+            for relative_path in await self._run_in_db_thread(get_relative_paths_blocking, path):
+                directory_list.add(file_or_directory_name(path, relative_path))
 
         if directory_list:
             return directory_list
@@ -343,39 +1041,87 @@ class Handler:
             :class:`aiohttp.web.StreamResponse` or :class:`aiohttp.web.FileResponse`: The response
                 streamed back to the client.
         """
-        distro = self._match_distribution(path)
-        self._permit(request, distro)
+        distro = await self._run_in_db_thread(self._match_distribution, path)
+        await self._run_in_db_thread(self._permit, request, distro)
 
         rel_path = path.lstrip("/")
         rel_path = rel_path[len(distro.base_path) :]
         rel_path = rel_path.lstrip("/")
 
-        content_handler_result = distro.content_handler(rel_path)
+        content_handler_result = await self._run_in_db_thread(distro.content_handler, rel_path)
         if content_handler_result is not None:
             return content_handler_result
 
         headers = self.response_headers(rel_path)
 
-        publication = getattr(distro, "publication", None)
+        def get_publication_blocking():
+            return getattr(distro, "publication", None)
+
+        def get_repo_version_blocking():
+            repo_version = getattr(distro, "repository_version", None)
+            repository = getattr(distro, "repository", None)
+            if repository:
+                repo_version = repository.latest_version()
+            return repo_version
+
+        def get_published_contentartifact_blocking(relative_path):
+            def fetch():
+                pa = publication.published_artifact.select_related(
+                    "content_artifact__artifact"
+                ).get(relative_path=relative_path)
+                return pa.content_artifact
+
+            if not publication.complete:
+                return fetch()
+            key = (Publication, publication.pk, relative_path)
+            return get_content_artifact_cache().get(key, fetch)
+
+        def get_contentartifact_blocking(repo_version, relative_path):
+            def fetch():
+                return ContentArtifact.objects.select_related("artifact").get(
+                    content__in=repo_version.content, relative_path=relative_path
+                )
+
+            if not repo_version.complete:
+                return fetch()
+            key = (RepositoryVersion, repo_version.pk, relative_path)
+            return get_content_artifact_cache().get(key, fetch)
+
+        def get_pass_through_contentartifact_blocking(relative_path):
+            return get_contentartifact_blocking(publication.repository_version, relative_path)
+
+        def get_remote_blocking():
+            if distro.remote:
+                return distro.remote.cast()
+
+        def get_remote_artifact_blocking(remote, url):
+            return RemoteArtifact.objects.select_related("content_artifact__artifact").get(
+                remote=remote, url=url
+            )
+
+        publication = await self._run_in_db_thread(get_publication_blocking)
 
         if publication:
             if rel_path == "" or rel_path[-1] == "/":
                 try:
                     index_path = "{}index.html".format(rel_path)
-                    publication.published_artifact.get(relative_path=index_path)
+                    await self._run_in_db_thread(get_published_contentartifact_blocking, index_path)
                     rel_path = index_path
                     headers = self.response_headers(rel_path)
                 except ObjectDoesNotExist:
                     dir_list = await self.list_directory(None, publication, rel_path)
-                    dir_list.update(distro.content_handler_list_directory(rel_path))
+                    dir_list.update(
+                        await self._run_in_db_thread(
+                            distro.content_handler_list_directory, rel_path
+                        )
+                    )
                     return HTTPOk(
                         headers={"Content-Type": "text/html"}, body=self.render_html(dir_list)
                     )
 
             # published artifact
             try:
-                pa = publication.published_artifact.get(relative_path=rel_path)
-                ca = pa.content_artifact
+                ca = await self._run_in_db_thread(get_published_contentartifact_blocking, rel_path)
             except ObjectDoesNotExist:
                 pass
             else:
@@ -389,8 +1135,8 @@ class Handler:
             # pass-through
             if publication.pass_through:
                 try:
-                    ca = ContentArtifact.objects.get(
-                        content__in=publication.repository_version.content, relative_path=rel_path
+                    ca = await self._run_in_db_thread(
+                        get_pass_through_contentartifact_blocking, rel_path
                     )
                 except MultipleObjectsReturned:
                     log.error(
@@ -408,30 +1154,30 @@ class Handler:
                             request, StreamResponse(headers=headers), ca
                         )
 
-        repo_version = getattr(distro, "repository_version", None)
-        repository = getattr(distro, "repository", None)
-
-        if repository or repo_version:
-            if repository:
-                repo_version = distro.repository.latest_version()
+        repo_version = await self._run_in_db_thread(get_repo_version_blocking)
 
+        if repo_version:
             if rel_path == "" or rel_path[-1] == "/":
                 try:
                     index_path = "{}index.html".format(rel_path)
-                    ContentArtifact.objects.get(
-                        content__in=repo_version.content, relative_path=index_path
+                    await self._run_in_db_thread(
+                        get_contentartifact_blocking, repo_version, index_path
                     )
                     rel_path = index_path
                 except ObjectDoesNotExist:
                     dir_list = await self.list_directory(repo_version, None, rel_path)
-                    dir_list.update(distro.content_handler_list_directory(rel_path))
+                    dir_list.update(
+                        await self._run_in_db_thread(
+                            distro.content_handler_list_directory, rel_path
+                        )
+                    )
                     return HTTPOk(
                         headers={"Content-Type": "text/html"}, body=self.render_html(dir_list)
                     )
 
             try:
-                ca = ContentArtifact.objects.get(
-                    content__in=repo_version.content, relative_path=rel_path
+                ca = await self._run_in_db_thread(
+                    get_contentartifact_blocking, repo_version, rel_path
                 )
             except MultipleObjectsReturned:
                 log.error(
@@ -449,11 +1195,12 @@ class Handler:
                         request, StreamResponse(headers=headers), ca
                     )
 
-        if distro.remote:
-            remote = distro.remote.cast()
+        remote = await self._run_in_db_thread(get_remote_blocking)
+
+        if remote:
             try:
                 url = remote.get_remote_artifact_url(rel_path)
-                ra = RemoteArtifact.objects.get(remote=remote, url=url)
+                ra = await self._run_in_db_thread(get_remote_artifact_blocking, remote, url)
                 ca = ra.content_artifact
                 if ca.artifact:
                     return self._serve_content_artifact(ca, headers)
@@ -492,7 +1239,11 @@ class Handler:
                 :class:`~pulpcore.plugin.models.ContentArtifact` returned the binary data needed for
                 the client.
         """
-        for remote_artifact in content_artifact.remoteartifact_set.all():
+
+        def get_remote_artifacts_blocking():
+            return list(content_artifact.remoteartifact_set.select_related("remote"))
+
+        for remote_artifact in await self._run_in_db_thread(get_remote_artifacts_blocking):
             try:
                 response = await self._stream_remote_artifact(request, response, remote_artifact)
                 return response
@@ -527,12 +1278,15 @@ class Handler:
         content_artifact = remote_artifact.content_artifact
         remote = remote_artifact.remote
         artifact = Artifact(**download_result.artifact_attributes, file=download_result.path)
+        artifact.file.owned = download_result.owned
+        created = True
         with transaction.atomic():
             try:
                 with transaction.atomic():
                     artifact.save()
             except IntegrityError:
                 artifact = Artifact.objects.get(artifact.q())
+                created = False
             update_content_artifact = True
             if content_artifact._state.adding:
                 # This is the first time pull-through content was requested.
@@ -566,6 +1320,11 @@ class Handler:
             if update_content_artifact:
                 content_artifact.artifact = artifact
                 content_artifact.save()
+        if created and not all(getattr(artifact, digest) for digest in Artifact.DIGEST_FIELDS):
+            # The artifact was downloaded with LAZY_ARTIFACT_DIGESTS enabled.
+            enqueue_with_reservation(
+                fill_missing_artifact_digests, [], kwargs={"artifact_pks": [str(artifact.pk)]}
+            )
         return artifact
 
     def _serve_content_artifact(self, content_artifact, headers):
@@ -587,6 +1346,7 @@ class Handler:
         Returns:
             The :class:`aiohttp.web.FileResponse` for the file.
         """
+        headers.update(self.artifact_headers(content_artifact.artifact))
         if settings.DEFAULT_FILE_STORAGE == "pulpcore.app.models.storage.FileSystem":
             filename = content_artifact.artifact.file.name
             return FileResponse(os.path.join(settings.MEDIA_ROOT, filename), headers=headers)
@@ -606,6 +1366,8 @@ class Handler:
         """
         Stream and save a RemoteArtifact.
 
+        Requests for the same RemoteArtifact share a single download, see :class:`SharedDownload`.
+
         Args:
             request(:class:`~aiohttp.web.Request`): The request to prepare a response for.
             response (:class:`~aiohttp.web.StreamResponse`): The response to stream data to.
@@ -619,17 +1381,129 @@ class Handler:
                 the client.
 
         """
-        remote = remote_artifact.remote.cast()
+        etag = '"{}"'.format(remote_artifact.sha256) if remote_artifact.sha256 else None
+        if etag is not None:
+            response.headers["ETag"] = etag
+            if self._not_modified(request, response.headers):
+                return HTTPNotModified(headers={"ETag": etag})
+
+        key = (remote_artifact.remote_id, remote_artifact.url)
+        shared_download = self._shared_downloads.get(key)
+        if shared_download is None:
+            shared_download = self._shared_downloads[key] = SharedDownload()
+            asyncio.ensure_future(
+                self._download_remote_artifact(key, remote_artifact, shared_download)
+            )
 
-        async def handle_headers(headers):
+        if not shared_download.started:
+            reader = SharedDownloadReader(shared_download)
+        else:
+            # Too late to stream along, replay the data downloaded so far.
+            reader = await shared_download.replay()
+            if reader is None and not shared_download.saves_artifact:
+                # Nothing will be saved to serve, download it again for this request right away.
+                shared_download = self._start_private_download(key, remote_artifact)
+                reader = SharedDownloadReader(shared_download)
+            elif reader is None:
+                # Serve the artifact once it is saved.
+                artifact = await asyncio.shield(shared_download.result)
+                if artifact is None:
+                    return await self._stream_remote_artifact(request, response, remote_artifact)
+                content_artifact = remote_artifact.content_artifact
+                content_artifact.artifact = artifact
+                return self._serve_content_artifact(content_artifact, response.headers)
+
+        try:
+            headers = await asyncio.shield(shared_download.headers)
             for name, value in headers.items():
                 if name.lower() in self.hop_by_hop_headers:
                     continue
                 response.headers[name] = value
+
+            size = remote_artifact.size
+            if size is None and "Content-Length" in headers and "Content-Encoding" not in headers:
+                size = int(headers["Content-Length"])
+            if etag is not None:
+                response.headers["ETag"] = etag
+            start, stop = 0, None
+            byte_range = self._byte_range(request, etag, size)
+            if byte_range is not None:
+                start, stop = byte_range
+                response.set_status(HTTPPartialContent.status_code)
+                response.headers["Content-Range"] = "bytes %d-%d/%d" % (start, stop - 1, size)
+                response.headers["Content-Length"] = str(stop - start)
+            if size is not None:
+                response.headers["Accept-Ranges"] = "bytes"
             await response.prepare(request)
 
+            offset = 0
+            while stop is None or offset < stop:
+                try:
+                    data = await reader.read()
+                except FollowerLagging:
+                    # Download it again for this request, skipping the data already streamed.
+                    reader.close()
+                    reader = SharedDownloadReader(
+                        self._start_private_download(key, remote_artifact)
+                    )
+                    start, offset = max(start, offset), 0
+                    continue
+                if data is None:
+                    break
+                data_offset, offset = offset, offset + len(data)
+                if offset > start:
+                    data_stop = None if stop is None else stop - data_offset
+                    await response.write(data[max(start - data_offset, 0) : data_stop])
+        finally:
+            reader.close()
+        await response.write_eof()
+
+        if response.status == 404:
+            raise HTTPNotFound()
+        return response
+
+    def _start_private_download(self, key, remote_artifact):
+        """
+        Start a download of a RemoteArtifact for a single request, not shared with later ones.
+
+        Args:
+            key (tuple): The key of the shared download of the RemoteArtifact.
+            remote_artifact (:class:`~pulpcore.plugin.models.RemoteArtifact`): The RemoteArtifact
+                to fetch.
+
+        Returns:
+            SharedDownload: The download, to be followed right away.
+        """
+        shared_download = SharedDownload()
+        asyncio.ensure_future(self._download_remote_artifact(key, remote_artifact, shared_download))
+        return shared_download
+
+    async def _download_remote_artifact(self, key, remote_artifact, shared_download):
+        """
+        Download and save a RemoteArtifact, publishing the data to the requests following along.
+
+        The download runs in its own task, so it is not interrupted when the client that started
+        it goes away. For the streamed policy, the download stops once no client follows it.
+        Downloads of other policies can be replayed by late requests while they are written to
+        their file.
+
+        Args:
+            key (tuple): The key of the download in progress in this content app process.
+            remote_artifact (:class:`~pulpcore.plugin.models.RemoteArtifact`): The RemoteArtifact
+                to fetch.
+            shared_download (:class:`SharedDownload`): The download to publish data to.
+        """
+
+        def get_remote_blocking():
+            return remote_artifact.remote.cast()
+
+        async def handle_headers(headers):
+            shared_download.set_headers(headers)
+
         async def handle_data(data):
-            await response.write(data)
+            if remote.policy == Remote.STREAMED and not shared_download.has_followers:
+                raise DownloadAbandoned()
+            await shared_download.publish(data)
             if remote.policy != Remote.STREAMED:
                 await original_handle_data(data)
 
@@ -637,19 +1511,42 @@ class Handler:
             if remote.policy != Remote.STREAMED:
                 await original_finalize()
 
-        downloader = remote.get_downloader(
-            remote_artifact=remote_artifact, headers_ready_callback=handle_headers
-        )
-        original_handle_data = downloader.handle_data
-        downloader.handle_data = handle_data
-        original_finalize = downloader.finalize
-        downloader.finalize = finalize
-        download_result = await downloader.run()
-
-        if remote.policy != Remote.STREAMED:
-            self._save_artifact(download_result, remote_artifact)
-        await response.write_eof()
-
-        if response.status == 404:
-            raise HTTPNotFound()
-        return response
+        data_handler = None
+        try:
+            remote = await self._run_in_db_thread(get_remote_blocking)
+            shared_download.saves_artifact = remote.policy != Remote.STREAMED
+            downloader = remote.get_downloader(
+                remote_artifact=remote_artifact, headers_ready_callback=handle_headers
+            )
+            if remote.policy != Remote.STREAMED and OffloadedDataHandler.offloadable(downloader):
+                data_handler = OffloadedDataHandler(downloader)
+                shared_download.data_handler = data_handler
+                original_handle_data = data_handler.handle_data
+                original_finalize = data_handler.finalize
+            else:
+                original_handle_data = downloader.handle_data
+                original_finalize = downloader.finalize
+            downloader.handle_data = handle_data
+            downloader.finalize = finalize
+            download_result = await downloader.run()
+            # The file is about to be moved to the artifact storage, late requests cannot open it.
+            shared_download.data_handler = None
+
+            artifact = None
+            if remote.policy != Remote.STREAMED:
+                artifact = await self._run_in_db_thread(
+                    self._save_artifact, download_result, remote_artifact
+                )
+        except DownloadAbandoned:
+            # Requests waiting for the end of the download start their own.
+            await shared_download.finish(None)
+        except Exception as exc:
+            shared_download.fail(exc)
+        else:
+            await shared_download.finish(artifact)
+        finally:
+            shared_download.data_handler = None
+            if data_handler is not None:
+                data_handler.cancel()
+            if self._shared_downloads.get(key) is shared_download:
+                del self._shared_downloads[key]
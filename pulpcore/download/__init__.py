@@ -1,4 +1,6 @@
+from .bandwidth import TokenBucket  # noqa
 from .base import BaseDownloader, DownloadResult  # noqa
+from .concurrency import AdaptiveSemaphore  # noqa
 from .factory import DownloaderFactory  # noqa
 from .file import FileDownloader  # noqa
 from .http import http_giveup, HttpDownloader  # noqa
@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+from django.conf import settings
+from rq.job import get_current_job
+
+_worker_bucket = None
+# The buckets of the remotes, keyed on the pk of the remote.
+_remote_buckets = {}
+
+
+class TokenBucket:
+    """
+    A token bucket limiting the number of bytes downloaded per second.
+
+    The bucket fills with `rate` tokens per second, up to `capacity` tokens. Downloading a chunk of
+    data takes as many tokens as it has bytes, and waits while the bucket does not hold enough.
+
+    Tokens are taken before waiting, so the bucket can go into debt. Downloaders sharing a bucket
+    are then served in the order they asked for tokens, each getting a fair share of the rate.
+    The bucket holds no event loop objects, so it can be shared by downloaders running in
+    different event loops one after the other.
+
+    Args:
+        rate (int): The number of bytes allowed per second.
+        capacity (int): The number of bytes which can be downloaded in a burst, which defaults to
+            one second worth of `rate`.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _take(self, amount):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= amount
+        return max(0.0, -self._tokens / self.rate)
+
+    async def consume(self, amount):
+        """
+        Take `amount` tokens from the bucket, waiting until they are available.
+
+        Args:
+            amount (int): The number of bytes downloaded.
+        """
+        delay = self._take(amount)
+        if delay:
+            await asyncio.sleep(delay)
+
+
+def get_remote_bucket(remote):
+    """
+    Get the bucket shared by all the downloads of a remote in this process.
+
+    The same bucket is returned for every instance of the remote, so the downloads of the content
+    app, which builds downloaders from a new instance with each request, are limited together.
+
+    Args:
+        remote (:class:`~pulpcore.plugin.models.Remote`): The remote.
+
+    Returns:
+        :class:`TokenBucket`: The bucket limiting downloads to the `bandwidth_limit` of the
+            remote, or None if it is not set.
+    """
+    rate = remote.bandwidth_limit
+    if not rate:
+        _remote_buckets.pop(remote.pk, None)
+        return None
+    bucket = _remote_buckets.get(remote.pk)
+    if bucket is None or bucket.rate != rate:
+        bucket = _remote_buckets[remote.pk] = TokenBucket(rate)
+    return bucket
+
+
+def get_worker_bucket():
+    """
+    Get the bucket shared by all the downloads of the tasks of this worker process.
+
+    Downloads outside of tasks, e.g. the on-demand downloads of the content app, are not limited,
+    so syncs do not slow down serving content.
+
+    Returns:
+        :class:`TokenBucket`: The bucket limiting downloads to the ``DOWNLOAD_BANDWIDTH_LIMIT``
+            setting, or None if the setting is not set or no task is running.
+    """
+    global _worker_bucket
+    rate = settings.DOWNLOAD_BANDWIDTH_LIMIT
+    if not rate or get_current_job() is None:
+        return None
+    if _worker_bucket is None or _worker_bucket.rate != rate:
+        _worker_bucket = TokenBucket(rate)
+    return _worker_bucket
@@ -1,18 +1,52 @@
 import asyncio
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+import fcntl
 import hashlib
 import logging
 import os
+import shutil
 import tempfile
+import threading
+import time
+
+from django.conf import settings
 
 from pulpcore.app.models import Artifact
 from pulpcore.exceptions import DigestValidationError, SizeValidationError
 
+from .partial import get_partial_download_path
+
 
 log = logging.getLogger(__name__)
 
+_hashing_executor = None
+_hashing_executor_lock = threading.Lock()
+
 
-DownloadResult = namedtuple("DownloadResult", ["url", "artifact_attributes", "path", "headers"])
+def get_hashing_executor():
+    """
+    Get the executor whose threads compute the digests of downloads for this process.
+
+    Returns:
+        :class:`concurrent.futures.ThreadPoolExecutor`: The hashing executor, with
+            ``DOWNLOAD_HASHING_THREADS`` threads.
+    """
+    global _hashing_executor
+
+    with _hashing_executor_lock:
+        if _hashing_executor is None:
+            _hashing_executor = ThreadPoolExecutor(
+                max_workers=settings.DOWNLOAD_HASHING_THREADS or os.cpu_count() or 1,
+                thread_name_prefix="pulp-hashing",
+            )
+        return _hashing_executor
+
+
+DownloadResult = namedtuple(
+    "DownloadResult", ["url", "artifact_attributes", "path", "headers", "owned"]
+)
+DownloadResult.__new__.__defaults__ = (True,)
 """
 Args:
     url (str): The url corresponding with the download.
@@ -22,6 +56,10 @@ Args:
         along with size information.
     headers (aiohttp.multidict.MultiDict): HTTP response headers. The keys are header names. The
         values are header content. None when not using the HttpDownloader or sublclass.
+    owned (bool): Whether the file at `path` was created by the downloader, so it may be moved
+        into the artifact storage. Defaults to True. When False, e.g. for the files read by the
+        :class:`~pulpcore.plugin.download.FileDownloader`, the file is linked or copied, and left
+        in place.
 """
 
 
@@ -54,6 +92,25 @@ class BaseDownloader:
     data written to the file-like object is quiesced to disk before the file-like object has
     `close()` called on it.
 
+    All the digests of :attr:`~pulpcore.plugin.models.Artifact.DIGEST_FIELDS` are computed, unless
+    ``LAZY_ARTIFACT_DIGESTS`` is enabled. Then only the sha256 digest and the ``expected_digests``
+    are computed, and the other digests are left out of
+    :attr:`~pulpcore.plugin.download.BaseDownloader.artifact_attributes`.
+
+    The digests of chunks of at least :attr:`hashing_offload_size` bytes are computed concurrently,
+    one algorithm per thread of the hashing executor, see :func:`get_hashing_executor`. hashlib
+    releases the GIL while hashing, so the event loop keeps reading the next chunk meanwhile.
+
+    The time spent on the download is reported by
+    :attr:`~pulpcore.plugin.download.BaseDownloader.timings`.
+
+    Downloaders which can resume a download, like the
+    :class:`~pulpcore.plugin.download.HttpDownloader`, write the data of downloads with
+    ``expected_digests`` to a partial download file instead of a temporary file, see
+    :meth:`~pulpcore.plugin.download.BaseDownloader._open_partial_file`. The file is kept when the
+    download fails, so a later download of the same url with the same expected digests resumes
+    from the data it holds, even in another task.
+
     Attributes:
         url (str): The url to download.
         expected_digests (dict): Keyed on the algorithm name provided by hashlib and stores the
@@ -63,6 +120,10 @@ class BaseDownloader:
             ``custom_file_object`` option was specified, otherwise None.
     """
 
+    #: Chunks smaller than this are hashed on the calling thread. hashlib only releases the GIL
+    #: for large buffers, and handing small chunks over to threads costs more than it saves.
+    hashing_offload_size = 65536
+
     def __init__(
         self,
         url,
@@ -94,8 +155,17 @@ class BaseDownloader:
             self.semaphore = semaphore
         else:
             self.semaphore = asyncio.Semaphore()  # This will always be acquired
-        self._digests = {n: hashlib.new(n) for n in Artifact.DIGEST_FIELDS}
+        if settings.LAZY_ARTIFACT_DIGESTS:
+            algorithms = {"sha256"}.union(expected_digests or ())
+        else:
+            algorithms = Artifact.DIGEST_FIELDS
+        self._digests = {n: hashlib.new(n) for n in algorithms}
+        self._pending_digests = []
         self._size = 0
+        self._partial = False
+        self._network_time = 0.0
+        self._hash_times = dict.fromkeys(self._digests, 0.0)
+        self._disk_time = 0.0
 
     def _ensure_writer_has_open_file(self):
         """
@@ -108,6 +178,102 @@ class BaseDownloader:
             self._writer = tempfile.NamedTemporaryFile(dir=os.getcwd(), delete=False)
             self.path = self._writer.name
 
+    def _handles_data_by_default(self):
+        """
+        Whether the data handling methods are the ones of the BaseDownloader.
+
+        Returns:
+            bool: False when handle_data() or finalize() are overridden, e.g. to stream the data.
+        """
+        return (
+            getattr(self.handle_data, "__func__", None) is BaseDownloader.handle_data
+            and getattr(self.finalize, "__func__", None) is BaseDownloader.finalize
+        )
+
+    def _open_partial_file(self):
+        """
+        Write the download to its partial download file, and compute the digests of its data.
+
+        The data already in the file is not downloaded again, the download is resumed after it.
+        Downloads without ``expected_digests``, with a ``custom_file_object``, or which handle
+        their data in other ways, are not written to a partial download file. Neither are
+        downloads whose partial download file is being written by another downloader.
+
+        This does blocking disk I/O and hashing. It may be run in a thread.
+
+        Returns:
+            int: The number of bytes the download resumes from.
+        """
+        if self._writer or not self.expected_digests or not self._handles_data_by_default():
+            return self._size
+        path = get_partial_download_path(self.url, self.expected_digests)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        writer = open(path, "a+b")
+        try:
+            fcntl.flock(writer, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            # The file may have been moved away by its previous downloader before it was locked.
+            if os.fstat(writer.fileno()).st_ino != os.stat(path).st_ino:
+                raise BlockingIOError()
+        except (BlockingIOError, FileNotFoundError):
+            writer.close()
+            return self._size
+
+        started = time.perf_counter()
+        writer.seek(0)
+        buffer = bytearray(1048576)  # 1 megabyte
+        view = memoryview(buffer)
+        while True:
+            size = writer.readinto(buffer)
+            if not size:
+                break
+            self._record_size_and_digests_for_data(view[:size])
+        self._disk_time += time.perf_counter() - started
+        self._writer = writer
+        self.path = path
+        self._partial = True
+        if self.expected_size and self._size > self.expected_size:
+            self._restart_blocking()
+        return self._size
+
+    def _close_partial_file(self):
+        """
+        Close the partial download file of a download which failed, keeping it to be resumed.
+
+        This releases its lock, so the next download of the same url resumes it. The data handled
+        so far is discarded, it is read again from the file if the download runs again.
+        """
+        if not self._partial:
+            return
+        self._writer.close()
+        self._writer = None
+        self.path = None
+        self._partial = False
+        self._pending_digests = []
+        self._digests = {n: hashlib.new(n) for n in self._digests}
+        self._size = 0
+
+    async def _restart(self):
+        """
+        Discard the data handled so far, to download it again from the start.
+        """
+        await self._wait_for_digests()
+        self._restart_blocking()
+
+    def _restart_blocking(self):
+        """
+        Discard the data handled so far, to download it again from the start.
+
+        Raises:
+            ValueError: When the data was written to a ``custom_file_object``.
+        """
+        if self._writer and self.path is None:
+            raise ValueError("The data written to a custom file object cannot be discarded.")
+        if self._writer:
+            self._writer.seek(0)
+            self._writer.truncate()
+        self._digests = {n: hashlib.new(n) for n in self._digests}
+        self._size = 0
+
     async def handle_data(self, data):
         """
         A coroutine that writes data to the file object and compute its digests.
@@ -120,9 +286,52 @@ class BaseDownloader:
         Args:
             data (bytes): The data to be handled by the downloader.
         """
+        await self._wait_for_digests()
+        self._write(data)
+        self._size += len(data)
+        if len(data) < self.hashing_offload_size:
+            for algorithm in self._digests:
+                self._update_digest(algorithm, data)
+        else:
+            loop = asyncio.get_event_loop()
+            executor = get_hashing_executor()
+            self._pending_digests = [
+                loop.run_in_executor(executor, self._update_digest, algorithm, data)
+                for algorithm in self._digests
+            ]
+
+    async def _wait_for_digests(self):
+        """
+        Wait for the digests of the previous chunk of data to be updated.
+        """
+        pending, self._pending_digests = self._pending_digests, []
+        if pending:
+            await asyncio.gather(*pending)
+
+    def _handle_data_blocking(self, data):
+        """
+        Write data to the file object and compute its digests.
+
+        This does blocking disk I/O and hashing. It may be run in a thread, but not concurrently
+        with itself or with :meth:`_finalize_blocking`.
+
+        Args:
+            data (bytes): The data to be handled by the downloader.
+        """
+        self._write(data)
+        self._record_size_and_digests_for_data(data)
+
+    def _write(self, data):
+        """
+        Write data to the file object.
+
+        Args:
+            data (bytes): The data to be written.
+        """
+        started = time.perf_counter()
         self._ensure_writer_has_open_file()
         self._writer.write(data)
-        self._record_size_and_digests_for_data(data)
+        self._disk_time += time.perf_counter() - started
 
     async def finalize(self):
         """
@@ -139,12 +348,50 @@ class BaseDownloader:
                 doesn't match the size of the data passed to
                 :meth:`~pulpcore.plugin.download.BaseDownloader.handle_data`.
         """
+        await self._wait_for_digests()
+        self._finalize_blocking()
+
+    def _finalize_blocking(self):
+        """
+        Flush downloaded data, close the file writer, and validate the data.
+
+        This does blocking disk I/O. It may be run in a thread, but not concurrently with
+        :meth:`_handle_data_blocking`.
+
+        Raises:
+            :class:`~pulpcore.exceptions.DigestValidationError`: When any of the ``expected_digest``
+                values don't match the digest of the data.
+            :class:`~pulpcore.exceptions.SizeValidationError`: When the ``expected_size`` value
+                doesn't match the size of the data.
+        """
+        started = time.perf_counter()
         self._ensure_writer_has_open_file()
         self._writer.flush()
         os.fsync(self._writer.fileno())
-        self._writer.close()
-        self.validate_digests()
-        self.validate_size()
+        self._disk_time += time.perf_counter() - started
+        try:
+            self.validate_digests()
+            self.validate_size()
+        except (DigestValidationError, SizeValidationError):
+            if self._partial:
+                os.unlink(self.path)
+            raise
+        else:
+            if self._partial:
+                self._move_partial_file()
+        finally:
+            self._writer.close()
+
+    def _move_partial_file(self):
+        """
+        Move the complete partial download file to a temporary file in the current directory.
+
+        This is done while the file is locked, so no other downloader resumes it meanwhile.
+        """
+        fd, path = tempfile.mkstemp(dir=os.getcwd())
+        os.close(fd)
+        shutil.move(self.path, path)
+        self.path = path
 
     def fetch(self):
         """
@@ -166,19 +413,60 @@ class BaseDownloader:
         Args:
             data (bytes): The data to have its size and digest values recorded.
         """
-        for algorithm in self._digests.values():
-            algorithm.update(data)
+        if len(data) < self.hashing_offload_size:
+            for algorithm in self._digests:
+                self._update_digest(algorithm, data)
+        else:
+            executor = get_hashing_executor()
+            wait(
+                [
+                    executor.submit(self._update_digest, algorithm, data)
+                    for algorithm in self._digests
+                ]
+            )
         self._size += len(data)
 
+    def _update_digest(self, algorithm, data):
+        """
+        Update one of the digests with a chunk of data.
+
+        The digests of different algorithms may be updated concurrently, but each digest must be
+        updated with one chunk at a time, in order.
+
+        Args:
+            algorithm (str): The name of the digest algorithm.
+            data (bytes): The data to update the digest with.
+        """
+        started = time.perf_counter()
+        self._digests[algorithm].update(data)
+        self._hash_times[algorithm] += time.perf_counter() - started
+
+    @property
+    def timings(self):
+        """
+        A property that returns a dictionary with the number of seconds spent on the download.
+
+        The ``network`` key is the time spent waiting for data from the source, ``hash`` the time
+        spent computing digests, summed over all the algorithms, and ``disk`` the time spent
+        writing and syncing the data to disk.
+        """
+        return {
+            "network": self._network_time,
+            "hash": sum(self._hash_times.values()),
+            "disk": self._disk_time,
+        }
+
     @property
     def artifact_attributes(self):
         """
         A property that returns a dictionary with size and digest information. The keys of this
-        dictionary correspond with :class:`~pulpcore.plugin.models.Artifact` fields.
+        dictionary correspond with :class:`~pulpcore.plugin.models.Artifact` fields. Only the
+        digests computed are included.
         """
         attributes = {"size": self._size}
         for algorithm in Artifact.DIGEST_FIELDS:
-            attributes[algorithm] = self._digests[algorithm].hexdigest()
+            if algorithm in self._digests:
+                attributes[algorithm] = self._digests[algorithm].hexdigest()
         return attributes
 
     def validate_digests(self):
@@ -224,7 +512,12 @@ class BaseDownloader:
 
         """
         async with self.semaphore:
-            return await self._run(extra_data=extra_data)
+            result = await self._run(extra_data=extra_data)
+            # Let an adaptive semaphore measure the bytes downloaded per second.
+            downloaded = getattr(self.semaphore, "downloaded", None)
+            if downloaded:
+                downloaded(self._size)
+            return result
 
     async def _run(self, extra_data=None):
         """
@@ -0,0 +1,164 @@
+import asyncio
+import collections
+import time
+
+import aiohttp
+
+#: HTTP status codes of responses telling a client to slow down.
+CONGESTION_STATUS_CODES = (429, 502, 503, 504)
+
+
+def is_congestion_error(exc):
+    """
+    Whether a download error is a sign that the server is overloaded.
+
+    Args:
+        exc (Exception): The error raised by a downloader.
+
+    Returns:
+        bool: True for timeouts, and for HTTP 429 Too Many Requests and 502, 503 or 504 responses.
+    """
+    if isinstance(exc, asyncio.TimeoutError):
+        return True
+    return isinstance(exc, aiohttp.ClientResponseError) and exc.status in CONGESTION_STATUS_CODES
+
+
+class AdaptiveSemaphore:
+    """
+    A semaphore whose limit adapts to how fast the downloads holding it complete.
+
+    The limit is controlled the way TCP controls its congestion window, with additive increase and
+    multiplicative decrease (AIMD). Downloads are measured in rounds, a round ending once as many
+    downloads as the limit completed. At the end of each round, the limit is doubled (slow start)
+    or increased by one (congestion avoidance) if the bytes downloaded per second beat the best rate
+    of the previous rounds. Slow start ends the first time they do not. The downloads report their
+    size with :meth:`downloaded`, the rate of rounds whose downloads report none is measured in
+    downloads per second instead.
+
+    On a sign of congestion, i.e. an error for which :func:`is_congestion_error` is True or a
+    response the downloader retries, the limit is halved. Downloads already running when the limit
+    was halved cannot halve it again, and the best rate is forgotten.
+
+    It can be used in place of the :class:`asyncio.Semaphore` of a downloader.
+
+    Args:
+        maximum (int): The maximum limit.
+        initial (int): The initial limit, which defaults to :attr:`initial_limit`.
+        semaphore (asyncio.Semaphore): An optional semaphore also acquired by the downloads, e.g.
+            to bound the downloads of several hosts together.
+
+    Attributes:
+        limit (int): The current number of downloads allowed to run at once.
+    """
+
+    #: The default initial limit.
+    initial_limit = 4
+
+    def __init__(self, maximum, initial=None, semaphore=None):
+        self.maximum = maximum
+        self.limit = max(1, min(maximum, initial or self.initial_limit))
+        self._semaphore = semaphore
+        self._active = 0
+        self._waiters = collections.deque()
+        self._slow_start = True
+        self._holdoff = 0
+        self._best_rate = 0.0
+        self._start_round()
+
+    def _start_round(self):
+        self._round_started = time.monotonic()
+        self._round_completed = 0
+        self._round_bytes = 0
+
+    def _wake_up(self):
+        available = self.limit - self._active
+        while available > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                available -= 1
+
+    async def acquire(self):
+        """
+        Wait until fewer downloads than the limit are running, then count one more.
+        """
+        while self._active >= self.limit:
+            waiter = asyncio.get_event_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # It was woken up, let another waiter take its place.
+                    self._wake_up()
+                raise
+        self._active += 1
+        if self._semaphore is not None:
+            try:
+                await self._semaphore.acquire()
+            except asyncio.CancelledError:
+                self._active -= 1
+                self._wake_up()
+                raise
+
+    def downloaded(self, size):
+        """
+        Count the bytes of a download which succeeded, before it releases the semaphore.
+
+        Args:
+            size (int): The number of bytes downloaded.
+        """
+        self._round_bytes += size
+
+    def release(self, exc=None):
+        """
+        Count one download less, and adapt the limit to its outcome.
+
+        Args:
+            exc (Exception): The error the download failed with, or None if it succeeded.
+        """
+        self._active -= 1
+        if self._semaphore is not None:
+            self._semaphore.release()
+        if self._holdoff:
+            self._holdoff -= 1
+        if exc is None:
+            self._completed()
+        elif is_congestion_error(exc):
+            self.congested()
+        self._wake_up()
+
+    def _completed(self):
+        self._round_completed += 1
+        if self._round_completed < self.limit:
+            return
+        elapsed = time.monotonic() - self._round_started
+        completed = self._round_bytes or self._round_completed
+        rate = completed / elapsed if elapsed > 0 else float("inf")
+        if rate > self._best_rate:
+            if self._slow_start:
+                self.limit = min(self.maximum, self.limit * 2)
+            else:
+                self.limit = min(self.maximum, self.limit + 1)
+            self._best_rate = rate
+        else:
+            self._slow_start = False
+        self._start_round()
+
+    def congested(self):
+        """
+        Halve the limit, unless it was already halved while the running downloads were running.
+        """
+        if self._holdoff:
+            return
+        self.limit = max(1, self.limit // 2)
+        self._slow_start = False
+        self._holdoff = self._active
+        self._best_rate = 0.0
+        self._start_round()
+
+    async def __aenter__(self):
+        await self.acquire()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release(exc)
@@ -11,7 +11,10 @@ from tempfile import NamedTemporaryFile
 from urllib.parse import urlparse
 
 import aiohttp
+from django.conf import settings
 
+from .bandwidth import get_remote_bucket, get_worker_bucket
+from .concurrency import AdaptiveSemaphore
 from .http import HttpDownloader
 from .file import FileDownloader
 
@@ -55,9 +58,27 @@ class DownloaderFactory:
     allow for an active download to be arbitrarily long, while still detecting dead or closed
     sessions even when TCPKeepAlive is disabled.
 
-    Also for http and https urls, even though HTTP 1.1 is used, the TCP connection is setup and
-    closed with each request. This is done for compatibility reasons due to various issues related
-    to session continuation implementation in various servers.
+    Also for http and https urls, connections are kept alive and reused by subsequent requests to
+    the same host, up to `download_concurrency` connections per host. Idle connections are closed
+    after ``DOWNLOAD_KEEPALIVE_TIMEOUT`` seconds. Requests are never pipelined, a connection is only
+    reused once the previous response has been read entirely. Remotes with `keep_alive` disabled
+    setup and close the TCP connection with each request instead, for compatibility with servers
+    whose session continuation implementation is broken.
+
+    The number of connections created and reused by the downloaders built are counted in the
+    ``connections_created`` and ``connections_reused`` attributes.
+
+    The downloaders built share a semaphore allowing up to `download_concurrency` downloads at
+    once. The downloads from each http or https host are additionally limited by an
+    :class:`~pulpcore.plugin.download.AdaptiveSemaphore`, which raises the number of downloads
+    from the host up to `download_concurrency` as long as the host serves more bytes per second, and
+    lowers it when the host times out or asks to slow down.
+
+    The http and https downloaders built share a :class:`~pulpcore.plugin.download.TokenBucket`
+    limiting their bandwidth to the `bandwidth_limit` of the remote, if it is set, together with
+    all the other downloads of the remote in the process. Downloads of tasks are also limited
+    together with all the other downloads of the tasks of the worker by the
+    ``DOWNLOAD_BANDWIDTH_LIMIT`` setting.
     """
 
     def __init__(self, remote, downloader_overrides=None):
@@ -79,20 +100,34 @@ class DownloaderFactory:
             "http": self._http_or_https,
             "file": self._generic,
         }
+        self.connections_created = 0
+        self.connections_reused = 0
         self._session = self._make_aiohttp_session_from_remote()
         self._semaphore = asyncio.Semaphore(value=remote.download_concurrency)
+        self._host_semaphores = {}
+        self._buckets = [
+            bucket for bucket in (get_remote_bucket(remote), get_worker_bucket()) if bucket
+        ]
         atexit.register(self._session.close)
 
     def _make_aiohttp_session_from_remote(self):
         """
         Build a :class:`aiohttp.ClientSession` from the remote's settings and timing settings.
 
-        This method is what provides the force_close of the TCP connection with each request.
+        This method is what provides the pooling of TCP connections, or their force_close with
+        each request for remotes with `keep_alive` disabled.
 
         Returns:
             :class:`aiohttp.ClientSession`
         """
-        tcp_conn_opts = {"force_close": True}
+        if self._remote.keep_alive:
+            tcp_conn_opts = {
+                "limit": 0,
+                "limit_per_host": self._remote.download_concurrency,
+                "keepalive_timeout": settings.DOWNLOAD_KEEPALIVE_TIMEOUT,
+            }
+        else:
+            tcp_conn_opts = {"force_close": True}
 
         sslcontext = None
         if self._remote.ca_cert:
@@ -119,8 +154,20 @@ class DownloaderFactory:
 
         conn = aiohttp.TCPConnector(**tcp_conn_opts)
 
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(self._on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reuseconn)
+
         timeout = aiohttp.ClientTimeout(total=None, sock_connect=600, sock_read=600)
-        return aiohttp.ClientSession(connector=conn, timeout=timeout, headers=headers)
+        return aiohttp.ClientSession(
+            connector=conn, timeout=timeout, headers=headers, trace_configs=[trace_config]
+        )
+
+    async def _on_connection_create_end(self, session, context, params):
+        self.connections_created += 1
+
+    async def _on_connection_reuseconn(self, session, context, params):
+        self.connections_reused += 1
 
     def build(self, url, **kwargs):
         """
@@ -162,7 +209,15 @@ class DownloaderFactory:
             :class:`~pulpcore.plugin.download.HttpDownloader`: A downloader that
             is configured with the remote settings.
         """
-        options = {"session": self._session}
+        host = urlparse(url).netloc.lower()
+        try:
+            kwargs["semaphore"] = self._host_semaphores[host]
+        except KeyError:
+            kwargs["semaphore"] = self._host_semaphores[host] = AdaptiveSemaphore(
+                self._remote.download_concurrency, semaphore=self._semaphore
+            )
+
+        options = {"session": self._session, "buckets": self._buckets}
         if self._remote.proxy_url:
             options["proxy"] = self._remote.proxy_url
 
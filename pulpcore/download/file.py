@@ -1,4 +1,6 @@
+import asyncio
 import os
+import time
 
 from urllib.parse import urlparse
 
@@ -12,8 +14,14 @@ class FileDownloader(BaseDownloader):
     A downloader for downloading files from the filesystem.
 
     It provides digest and size validation along with computation of the digests needed to save the
-    file as an Artifact. It writes a new file to the disk and the return path is included in the
-    :class:`~pulpcore.plugin.download.DownloadResult`.
+    file as an Artifact. The path of the file itself is included in the
+    :class:`~pulpcore.plugin.download.DownloadResult`, and the file is only read to compute its
+    digests. The file is not owned by Pulp, so saving an Artifact copies it into the artifact
+    storage, cloning or hard linking it where the filesystem allows, and never moves it, see
+    :class:`~pulpcore.app.models.storage.FileSystem`.
+
+    When a ``custom_file_object`` is passed, or the data handling methods are overridden, the data
+    read is passed to :meth:`~pulpcore.plugin.download.BaseDownloader.handle_data` instead.
 
     This downloader has all of the attributes of
     :class:`~pulpcore.plugin.download.BaseDownloader`
@@ -49,9 +57,22 @@ class FileDownloader(BaseDownloader):
         Args:
             extra_data (dict): Extra data passed to the downloader.
         """
+        if self._writer is None and self._handles_data_by_default():
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, self._hash_file_blocking)
+            return DownloadResult(
+                path=self._path,
+                artifact_attributes=self.artifact_attributes,
+                url=self.url,
+                headers=None,
+                owned=False,
+            )
+
         async with aiofiles.open(self._path, "rb") as f_handle:
             while True:
+                started = time.perf_counter()
                 chunk = await f_handle.read(1048576)  # 1 megabyte
+                self._network_time += time.perf_counter() - started
                 if not chunk:
                     await self.finalize()
                     break  # the reading is done
@@ -61,4 +82,28 @@ class FileDownloader(BaseDownloader):
                 artifact_attributes=self.artifact_attributes,
                 url=self.url,
                 headers=None,
+                owned=False,
             )
+
+    def _hash_file_blocking(self):
+        """
+        Read the file into a reused buffer to compute its digests, then validate it.
+
+        Raises:
+            :class:`~pulpcore.exceptions.DigestValidationError`: When any of the ``expected_digest``
+                values don't match the digest of the file.
+            :class:`~pulpcore.exceptions.SizeValidationError`: When the ``expected_size`` value
+                doesn't match the size of the file.
+        """
+        buffer = bytearray(1048576)  # 1 megabyte
+        view = memoryview(buffer)
+        with open(self._path, "rb") as f_handle:
+            while True:
+                started = time.perf_counter()
+                size = f_handle.readinto(buffer)
+                self._network_time += time.perf_counter() - started
+                if not size:
+                    break
+                self._record_size_and_digests_for_data(view[:size])
+        self.validate_digests()
+        self.validate_size()
@@ -1,4 +1,7 @@
+import asyncio
+from gettext import gettext as _
 import logging
+import time
 
 import aiohttp
 import backoff
@@ -32,6 +35,18 @@ def http_giveup(exc):
     return exc.code not in [429, 502, 503, 504]
 
 
+def http_backoff(details):
+    """
+    Report a response the downloader retries as a sign of congestion to its semaphore.
+
+    Args:
+        details (dict): The details of the retry passed by `backoff`.
+    """
+    congested = getattr(details["args"][0].semaphore, "congested", None)
+    if congested:
+        congested()
+
+
 class HttpDownloader(BaseDownloader):
     """
     An HTTP/HTTPS Downloader built on `aiohttp`.
@@ -96,6 +111,12 @@ class HttpDownloader(BaseDownloader):
     The coroutine will automatically retry 10 times with exponential backoff before allowing a
     final exception to be raised.
 
+    Downloads with ``expected_digests`` are written to a partial download file, and resumed with a
+    ``Range`` request from the data already downloaded. Within a download, a transfer interrupted
+    by a connection error or a timeout is resumed up to :attr:`resume_tries` times. A download
+    which failed is resumed by the next download of the same url with the same expected digests.
+    The download starts over when the server does not honor the ``Range`` request.
+
     Attributes:
         session (aiohttp.ClientSession): The session to be used by the downloader.
         auth (aiohttp.BasicAuth): An object that represents HTTP Basic Authorization or None
@@ -106,11 +127,16 @@ class HttpDownloader(BaseDownloader):
             as its argument. The callback will be called when the response headers are
             available. The dictionary passed has the header names as the keys and header values
             as its values. e.g. `{'Transfer-Encoding': 'chunked'}`. This can also be None.
+        buckets (list): The :class:`~pulpcore.plugin.download.TokenBucket` objects limiting the
+            bandwidth of the download.
 
     This downloader also has all of the attributes of
     :class:`~pulpcore.plugin.download.BaseDownloader`
     """
 
+    #: The number of times a transfer interrupted by a connection error or a timeout is resumed.
+    resume_tries = 5
+
     def __init__(
         self,
         url,
@@ -119,6 +145,7 @@ class HttpDownloader(BaseDownloader):
         proxy=None,
         proxy_auth=None,
         headers_ready_callback=None,
+        buckets=(),
         **kwargs,
     ):
         """
@@ -134,6 +161,8 @@ class HttpDownloader(BaseDownloader):
                 as its argument. The callback will be called when the response headers are
                 available. The dictionary passed has the header names as the keys and header values
                 as its values. e.g. `{'Transfer-Encoding': 'chunked'}`
+            buckets (list): :class:`~pulpcore.plugin.download.TokenBucket` objects the data
+                downloaded is taken from, limiting the bandwidth of the download. (optional)
             kwargs (dict): This accepts the parameters of
                 :class:`~pulpcore.plugin.download.BaseDownloader`.
         """
@@ -149,6 +178,7 @@ class HttpDownloader(BaseDownloader):
         self.proxy = proxy
         self.proxy_auth = proxy_auth
         self.headers_ready_callback = headers_ready_callback
+        self.buckets = list(buckets)
         super().__init__(url, **kwargs)
 
     def raise_for_status(self, response):
@@ -177,11 +207,15 @@ class HttpDownloader(BaseDownloader):
         if self.headers_ready_callback:
             await self.headers_ready_callback(response.headers)
         while True:
+            started = time.perf_counter()
             chunk = await response.content.read(1048576)  # 1 megabyte
+            self._network_time += time.perf_counter() - started
             if not chunk:
                 await self.finalize()
                 break  # the download is done
             await self.handle_data(chunk)
+            for bucket in self.buckets:
+                await bucket.consume(len(chunk))
         return DownloadResult(
             path=self.path,
             artifact_attributes=self.artifact_attributes,
@@ -189,8 +223,29 @@ class HttpDownloader(BaseDownloader):
             headers=response.headers,
         )
 
+    @staticmethod
+    def _resumes_at(response, offset):
+        """
+        Whether a response holds the data of the download from an offset on.
+
+        Args:
+            response (aiohttp.ClientResponse): The response to a ``Range`` request.
+            offset (int): The offset the data was requested from.
+
+        Returns:
+            bool: True for a 206 Partial Content response starting at the offset.
+        """
+        if response.status != 206:
+            return False
+        content_range = response.headers.get("Content-Range", "")
+        return content_range.startswith("bytes {}-".format(offset))
+
     @backoff.on_exception(
-        backoff.expo, aiohttp.ClientResponseError, max_tries=10, giveup=http_giveup
+        backoff.expo,
+        aiohttp.ClientResponseError,
+        max_tries=10,
+        giveup=http_giveup,
+        on_backoff=http_backoff,
     )
     async def _run(self, extra_data=None):
         """
@@ -206,10 +261,44 @@ class HttpDownloader(BaseDownloader):
         Args:
             extra_data (dict): Extra data passed by the downloader.
         """
-        async with self.session.get(self.url, proxy=self.proxy, auth=self.auth) as response:
-            self.raise_for_status(response)
-            to_return = await self._handle_response(response)
-            await response.release()
+        if self._writer is None:
+            await asyncio.get_event_loop().run_in_executor(None, self._open_partial_file)
+        resumes = 0
+        try:
+            while True:
+                headers = {"Range": "bytes={}-".format(self._size)} if self._size else None
+                try:
+                    async with self.session.get(
+                        self.url, proxy=self.proxy, auth=self.auth, headers=headers
+                    ) as response:
+                        if headers and response.status == 416:
+                            # The partial download file holds more data than the server has.
+                            await self._restart()
+                            continue
+                        self.raise_for_status(response)
+                        if headers and not self._resumes_at(response, self._size):
+                            await self._restart()
+                        to_return = await self._handle_response(response)
+                        await response.release()
+                    break
+                except (
+                    aiohttp.ClientPayloadError,
+                    aiohttp.ClientConnectionError,
+                    asyncio.TimeoutError,
+                ):
+                    if not self._partial or resumes >= self.resume_tries:
+                        raise
+                    resumes += 1
+                    log.info(
+                        _("Resuming the download of {url} from byte {size}.").format(
+                            url=self.url, size=self._size
+                        )
+                    )
+                    await asyncio.sleep(2 ** resumes)
+        except BaseException:
+            # Release the partial download file, so the next download of the url resumes it.
+            self._close_partial_file()
+            raise
         if self._close_session_on_finalize:
             await self.session.close()
         return to_return
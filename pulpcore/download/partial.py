@@ -0,0 +1,67 @@
+from gettext import gettext as _
+import hashlib
+import logging
+import os
+import time
+
+from django.conf import settings
+
+
+log = logging.getLogger(__name__)
+
+
+def get_partial_downloads_directory():
+    """
+    Get the directory holding the files of the downloads which can be resumed.
+
+    It is in the ``WORKING_DIRECTORY`` but outside of the directory of any worker, so the files
+    outlive the tasks and workers which started the downloads.
+
+    Returns:
+        str: The absolute path of the directory.
+    """
+    return os.path.join(settings.WORKING_DIRECTORY, "partial-downloads")
+
+
+def get_partial_download_path(url, expected_digests):
+    """
+    Get the path of the file holding the data downloaded so far from a url.
+
+    Args:
+        url (str): The url downloaded.
+        expected_digests (dict): The expected digests of the download, keyed on the algorithm.
+
+    Returns:
+        str: The absolute path of the file, which only the downloads of the same url with the same
+            expected digests share.
+    """
+    key = hashlib.sha256(url.encode())
+    for algorithm, digest in sorted(expected_digests.items()):
+        key.update("\n{}:{}".format(algorithm, digest).encode())
+    return os.path.join(get_partial_downloads_directory(), key.hexdigest())
+
+
+def remove_stale_partial_downloads():
+    """
+    Delete the partial downloads not resumed for ``DOWNLOAD_PARTIAL_FILE_MAX_AGE`` seconds.
+
+    Returns:
+        int: The number of files deleted.
+    """
+    directory = get_partial_downloads_directory()
+    oldest = time.time() - settings.DOWNLOAD_PARTIAL_FILE_MAX_AGE
+    removed = 0
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return removed
+    for entry in entries:
+        try:
+            if entry.stat().st_mtime < oldest:
+                os.unlink(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+    if removed:
+        log.info(_("Removed {} stale partial downloads from {}.").format(removed, directory))
+    return removed
@@ -1,8 +1,10 @@
 from pulpcore.download import (  # noqa
+    AdaptiveSemaphore,
     BaseDownloader,
     DownloadResult,
     DownloaderFactory,
     FileDownloader,
     http_giveup,
     HttpDownloader,
+    TokenBucket,
 )
@@ -12,4 +12,5 @@ from .association_stages import (  # noqa
 from .content_stages import ContentSaver, QueryExistingContents, ResolveContentFutures  # noqa
 from .declarative_version import DeclarativeVersion  # noqa
 from .models import DeclarativeArtifact, DeclarativeContent  # noqa
-from .profiler import ProfilingQueue, create_profile_db_and_connection  # noqa
+from .profiler import Histogram, PipelineProfiler, ProfilingQueue, StageProfile  # noqa
+from .queues import MemoryBoundedQueue, approximate_size  # noqa
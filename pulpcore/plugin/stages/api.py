@@ -1,23 +1,159 @@
 import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import logging
+import threading
+import time
 
 from gettext import gettext as _
 
 from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections
 
-from .profiler import ProfilingQueue
+from pulpcore.app.models import Task
+
+from .profiler import PipelineProfiler
+from .queues import MemoryBoundedQueue, approximate_size
 
 
 log = logging.getLogger(__name__)
 
+_db_executor = None
+_db_executor_lock = threading.Lock()
+# The database connections of the threads of the executor, those processing a batch, and the
+# number of pipelines running in this process. The connections are kept open while pipelines run.
+_db_connections = set()
+_db_connections_busy = set()
+_running_pipelines = 0
+
+
+def get_db_executor():
+    """
+    Get the executor whose threads run the database work of the stages of this process.
+
+    Returns:
+        :class:`concurrent.futures.ThreadPoolExecutor`: The executor, with
+            ``STAGES_API_DB_THREADS`` threads.
+    """
+    global _db_executor
+
+    with _db_executor_lock:
+        if _db_executor is None:
+            _db_executor = ThreadPoolExecutor(
+                max_workers=settings.STAGES_API_DB_THREADS, thread_name_prefix="pulp-stages-db"
+            )
+        return _db_executor
+
+
+def _acquire_db_connection():
+    """
+    Get the database connection of the current executor thread to process a batch.
+
+    The connection is kept open from one batch to the next, unless an error left it unusable.
+
+    Returns:
+        The database connection of the current thread.
+    """
+    db_connection = connections[DEFAULT_DB_ALIAS]
+    with _db_executor_lock:
+        if db_connection not in _db_connections:
+            # The connection is closed by the event loop thread once no pipeline runs.
+            db_connection.inc_thread_sharing()
+            _db_connections.add(db_connection)
+        _db_connections_busy.add(db_connection)
+    if db_connection.errors_occurred:
+        if db_connection.is_usable():
+            db_connection.errors_occurred = False
+        else:
+            db_connection.close()
+    return db_connection
+
+
+def _release_db_connection(db_connection):
+    """
+    Release the database connection of the current executor thread once a batch is processed.
+
+    The connection is closed if no pipeline runs anymore.
+
+    Args:
+        db_connection: The connection returned by :func:`_acquire_db_connection`.
+    """
+    with _db_executor_lock:
+        _db_connections_busy.discard(db_connection)
+        if not _running_pipelines:
+            _close_db_connection(db_connection)
+
+
+def _close_db_connection(db_connection):
+    """
+    Close a database connection of an executor thread. Must be called with the lock held.
+    """
+    _db_connections.discard(db_connection)
+    try:
+        db_connection.close()
+    finally:
+        db_connection.dec_thread_sharing()
+
+
+def _start_pipeline():
+    """
+    Count a pipeline starting in this process.
+    """
+    global _running_pipelines
+
+    with _db_executor_lock:
+        _running_pipelines += 1
+
+
+def _finish_pipeline():
+    """
+    Count a pipeline finishing in this process, and close the idle database connections of the
+    executor threads if it was the last one running.
+
+    The connections of threads still processing a batch, of a pipeline that was cancelled, are
+    closed by the threads themselves once done.
+    """
+    global _running_pipelines
+
+    with _db_executor_lock:
+        _running_pipelines -= 1
+        if not _running_pipelines:
+            for db_connection in _db_connections - _db_connections_busy:
+                _close_db_connection(db_connection)
+
 
 class Stage:
     """
     The base class for all Stages API stages.
 
     To make a stage, inherit from this class and implement :meth:`run` on the subclass.
+
+    The size of the batches of :meth:`batches` adapts to how long the stage takes to process them,
+    aiming at :attr:`batch_latency` seconds per batch, between :attr:`min_batch_size` and
+    :attr:`max_batch_size` items. The time the stage waits for room in the queue of the next stage
+    is not part of it. Subclasses can tune these attributes to their work.
+
+    Stages whose work is mostly database queries can process their batches in the threads of
+    :func:`get_db_executor` with :meth:`_process_batches`, so the queries of several batches, and
+    the event loop running the downloads, go on at the same time.
     """
 
+    #: The number of items of the first batch of :meth:`batches`.
+    initial_batch_size = 500
+    #: The minimum number of items of a batch of :meth:`batches`.
+    min_batch_size = 10
+    #: The maximum number of items of a batch of :meth:`batches`.
+    max_batch_size = 10000
+    #: The number of seconds the processing of a batch of :meth:`batches` should take.
+    batch_latency = 1.0
+
+    # The (size, seconds) of the batches processed by _process_batches() since the last batch.
+    _batch_latencies = None
+    # The StageProfile recording the statistics of the stage, when the pipeline is profiled.
+    _profile = None
+    # The number of seconds put() waited for room in the queue of the next stage.
+    _put_wait = 0.0
+
     def __init__(self):
         self._in_q = None
         self._out_q = None
@@ -81,7 +217,7 @@ class Stage:
             log.debug("%(name)s - next: %(content)s.", {"name": self, "content": content})
             yield content
 
-    async def batches(self, minsize=500):
+    async def batches(self, minsize=None):
         """
         Asynchronous iterator yielding batches of :class:`DeclarativeContent` from `self._in_q`.
 
@@ -89,8 +225,18 @@ class Stage:
         :class:`DeclarativeContent` as possible without blocking, but
         at least `minsize` instances.
 
+        Without `minsize`, the minimum batch size starts at :attr:`initial_batch_size` and adapts
+        to the time the stage takes to process each batch, i.e. until it asks for the next one,
+        less the time :meth:`put` waited for the next stage meanwhile. It doubles while batches
+        take less than half of :attr:`batch_latency`, and shrinks in proportion when they take
+        longer.
+
+        A batch is yielded early when its items take as much memory as the queue they come from
+        may hold, see :class:`~pulpcore.plugin.stages.MemoryBoundedQueue`.
+
         Args:
-            minsize (int): The minimum batch size to yield (unless it is the final batch)
+            minsize (int): The minimum batch size to yield (unless it is the final batch). Adapted
+                to the processing time of the batches if not specified.
 
         Yields:
             A list of :class:`DeclarativeContent` instances
@@ -106,13 +252,19 @@ class Stage:
                                 await self.put(d_content)
 
         """
+        adaptive = minsize is None
+        if adaptive:
+            minsize = self.initial_batch_size
+        maxbytes = getattr(self._in_q, "maxbytes", 0)
         batch = []
+        batch_bytes = 0
         shutdown = False
         no_block = False
         thaw_queue_event = asyncio.Event()
 
         def add_to_batch(content):
             nonlocal batch
+            nonlocal batch_bytes
             nonlocal shutdown
             nonlocal no_block
             nonlocal thaw_queue_event
@@ -125,6 +277,8 @@ class Stage:
                     no_block = True
                 content._thaw_queue_event = thaw_queue_event
                 batch.append(content)
+                if maxbytes:
+                    batch_bytes += approximate_size(content)
 
         get_listener = asyncio.ensure_future(self._in_q.get())
         thaw_event_listener = asyncio.ensure_future(thaw_queue_event.wait())
@@ -139,7 +293,7 @@ class Stage:
                 content = await get_listener
                 add_to_batch(content)
                 get_listener = asyncio.ensure_future(self._in_q.get())
-            while not shutdown:
+            while not shutdown and not 0 < maxbytes <= batch_bytes:
                 try:
                     content = self._in_q.get_nowait()
                 except asyncio.QueueEmpty:
@@ -147,19 +301,149 @@ class Stage:
                 else:
                     add_to_batch(content)
 
-            if batch and (len(batch) >= minsize or shutdown or no_block):
+            full = len(batch) >= minsize
+            if batch and (full or shutdown or no_block or 0 < maxbytes <= batch_bytes):
                 log.debug(
                     _("%(name)s - next batch[%(length)d]."), {"name": self, "length": len(batch)}
                 )
                 for content in batch:
                     content._thaw_queue_event = None
                 thaw_queue_event.clear()
+                if self._profile is not None:
+                    self._profile.batch_size.record(len(batch))
+                started = time.monotonic()
+                put_wait = self._put_wait
                 yield batch
+                if adaptive and self._batch_latencies is None:
+                    if full:
+                        latency = time.monotonic() - started - (self._put_wait - put_wait)
+                        minsize = self._adapt_batch_size(minsize, latency)
+                elif adaptive:
+                    for size, latency in self._batch_latencies:
+                        if size >= minsize:
+                            minsize = self._adapt_batch_size(minsize, latency)
+                    self._batch_latencies.clear()
                 batch = []
+                batch_bytes = 0
                 no_block = False
         thaw_event_listener.cancel()
         get_listener.cancel()
 
+    def _adapt_batch_size(self, size, latency):
+        """
+        Compute the minimum size of the next batch from the processing time of the previous one.
+
+        Args:
+            size (int): The minimum size of the previous batch.
+            latency (float): The number of seconds the previous batch took to process.
+
+        Returns:
+            int: The minimum size of the next batch.
+        """
+        if latency < self.batch_latency / 2:
+            size *= 2
+        elif latency > self.batch_latency:
+            size = int(size * self.batch_latency / latency)
+        size = max(self.min_batch_size, min(self.max_batch_size, size))
+        log.debug(_("%(name)s - batch size %(size)d."), {"name": self, "size": size})
+        return size
+
+    async def _process_batches(self, process):
+        """
+        Process the batches of :meth:`batches` in the database threads, and put their items.
+
+        Up to ``STAGES_API_DB_BATCHES`` batches of the stage are processed at once. The items are
+        put in the order of their batches, once all the previous batches are processed.
+
+        When the pipeline runs within a transaction, the threads would not see the data it
+        changed, so the batches are processed one at a time on the event loop thread instead.
+
+        Args:
+            process (callable): A blocking callable, usually running ORM queries, called with each
+                batch.
+        """
+        self._batch_latencies = []
+        in_flight = deque()
+        try:
+            async for batch in self.batches():
+                in_flight.append((batch, asyncio.ensure_future(self._run_batch(process, batch))))
+                if len(in_flight) >= settings.STAGES_API_DB_BATCHES:
+                    await self._put_batch(*in_flight.popleft())
+            while in_flight:
+                await self._put_batch(*in_flight.popleft())
+        finally:
+            for batch, future in in_flight:
+                future.cancel()
+            self._batch_latencies = None
+
+    async def _run_batch(self, process, batch):
+        """
+        Run the processing of a batch in a database thread, and record how long it took.
+
+        Args:
+            process (callable): A blocking callable called with the batch.
+            batch (list): The batch of :class:`DeclarativeContent`.
+        """
+        if self._profile is not None:
+            process = self._profiled(process)
+
+        if connection.in_atomic_block:
+            started = time.monotonic()
+            process(batch)
+            self._record_batch(len(batch), time.monotonic() - started)
+            return
+
+        def run_blocking():
+            started = time.monotonic()
+            db_connection = _acquire_db_connection()
+            try:
+                process(batch)
+            finally:
+                _release_db_connection(db_connection)
+            return time.monotonic() - started
+
+        latency = await asyncio.get_event_loop().run_in_executor(get_db_executor(), run_blocking)
+        self._record_batch(len(batch), latency)
+
+    def _profiled(self, process):
+        """
+        Wrap the processing of a batch to record the number of database queries it runs.
+        """
+        profile = self._profile
+
+        def profiled(batch):
+            queries = 0
+
+            def count_query(execute, sql, params, many, context):
+                nonlocal queries
+                queries += 1
+                return execute(sql, params, many, context)
+
+            try:
+                with connection.execute_wrapper(count_query):
+                    process(batch)
+            finally:
+                profile.db_queries.record(queries)
+
+        return profiled
+
+    def _record_batch(self, size, latency):
+        self._batch_latencies.append((size, latency))
+        if self._profile is not None:
+            self._profile.batch_time.record(latency)
+
+    async def _put_batch(self, batch, future):
+        """
+        Wait for a batch to be processed, then put its items.
+
+        Args:
+            batch (list): The batch of :class:`DeclarativeContent`.
+            future (asyncio.Future): The processing of the batch.
+        """
+        await future
+        for item in batch:
+            await self.put(item)
+
     async def put(self, item):
         """
         Coroutine to pass items to the next stage.
@@ -172,14 +456,16 @@ class Stage:
         """
         if item is None:
             raise ValueError(_("(None) not permitted."))
+        started = time.monotonic()
         await self._out_q.put(item)
+        self._put_wait += time.monotonic() - started
         log.debug("{name} - put: {content}".format(name=self, content=item))
 
     def __str__(self):
         return "[{id}] {name}".format(id=id(self), name=self.__class__.__name__)
 
 
-async def create_pipeline(stages, maxsize=1000):
+async def create_pipeline(stages, maxsize=1000, maxbytes=None):
     """
     A coroutine that builds a Stages API linear pipeline from the list `stages` and runs it.
 
@@ -196,31 +482,40 @@ async def create_pipeline(stages, maxsize=1000):
     Args:
         stages (list of coroutines): A list of Stages API compatible coroutines.
         maxsize (int): The maximum amount of items a queue between two stages should hold. Optional
-            and defaults to 100.
+            and defaults to 1000.
+        maxbytes (int): The maximum approximate amount of memory, in bytes, the items of a queue
+            between two stages should take. Optional and defaults to the
+            ``STAGES_API_QUEUE_MAXBYTES`` setting.
 
     Returns:
         A single coroutine that can be used to run, wait, or cancel the entire pipeline with.
     Raises:
         ValueError: When a stage instance is specified more than once.
     """
+    if maxbytes is None:
+        maxbytes = settings.STAGES_API_QUEUE_MAXBYTES
     futures = []
     history = set()
     in_q = None
+    profiler = PipelineProfiler(stages) if settings.PROFILE_STAGES_API else None
     for i, stage in enumerate(stages):
         if stage in history:
             raise ValueError(_("Each stage instance must be unique."))
         history.add(stage)
+        if profiler:
+            stage._profile = profiler.stages[i]
         if i < len(stages) - 1:
-            if settings.PROFILE_STAGES_API:
-                out_q = ProfilingQueue.make_and_record_queue(stages[i + 1], i + 1, maxsize)
+            if profiler:
+                out_q = profiler.make_queue(i, maxsize, maxbytes)
             else:
-                out_q = asyncio.Queue(maxsize=maxsize)
+                out_q = MemoryBoundedQueue(maxsize=maxsize, maxbytes=maxbytes)
         else:
             out_q = None
         stage._connect(in_q, out_q)
         futures.append(asyncio.ensure_future(stage()))
         in_q = out_q
 
+    _start_pipeline()
     try:
         await asyncio.gather(*futures)
     except Exception:
@@ -234,6 +529,30 @@ async def create_pipeline(stages, maxsize=1000):
         if pending:
             await asyncio.wait(pending, timeout=60)
         raise
+    finally:
+        _finish_pipeline()
+        if profiler:
+            # Failing to save the profile must not hide the outcome of the pipeline.
+            try:
+                _save_profile(profiler.summary())
+            except Exception:
+                log.exception(_("Failed to save the profile of the pipeline."))
+
+
+def _save_profile(summary):
+    """
+    Append the profile of a pipeline to the `profile` of the current task, if there is one.
+
+    Args:
+        summary (dict): The summary of the :class:`~pulpcore.plugin.stages.PipelineProfiler`.
+    """
+    log.debug(_("Stages API profile: %(summary)s"), {"summary": summary})
+    task = Task.current()
+    if task is None:
+        return
+    profile = task.profile or {}
+    profile.setdefault("pipelines", []).append(summary)
+    Task.objects.filter(pk=task.pk).update(profile=profile)
 
 
 class EndStage(Stage):
@@ -32,7 +32,8 @@ class QueryExistingArtifacts(Stage):
     its :class:`~pulpcore.plugin.stages.DeclarativeArtifact` objects have been handled.
 
     This stage drains all available items from `self._in_q` and batches everything into one large
-    call to the db for efficiency.
+    call to the db for efficiency. The batches are queried in the database threads, see
+    :meth:`~pulpcore.plugin.stages.Stage._process_batches`.
     """
 
     async def run(self):
@@ -42,42 +43,47 @@ class QueryExistingArtifacts(Stage):
         Returns:
             The coroutine for this stage.
         """
-        async for batch in self.batches():
-            artifact_digests_by_type = defaultdict(list)
+        await self._process_batches(self._replace_existing_artifacts)
 
-            # For each unsaved artifact, check its digests in the order of COMMON_DIGEST_FIELDS
-            # and the first digest which is found is added to the list of digests of that type.
-            # We assume that in general only one digest is provided and that it will be
-            # sufficient to identify the Artifact.
-            for d_content in batch:
-                for d_artifact in d_content.d_artifacts:
-                    if d_artifact.artifact._state.adding:
-                        for digest_type in Artifact.COMMON_DIGEST_FIELDS:
-                            digest_value = getattr(d_artifact.artifact, digest_type)
-                            if digest_value:
-                                artifact_digests_by_type[digest_type].append(digest_value)
-                                break
-
-            # For each type of digest, fetch all the existing Artifacts where digest "in"
-            # the list we built earlier. Walk over all the artifacts again compare the
-            # digest of the new artifact to those of the existing ones - if one matches,
-            # swap it out with the existing one.
-            for digest_type, digests in artifact_digests_by_type.items():
-                query_params = {"{attr}__in".format(attr=digest_type): digests}
-                existing_artifacts = Artifact.objects.filter(**query_params).only(digest_type)
-
-                for d_content in batch:
-                    for d_artifact in d_content.d_artifacts:
-                        artifact_digest = getattr(d_artifact.artifact, digest_type)
-                        if artifact_digest:
-                            for result in existing_artifacts:
-                                result_digest = getattr(result, digest_type)
-                                if result_digest == artifact_digest:
-                                    d_artifact.artifact = result
-                                    break
+    @staticmethod
+    def _replace_existing_artifacts(batch):
+        """
+        Replace the unsaved artifacts of a batch with the saved ones with the same digest.
+
+        Args:
+            batch (list): List of :class:`~pulpcore.plugin.stages.DeclarativeContent`.
+        """
+        artifact_digests_by_type = defaultdict(list)
+
+        # For each unsaved artifact, check its digests in the order of COMMON_DIGEST_FIELDS
+        # and the first digest which is found is added to the list of digests of that type.
+        # We assume that in general only one digest is provided and that it will be
+        # sufficient to identify the Artifact.
+        for d_content in batch:
+            for d_artifact in d_content.d_artifacts:
+                if d_artifact.artifact._state.adding:
+                    for digest_type in Artifact.COMMON_DIGEST_FIELDS:
+                        digest_value = getattr(d_artifact.artifact, digest_type)
+                        if digest_value:
+                            artifact_digests_by_type[digest_type].append(digest_value)
+                            break
+
+        # For each type of digest, fetch all the existing Artifacts where digest "in"
+        # the list we built earlier and index them by digest. Walk over all the artifacts
+        # again and look up the digest of the new artifact - if one matches, swap it out
+        # with the existing one.
+        for digest_type, digests in artifact_digests_by_type.items():
+            query_params = {"{attr}__in".format(attr=digest_type): digests}
+            existing_artifacts = {
+                getattr(result, digest_type): result
+                for result in Artifact.objects.filter(**query_params).only(digest_type)
+            }
 
             for d_content in batch:
-                await self.put(d_content)
+                for d_artifact in d_content.d_artifacts:
+                    artifact_digest = getattr(d_artifact.artifact, digest_type)
+                    if artifact_digest and artifact_digest in existing_artifacts:
+                        d_artifact.artifact = existing_artifacts[artifact_digest]
 
 
 class ArtifactDownloader(Stage):
@@ -194,9 +200,18 @@ class ArtifactSaver(Stage):
     :class:`~pulpcore.plugin.stages.DeclarativeArtifact` objects have been handled.
 
     This stage drains all available items from `self._in_q` and batches everything into one large
-    call to the db for efficiency.
+    call to the db for efficiency. The batches are saved in the database threads, see
+    :meth:`~pulpcore.plugin.stages.Stage._process_batches`.
+
+    Attributes:
+        artifacts_missing_digests (list): The primary keys of the Artifacts handled which miss some
+            digests, downloaded while ``LAZY_ARTIFACT_DIGESTS`` is enabled.
     """
 
+    def __init__(self):
+        super().__init__()
+        self.artifacts_missing_digests = []
+
     async def run(self):
         """
         The coroutine for this stage.
@@ -204,25 +219,34 @@ class ArtifactSaver(Stage):
         Returns:
             The coroutine for this stage.
         """
-        async for batch in self.batches():
-            da_to_save = []
-            for d_content in batch:
-                for d_artifact in d_content.d_artifacts:
-                    if d_artifact.artifact._state.adding and not d_artifact.deferred_download:
-                        d_artifact.artifact.file = str(d_artifact.artifact.file)
-                        da_to_save.append(d_artifact)
-
-            if da_to_save:
-                for d_artifact, artifact in zip(
-                    da_to_save,
-                    Artifact.objects.bulk_get_or_create(
-                        d_artifact.artifact for d_artifact in da_to_save
-                    ),
-                ):
-                    d_artifact.artifact = artifact
+        await self._process_batches(self._save_artifacts)
 
-            for d_content in batch:
-                await self.put(d_content)
+    def _save_artifacts(self, batch):
+        """
+        Save the unsaved artifacts of a batch, or replace them with the existing ones.
+
+        Args:
+            batch (list): List of :class:`~pulpcore.plugin.stages.DeclarativeContent`.
+        """
+        da_to_save = []
+        for d_content in batch:
+            for d_artifact in d_content.d_artifacts:
+                if d_artifact.artifact._state.adding and not d_artifact.deferred_download:
+                    owned = d_artifact.artifact.file.owned
+                    d_artifact.artifact.file = str(d_artifact.artifact.file)
+                    d_artifact.artifact.file.owned = owned
+                    da_to_save.append(d_artifact)
+
+        if da_to_save:
+            for d_artifact, artifact in zip(
+                da_to_save,
+                Artifact.objects.bulk_get_or_create(
+                    d_artifact.artifact for d_artifact in da_to_save
+                ),
+            ):
+                d_artifact.artifact = artifact
+                if not all(getattr(artifact, digest) for digest in Artifact.DIGEST_FIELDS):
+                    self.artifacts_missing_digests.append(artifact.pk)
 
 
 class RemoteArtifactSaver(Stage):
@@ -230,7 +254,8 @@ class RemoteArtifactSaver(Stage):
     A Stage that saves :class:`~pulpcore.plugin.models.RemoteArtifact` objects
 
     An :class:`~pulpcore.plugin.models.RemoteArtifact` object is saved for each
-    :class:`~pulpcore.plugin.stages.DeclarativeArtifact`.
+    :class:`~pulpcore.plugin.stages.DeclarativeArtifact`. The batches are saved in the database
+    threads, see :meth:`~pulpcore.plugin.stages.Stage._process_batches`.
     """
 
     async def run(self):
@@ -240,10 +265,16 @@ class RemoteArtifactSaver(Stage):
         Returns:
             The coroutine for this stage.
         """
-        async for batch in self.batches():
-            RemoteArtifact.objects.bulk_get_or_create(self._needed_remote_artifacts(batch))
-            for d_content in batch:
-                await self.put(d_content)
+        await self._process_batches(self._save_remote_artifacts)
+
+    def _save_remote_artifacts(self, batch):
+        """
+        Save the :class:`~pulpcore.plugin.models.RemoteArtifact` objects missing for a batch.
+
+        Args:
+            batch (list): List of :class:`~pulpcore.plugin.stages.DeclarativeContent`.
+        """
+        RemoteArtifact.objects.bulk_get_or_create(self._needed_remote_artifacts(batch))
 
     def _needed_remote_artifacts(self, batch):
         """
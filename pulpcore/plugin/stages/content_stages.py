@@ -1,13 +1,37 @@
 from collections import defaultdict
 
 from django.db import IntegrityError, transaction
-from django.db.models import Q
+from django.db.models import Q, signals
 
-from pulpcore.plugin.models import ContentArtifact
+from pulpcore.plugin.models import ContentArtifact, MasterModel
 
 from .api import Stage
 
 
+def _bulk_savable(model):
+    """
+    Whether new content of a model can be saved with a bulk insert instead of save().
+
+    A bulk insert does not call save() nor send the pre_save and post_save signals, so it is only
+    used for models which do not rely on them.
+
+    Args:
+        model (:class:`~pulpcore.plugin.models.Content`): The content model.
+
+    Returns:
+        bool: True when new content of ``model`` can be saved in bulk.
+    """
+    if not hasattr(model._default_manager, "bulk_get_or_create_detail"):
+        return False
+    if model.save is not MasterModel.save:
+        return False
+    if signals.pre_save.has_listeners(model) or signals.post_save.has_listeners(model):
+        return False
+    return not any(
+        hasattr(attr, "_hooked") for klass in model.__mro__ for attr in vars(klass).values()
+    )
+
+
 class QueryExistingContents(Stage):
     """
     A Stages API stage that saves :attr:`DeclarativeContent.content` objects and saves its related
@@ -26,7 +50,8 @@ class QueryExistingContents(Stage):
     been handled.
 
     This stage drains all available items from `self._in_q` and batches everything into one large
-    call to the db for efficiency.
+    call to the db for efficiency. The batches are queried in the database threads, see
+    :meth:`~pulpcore.plugin.stages.Stage._process_batches`.
     """
 
     async def run(self):
@@ -36,31 +61,35 @@ class QueryExistingContents(Stage):
         Returns:
             The coroutine for this stage.
         """
-        async for batch in self.batches():
-            content_q_by_type = defaultdict(lambda: Q(pk__in=[]))
-            for d_content in batch:
-                if d_content.content._state.adding:
-                    model_type = type(d_content.content)
-                    unit_q = d_content.content.q()
-                    content_q_by_type[model_type] = content_q_by_type[model_type] | unit_q
-
-            for model_type in content_q_by_type.keys():
-                type_natural_key_fields = model_type.natural_key_fields()
-                for result in model_type.objects.filter(content_q_by_type[model_type]).iterator():
-                    for d_content in batch:
-                        if type(d_content.content) is not model_type:
-                            continue
-                        not_same_unit = False
-                        for field in type_natural_key_fields:
-                            in_memory_digest_value = getattr(d_content.content, field)
-                            if in_memory_digest_value != getattr(result, field):
-                                not_same_unit = True
-                                break
-                        if not_same_unit:
-                            continue
-                        d_content.content = result
-            for d_content in batch:
-                await self.put(d_content)
+        await self._process_batches(self._replace_existing_contents)
+
+    @staticmethod
+    def _replace_existing_contents(batch):
+        """
+        Replace the unsaved content units of a batch with the saved ones with the same unit key.
+
+        Args:
+            batch (list): List of :class:`~pulpcore.plugin.stages.DeclarativeContent`.
+        """
+        content_q_by_type = defaultdict(lambda: Q(pk__in=[]))
+        d_contents_by_type_and_key = defaultdict(lambda: defaultdict(list))
+        for d_content in batch:
+            if d_content.content._state.adding:
+                model_type = type(d_content.content)
+                unit_q = d_content.content.q()
+                content_q_by_type[model_type] = content_q_by_type[model_type] | unit_q
+                unit_key = tuple(
+                    getattr(d_content.content, field) for field in model_type.natural_key_fields()
+                )
+                d_contents_by_type_and_key[model_type][unit_key].append(d_content)
+
+        for model_type in content_q_by_type.keys():
+            type_natural_key_fields = model_type.natural_key_fields()
+            d_contents_by_key = d_contents_by_type_and_key[model_type]
+            for result in model_type.objects.filter(content_q_by_type[model_type]).iterator():
+                unit_key = tuple(getattr(result, field) for field in type_natural_key_fields)
+                for d_content in d_contents_by_key.get(unit_key, []):
+                    d_content.content = result
 
 
 class ContentSaver(Stage):
@@ -79,7 +108,9 @@ class ContentSaver(Stage):
     Each :class:`~pulpcore.plugin.stages.DeclarativeContent` is sent to after it has been handled.
 
     This stage drains all available items from `self._in_q` and batches everything into one large
-    call to the db for efficiency.
+    call to the db for efficiency. Unless the stage overrides :meth:`_pre_save` or
+    :meth:`_post_save`, the batches are saved in the database threads, see
+    :meth:`~pulpcore.plugin.stages.Stage._process_batches`.
     """
 
     async def run(self):
@@ -89,38 +120,90 @@ class ContentSaver(Stage):
         Returns:
             The coroutine for this stage.
         """
-        async for batch in self.batches():
-            content_artifact_bulk = []
-            with transaction.atomic():
-                await self._pre_save(batch)
-                for d_content in batch:
-                    # Are we saving to the database for the first time?
-                    content_already_saved = not d_content.content._state.adding
-                    if not content_already_saved:
-                        try:
-                            with transaction.atomic():
-                                d_content.content.save()
-                        except IntegrityError:
-                            d_content.content = d_content.content.__class__.objects.get(
-                                d_content.content.q()
-                            )
-                            continue
-                        for d_artifact in d_content.d_artifacts:
-                            if not d_artifact.artifact._state.adding:
-                                artifact = d_artifact.artifact
-                            else:
-                                # set to None for on-demand synced artifacts
-                                artifact = None
-                            content_artifact = ContentArtifact(
-                                content=d_content.content,
-                                artifact=artifact,
-                                relative_path=d_artifact.relative_path,
-                            )
-                            content_artifact_bulk.append(content_artifact)
-                ContentArtifact.objects.bulk_get_or_create(content_artifact_bulk)
-                await self._post_save(batch)
-            for declarative_content in batch:
-                await self.put(declarative_content)
+        if self._has_save_hooks():
+            async for batch in self.batches():
+                with transaction.atomic():
+                    await self._pre_save(batch)
+                    self._save_contents(batch)
+                    await self._post_save(batch)
+                for declarative_content in batch:
+                    await self.put(declarative_content)
+        else:
+            await self._process_batches(self._save_contents_atomically)
+
+    def _has_save_hooks(self):
+        """
+        Whether the stage overrides the hooks run on the event loop around the saving of a batch.
+
+        Returns:
+            bool: True if :meth:`_pre_save` or :meth:`_post_save` are overridden.
+        """
+        return (
+            type(self)._pre_save is not ContentSaver._pre_save
+            or type(self)._post_save is not ContentSaver._post_save
+        )
+
+    def _save_contents_atomically(self, batch):
+        """
+        Save the content units of a batch and their content artifacts in a transaction.
+
+        Args:
+            batch (list): List of :class:`~pulpcore.plugin.stages.DeclarativeContent`.
+        """
+        with transaction.atomic():
+            self._save_contents(batch)
+
+    @staticmethod
+    def _save_contents(batch):
+        """
+        Save the unsaved content units of a batch and their content artifacts.
+
+        Content units already existing replace the unsaved ones. The types of content are saved in
+        the order of their labels, so concurrent transactions lock the rows they conflict on in
+        the same order.
+
+        Args:
+            batch (list): List of :class:`~pulpcore.plugin.stages.DeclarativeContent`.
+        """
+        content_artifact_bulk = []
+        unsaved_by_type = defaultdict(list)
+        for d_content in batch:
+            # Are we saving to the database for the first time?
+            if d_content.content._state.adding:
+                unsaved_by_type[type(d_content.content)].append(d_content)
+
+        for model_type in sorted(unsaved_by_type, key=lambda model: model._meta.label):
+            d_contents = unsaved_by_type[model_type]
+            unsaved = [d_content.content for d_content in d_contents]
+            if _bulk_savable(model_type):
+                saved = model_type._default_manager.bulk_get_or_create_detail(unsaved)
+            else:
+                saved = []
+                for content in unsaved:
+                    try:
+                        with transaction.atomic():
+                            content.save()
+                    except IntegrityError:
+                        content = model_type.objects.get(content.q())
+                    saved.append(content)
+
+            for d_content, content in zip(d_contents, saved):
+                if content is not d_content.content:
+                    d_content.content = content
+                    continue
+                for d_artifact in d_content.d_artifacts:
+                    if not d_artifact.artifact._state.adding:
+                        artifact = d_artifact.artifact
+                    else:
+                        # set to None for on-demand synced artifacts
+                        artifact = None
+                    content_artifact = ContentArtifact(
+                        content=d_content.content,
+                        artifact=artifact,
+                        relative_path=d_artifact.relative_path,
+                    )
+                    content_artifact_bulk.append(content_artifact)
+        ContentArtifact.objects.bulk_get_or_create(content_artifact_bulk)
 
     async def _pre_save(self, batch):
         """
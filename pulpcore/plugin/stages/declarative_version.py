@@ -1,6 +1,9 @@
 import asyncio
 
-from pulpcore.plugin.tasking import WorkingDirectory
+from django.conf import settings
+
+from pulpcore.app.tasks import fill_missing_artifact_digests
+from pulpcore.plugin.tasking import WorkingDirectory, enqueue_with_reservation
 
 from .api import create_pipeline, EndStage
 from .artifact_stages import (
@@ -12,6 +15,9 @@ from .artifact_stages import (
 from .association_stages import ContentAssociation, ContentUnassociation
 from .content_stages import ContentSaver, QueryExistingContents, ResolveContentFutures
 
+# The maximum number of Artifacts whose digests are filled by each task dispatched by a sync.
+FILL_ARTIFACT_DIGESTS_BATCH_SIZE = 10000
+
 
 class DeclarativeVersion:
     def __init__(self, first_stage, repository, mirror=False):
@@ -146,3 +152,18 @@ class DeclarativeVersion:
                 stages.append(EndStage())
                 pipeline = create_pipeline(stages)
                 loop.run_until_complete(pipeline)
+
+        if settings.LAZY_ARTIFACT_DIGESTS:
+            artifact_pks = [
+                str(pk)
+                for stage in stages
+                if isinstance(stage, ArtifactSaver)
+                for pk in stage.artifacts_missing_digests
+            ]
+            # Only the Artifacts of this sync are filled, in tasks of a bounded size.
+            for i in range(0, len(artifact_pks), FILL_ARTIFACT_DIGESTS_BATCH_SIZE):
+                enqueue_with_reservation(
+                    fill_missing_artifact_digests,
+                    [],
+                    kwargs={"artifact_pks": artifact_pks[i : i + FILL_ARTIFACT_DIGESTS_BATCH_SIZE]},
+                )
@@ -87,6 +87,7 @@ class DeclarativeArtifact:
         # Custom downloaders may need extra information to complete the request.
         download_result = await downloader.run(extra_data=self.extra_data)
         self.artifact = Artifact(**download_result.artifact_attributes, file=download_result.path)
+        self.artifact.file.owned = download_result.owned
         return download_result
 
 
@@ -118,6 +119,7 @@ class DeclarativeContent:
         "_future",
         "_thaw_queue_event",
         "_resolved",
+        "_size",
     )
 
     def __init__(self, content=None, d_artifacts=None, extra_data=None):
@@ -129,6 +131,7 @@ class DeclarativeContent:
         self._future = None
         self._thaw_queue_event = None
         self._resolved = False
+        self._size = None
 
     @property
     def does_batch(self):
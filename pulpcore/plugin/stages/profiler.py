@@ -1,175 +1,238 @@
-from asyncio import Queue
-import pathlib
+import math
 import time
-import uuid
+from collections import deque
 
-from rq.job import get_current_job
+from .queues import MemoryBoundedQueue
 
-from pulpcore.tasking import connection
 
+class Histogram:
+    """
+    A histogram of positive values with log-scaled buckets, recording values in constant time.
 
-CONN = None
-
+    Each bucket spans values about 9% apart, so the percentiles are within 9% of the recorded
+    values, and values spanning a billion fold take no more than a few hundred buckets.
 
-class ProfilingQueue(Queue):
+    Attributes:
+        count (int): The number of values recorded.
+        total (float): The sum of the values recorded.
+        max (float): The largest value recorded.
     """
-    A customized subclass of asyncio.Queue that records time in the queue and between queues.
-
-    This Profiler records some data on items that are inserted and removed from Queues. This data is
-    stored on items in a dictionary attribute called 'extra_data'. If this attribute does not exist
-    on an item, the ProfileQueue adds it.
 
-    The following statistics are computed for each Queue and the stage that it feeds into:
+    _SCALE = 8 / math.log(2)
 
-        * waiting time - The number of seconds an item waited in the Queue for this stage.
-        * service time - The number of seconds an item received service in this stage.
-        * queue_length - The number of waiting items in the queue, measured before each new arrival.
-        * interarrival_time - The number of seconds since the previous arrival to this Queue.
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self._zeros = 0
+        self._buckets = {}
 
-    See the :meth:`create_profile_db_and_connection()` docs for more info on the database tables and
-    layout.
+    def record(self, value):
+        """
+        Record a value.
 
-    Args:
-         stage_uuid (uuid.UUID): The uuid of the stage this ProfilingQueue delivers work into.
-         args (tuple): unused positional arguments
-         kwargs (dict): unused keyword arguments
-    """
+        Args:
+            value (float): The value, values lower than or equal to 0 are recorded as 0.
+        """
+        self.count += 1
+        if value <= 0:
+            self._zeros += 1
+            return
+        self.total += value
+        if value > self.max:
+            self.max = value
+        index = math.floor(math.log(value) * self._SCALE)
+        self._buckets[index] = self._buckets.get(index, 0) + 1
+
+    def percentile(self, percent):
+        """
+        Get an upper bound of the value below which `percent` percent of the values are.
 
-    def __init__(self, stage_uuid, *args, **kwargs):
-        self.last_arrival_time = time.time()
-        self.stage_uuid = stage_uuid
-        return super().__init__(*args, **kwargs)
+        Args:
+            percent (float): The percentage, from 0 to 100.
 
-    def get_nowait(self):
+        Returns:
+            float: The upper bound of the bucket of the percentile, or 0 if no values were recorded.
         """
-        Thinly wrap `asyncio.get_nowait` and record when get_nowait() operations happen.
+        rank = math.ceil(self.count * percent / 100)
+        seen = self._zeros
+        if seen >= rank:
+            return 0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if seen >= rank:
+                return min(self.max, math.exp((index + 1) / self._SCALE))
+        return self.max
+
+    def summary(self):
         """
-        item = super().get_nowait()
-        if item:
-            now = time.time()
-            item.extra_data["last_waiting_time"] = now - item.extra_data["lastput_time"]
-            item.extra_data["last_get_time"] = now
-        return item
+        Summarize the histogram.
 
-    def put_nowait(self, item):
+        Returns:
+            dict: The `count`, `mean`, `p50`, `p90`, `p99` and `max` of the values.
         """
-        Thinly wrap `asyncio.put_nowait` happens and write statistics about them to the sqlite3 DB.
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
 
-        This method computes and writes the following statistics: waiting time, service time, queue
-        length, and interarrival time.
-        """
-        if item:
-            now = time.time()
-            if not hasattr(item, "extra_data"):
-                # track stages that use QuerySet items too
-                item.extra_data = {}
-            try:
-                last_waiting_time = item.extra_data["last_waiting_time"]
-            except KeyError:
-                pass
-            else:
-                service_time = now - item.extra_data["last_get_time"]
-                sql = (
-                    "INSERT INTO traffic (uuid, waiting_time, service_time) VALUES ("
-                    "'{uuid}','{waiting_time}','{service_time}')"
-                )
-                formatted_sql = sql.format(
-                    uuid=self.stage_uuid, waiting_time=last_waiting_time, service_time=service_time
-                )
-                CONN.cursor().execute(formatted_sql)
-
-            interarrival_time = now - self.last_arrival_time
-            sql = (
-                "INSERT INTO system (uuid, length, interarrival_time) VALUES ("
-                "'{uuid}','{length}','{interarrival}')"
-            )
-            formatted_sql = sql.format(
-                uuid=self.stage_uuid, length=super().qsize(), interarrival=interarrival_time
-            )
-            CONN.cursor().execute(formatted_sql)
-            CONN.commit()
-
-            item.extra_data["lastput_time"] = now
-            self.last_arrival_time = now
-        return super().put_nowait(item)
-
-    @staticmethod
-    def make_and_record_queue(stage, num, maxsize):
-        """
-        Create a ProfileQueue that is associated with the stage it feeds and record it in sqlite3.
 
-        Args:
-            stage (uuid.UUID): The uuid of this stage for correlation with other table data.
-            num: (int): The number in the pipeline this stage is at, starting from 0, 1, etc.
-            maxsize: The `maxsize` parameter being used to configure the ProfilingQueue with.
+class StageProfile:
+    """
+    The statistics of a stage of a pipeline.
+
+    Attributes:
+        name (str): The class name of the stage.
+        queue_wait (Histogram): The seconds the items waited in the queue of the stage.
+        queue_length (Histogram): The items waiting in the queue of the stage, measured when an
+            item arrives.
+        service_time (Histogram): The seconds from the stage getting an item to putting it in the
+            queue of the next stage, waiting for a batch and for room in the next queue included.
+        batch_size (Histogram): The items of the batches of the stage.
+        batch_time (Histogram): The seconds the stage took to process its batches in the database
+            threads.
+        db_queries (Histogram): The database queries of the batches processed in the database
+            threads.
+    """
+
+    def __init__(self, stage):
+        self.name = ".".join([stage.__class__.__module__, stage.__class__.__name__])
+        self.queue_wait = Histogram()
+        self.queue_length = Histogram()
+        self.service_time = Histogram()
+        self.batch_size = Histogram()
+        self.batch_time = Histogram()
+        self.db_queries = Histogram()
+        # The time items were got by the stage, keyed on the id of the item.
+        self._started = {}
+
+    def summary(self):
+        """
+        Summarize the statistics of the stage.
 
         Returns:
-            ProfilingQueue: The configured ProfilingQueue that was also recorded in the db.
+            dict: The `name` of the stage, and the summary of each histogram with data.
         """
-        if CONN is None:
-            create_profile_db_and_connection()
-        stage_id = uuid.uuid4()
-        stage_name = ".".join([stage.__class__.__module__, stage.__class__.__name__])
-        sql = "INSERT INTO stages (uuid, name, num) VALUES (" "'{uuid}','{stage}','{num}')"
-        formatted_sql = sql.format(uuid=stage_id, stage=stage_name, num=num)
-        CONN.cursor().execute(formatted_sql)
-        in_q = ProfilingQueue(stage_id, maxsize=maxsize)
-        CONN.commit()
-        return in_q
-
-
-def create_profile_db_and_connection():
+        summary = {"name": self.name}
+        for name in (
+            "queue_wait",
+            "queue_length",
+            "service_time",
+            "batch_size",
+            "batch_time",
+            "db_queries",
+        ):
+            histogram = getattr(self, name)
+            if histogram.count:
+                summary[name] = histogram.summary()
+        return summary
+
+
+class ProfilingQueue(MemoryBoundedQueue):
+    """
+    A MemoryBoundedQueue recording the statistics of the stages it connects in memory.
+
+    The following statistics are recorded for the stage the queue feeds, see
+    :class:`StageProfile`:
+
+        * queue wait - The number of seconds an item waited in the queue.
+        * queue length - The number of waiting items in the queue, measured before each arrival.
+
+    and for the stage putting items in the queue:
+
+        * service time - The number of seconds from the stage getting an item to putting it.
+
+    Recording a statistic takes a few operations on a :class:`Histogram`, cheap enough to profile
+    every pipeline.
+
+    Args:
+        producer (StageProfile): The profile of the stage putting items in the queue.
+        consumer (StageProfile): The profile of the stage getting items from the queue.
+        track_service (bool): Whether the consumer puts the items it gets in another queue, so its
+            service time is recorded.
+        args (tuple): The positional arguments of :class:`MemoryBoundedQueue`.
+        kwargs (dict): The keyword arguments of :class:`MemoryBoundedQueue`.
     """
-    Create a profile db from this tasks UUID and a sqlite3 connection to that databases.
 
-    The database produced has three tables with the following SQL format:
+    def __init__(self, producer, consumer, track_service=True, *args, **kwargs):
+        self.producer = producer
+        self.consumer = consumer
+        self.track_service = track_service
+        super().__init__(*args, **kwargs)
+
+    def _init(self, maxsize):
+        super()._init(maxsize)
+        self._put_times = deque()
+
+    def _put(self, item):
+        now = time.monotonic()
+        if item is not None:
+            self.consumer.queue_length.record(self.qsize())
+            started = self.producer._started.pop(id(item), None)
+            if started is not None:
+                self.producer.service_time.record(now - started)
+        self._put_times.append(now)
+        super()._put(item)
+
+    def _get(self):
+        item = super()._get()
+        now = time.monotonic()
+        put_time = self._put_times.popleft()
+        if item is not None:
+            self.consumer.queue_wait.record(now - put_time)
+            if self.track_service:
+                self.consumer._started[id(item)] = now
+        return item
 
-    The `stages` table stores info about the pipeline itself and stores 3 fields
-    * uuid - the uuid of the stage
-    * name - the name of the stage
-    * num - the number of the stage starting at 0
 
-    The `traffic` table stores 3 fields:
-    * uuid - the uuid of the stage this queue feeds into
-    * waiting_time - the amount of time the item is waiting in the queue before it enters the stage.
-    * service_time - the service time the item spent in the stage.
+class PipelineProfiler:
+    """
+    The profiler of a pipeline, holding the :class:`StageProfile` of each stage.
 
-    The `system` table stores 3 fields:
-    * uuid - The uuid of stage this queue feeds into
-    * length - The length of items in this queue, measured just before each arrival.
-    * interarrival_time - The amount of time since the last arrival.
+    Args:
+        stages (list): The stages of the pipeline.
+
+    Attributes:
+        stages (list): The :class:`StageProfile` of each stage, in pipeline order.
     """
-    debug_data_dir = "/var/lib/pulp/debug/"
-    pathlib.Path(debug_data_dir).mkdir(parents=True, exist_ok=True)
-    redis_conn = connection.get_redis_connection()
-    current_job = get_current_job(connection=redis_conn)
-    if current_job:
-        db_path = debug_data_dir + current_job.id
-    else:
-        db_path = debug_data_dir + uuid.uuid4()
-
-    import sqlite3
-
-    global CONN
-    CONN = sqlite3.connect(db_path)
-    c = CONN.cursor()
-
-    # Create table
-    c.execute(
-        """CREATE TABLE stages
-                 (uuid varchar(36), name text, num int)"""
-    )
-
-    # Create table
-    c.execute(
-        """CREATE TABLE traffic
-                 (uuid varchar(36), waiting_time real, service_time real)"""
-    )
-
-    # Create table
-    c.execute(
-        """CREATE TABLE system
-                 (uuid varchar(36), length int, interarrival_time real)"""
-    )
-
-    return CONN
+
+    def __init__(self, stages):
+        self.started = time.monotonic()
+        self.stages = [StageProfile(stage) for stage in stages]
+
+    def make_queue(self, num, maxsize, maxbytes=0):
+        """
+        Create the :class:`ProfilingQueue` between a stage and the next one.
+
+        Args:
+            num (int): The number of the stage putting items in the queue, starting from 0.
+            maxsize (int): The `maxsize` of the queue.
+            maxbytes (int): The `maxbytes` of the queue.
+
+        Returns:
+            ProfilingQueue: The queue recording the statistics of the two stages.
+        """
+        return ProfilingQueue(
+            self.stages[num],
+            self.stages[num + 1],
+            num + 2 < len(self.stages),
+            maxsize=maxsize,
+            maxbytes=maxbytes,
+        )
+
+    def summary(self):
+        """
+        Summarize the statistics of the pipeline.
+
+        Returns:
+            dict: The `duration` of the pipeline in seconds, and the summary of each stage in
+                `stages`.
+        """
+        return {
+            "duration": time.monotonic() - self.started,
+            "stages": [stage.summary() for stage in self.stages],
+        }
@@ -0,0 +1,102 @@
+import asyncio
+import collections
+import sys
+
+from django.db import models
+
+from .models import DeclarativeArtifact, DeclarativeContent
+
+_ATOMIC_TYPES = (str, bytes, bytearray, int, float, bool, type(None))
+_CONTAINER_TYPES = (list, tuple, set, frozenset)
+
+
+def approximate_size(item):
+    """
+    Approximate the number of bytes of memory an item passed between stages takes.
+
+    The size of :class:`~pulpcore.plugin.stages.DeclarativeContent` covers its content unit, its
+    :class:`~pulpcore.plugin.stages.DeclarativeArtifact` objects with their artifacts, and their
+    `extra_data`. Objects shared by many items, like remotes, and the related objects cached by
+    model instances are left out. The size of a DeclarativeContent is computed once, the first
+    time it is put in a queue.
+
+    Args:
+        item: An item passed between stages.
+
+    Returns:
+        int: The approximate number of bytes of the item.
+    """
+    if isinstance(item, DeclarativeContent):
+        if item._size is None:
+            item._size = _sizeof(item)
+        return item._size
+    return _sizeof(item)
+
+
+def _sizeof(item):
+    size = 0
+    seen = set()
+    objects = [item]
+    while objects:
+        obj = objects.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, _ATOMIC_TYPES):
+            continue
+        if isinstance(obj, dict):
+            objects.extend(obj.keys())
+            objects.extend(obj.values())
+        elif isinstance(obj, _CONTAINER_TYPES):
+            objects.extend(obj)
+        elif isinstance(obj, models.Model):
+            objects.extend(value for name, value in vars(obj).items() if name != "_state")
+        elif isinstance(obj, DeclarativeContent):
+            objects.extend((obj.content, obj.d_artifacts, obj.extra_data))
+        elif isinstance(obj, DeclarativeArtifact):
+            objects.extend((obj.artifact, obj.url, obj.relative_path, obj.extra_data))
+    return size
+
+
+class MemoryBoundedQueue(asyncio.Queue):
+    """
+    An :class:`asyncio.Queue` bounded by the approximate memory its items take.
+
+    A put waits while the queue holds `maxsize` items or more, or items taking `maxbytes` bytes or
+    more, see :func:`approximate_size`. A queue holding no items accepts an item larger than
+    `maxbytes`.
+
+    Args:
+        maxsize (int): The maximum number of items in the queue, unlimited if 0.
+        maxbytes (int): The maximum number of bytes of the items in the queue, unlimited if 0.
+
+    Attributes:
+        maxbytes (int): The maximum number of bytes of the items in the queue.
+        bytes (int): The approximate number of bytes of the items in the queue.
+    """
+
+    def __init__(self, maxsize=0, maxbytes=0):
+        super().__init__(maxsize=maxsize)
+        self.maxbytes = maxbytes
+        self.bytes = 0
+
+    def _init(self, maxsize):
+        super()._init(maxsize)
+        self._sizes = collections.deque()
+
+    def _put(self, item):
+        size = approximate_size(item) if self.maxbytes and item is not None else 0
+        self._sizes.append(size)
+        self.bytes += size
+        super()._put(item)
+
+    def _get(self):
+        self.bytes -= self._sizes.popleft()
+        return super()._get()
+
+    def full(self):
+        """
+        Return True if there are `maxsize` items or `maxbytes` bytes in the queue.
+        """
+        return super().full() or 0 < self.maxbytes <= self.bytes
@@ -0,0 +1,97 @@
+from unittest.mock import Mock, patch
+
+from django.test import TestCase
+
+from pulpcore.content.cache import (
+    ContentArtifactCache,
+    DistributionCache,
+    build_directory_index,
+)
+from pulpcore.plugin.models import BaseDistribution
+
+
+class DistributionCacheTestCase(TestCase):
+    def setUp(self):
+        self.distribution = BaseDistribution.objects.create(
+            name="d1", base_path="foo/bar", pulp_type="core.base"
+        )
+        self.cache = DistributionCache(BaseDistribution)
+
+    def test_get(self):
+        """Paths below a base path match its distribution, other paths do not."""
+        self.assertEqual(self.cache.get("foo/bar/baz").pk, self.distribution.pk)
+        self.assertEqual(self.cache.get("foo/bar/baz/qux").pk, self.distribution.pk)
+        self.assertIsNone(self.cache.get("foo/barbaz/qux"))
+        self.assertIsNone(self.cache.get("foo/bar"))
+        self.assertIsNone(self.cache.get("qux/baz"))
+
+    def test_get_cached(self):
+        """Matching a path again does not query the database."""
+        distribution = self.cache.get("foo/bar/baz")
+        with self.assertNumQueries(0):
+            self.assertIs(self.cache.get("foo/bar/qux"), distribution)
+            self.assertIsNone(self.cache.get("qux/baz"))
+
+    def test_invalidate(self):
+        """Changes are only seen once the cache is invalidated."""
+        self.cache.get("foo/bar/baz")
+        self.distribution.base_path = "foo/baz"
+        self.distribution.save()
+        self.assertIsNotNone(self.cache.get("foo/bar/baz"))
+        self.cache.invalidate()
+        self.assertIsNone(self.cache.get("foo/bar/baz"))
+        self.assertEqual(self.cache.get("foo/baz/qux").pk, self.distribution.pk)
+
+
+@patch("pulpcore.content.cache.caching_enabled", Mock(return_value=True))
+class ContentArtifactCacheTestCase(TestCase):
+    def setUp(self):
+        self.cache = ContentArtifactCache(maxsize=2)
+
+    def test_get(self):
+        """Content artifacts are fetched once, and the least recently used are evicted."""
+        ca1, ca2, ca3 = Mock(artifact_id=1), Mock(artifact_id=2), Mock(artifact_id=3)
+        self.assertIs(self.cache.get("a", Mock(return_value=ca1)), ca1)
+        self.assertIs(self.cache.get("b", Mock(return_value=ca2)), ca2)
+        fetch = Mock()
+        self.assertIs(self.cache.get("a", fetch), ca1)
+        fetch.assert_not_called()
+        self.cache.get("c", Mock(return_value=ca3))
+        self.assertIs(self.cache.get("a", fetch), ca1)
+        self.assertIs(self.cache.get("c", fetch), ca3)
+        fetch.assert_not_called()
+        self.cache.get("b", fetch)
+        fetch.assert_called_once_with()
+
+    def test_get_without_artifact(self):
+        """Content artifacts without an artifact are not cached."""
+        fetch = Mock(return_value=Mock(artifact_id=None))
+        self.cache.get("a", fetch)
+        self.cache.get("a", fetch)
+        self.assertEqual(fetch.call_count, 2)
+
+    def test_invalidate_during_fetch(self):
+        """Content artifacts fetched while the cache is invalidated are not cached."""
+        ca1, ca2 = Mock(artifact_id=1), Mock(artifact_id=2)
+
+        def fetch():
+            self.cache.invalidate()
+            return ca1
+
+        self.assertIs(self.cache.get("a", fetch), ca1)
+        self.assertIs(self.cache.get("a", Mock(return_value=ca2)), ca2)
+
+
+class BuildDirectoryIndexTestCase(TestCase):
+    def test_build_directory_index(self):
+        """Each directory lists its files and subdirectories."""
+        index = build_directory_index(["top.txt", "a/one.txt", "a/two.txt", "b/c/three.txt"])
+        self.assertEqual(
+            index,
+            {
+                "": {"top.txt", "a/", "b/"},
+                "a/": {"one.txt", "two.txt"},
+                "b/": {"c/"},
+                "b/c/": {"three.txt"},
+            },
+        )
@@ -1,9 +1,24 @@
-from unittest.mock import Mock
+import asyncio
+import hashlib
+import os
+import tempfile
+import threading
+from unittest.mock import Mock, patch
 
+from aiohttp.test_utils import make_mocked_request
+from aiohttp.web_exceptions import HTTPRequestRangeNotSatisfiable
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
 
+from pulpcore.app.tasks import fill_missing_artifact_digests
 from pulpcore.content import Handler
+from pulpcore.content.handler import (
+    FollowerLagging,
+    OffloadedDataHandler,
+    SharedDownload,
+    SharedDownloadReader,
+)
+from pulpcore.download import BaseDownloader, HttpDownloader
 from pulpcore.plugin.models import Artifact, Content, ContentArtifact
 
 
@@ -45,3 +60,287 @@ class HandlerSaveContentTestCase(TestCase):
         c2 = Content.objects.get(pk=self.c2.pk)
         self.assertEqual(existing_artifact.pk, new_artifact.pk)
         self.assertEqual(c2._artifacts.get().pk, existing_artifact.pk)
+
+    @patch("pulpcore.content.handler.enqueue_with_reservation")
+    def test_save_artifact_missing_digests(self, enqueue_with_reservation):
+        """A task filling the missing digests of the artifact is dispatched."""
+        cch = Handler()
+        cch._save_artifact(self.download_result_mock("c1"), self.ra1)
+        enqueue_with_reservation.assert_not_called()
+
+        download_result = self.download_result_mock("c2")
+        download_result.artifact_attributes = {"size": 0, "sha256": "def456"}
+        new_artifact = cch._save_artifact(download_result, self.ra2)
+        enqueue_with_reservation.assert_called_once_with(
+            fill_missing_artifact_digests, [], kwargs={"artifact_pks": [str(new_artifact.pk)]}
+        )
+
+
+class HandlerRunInDbThreadTestCase(TestCase):
+    def test_run_in_db_thread(self):
+        """Blocking calls are run outside of the event loop thread."""
+        cch = Handler()
+        loop = asyncio.get_event_loop()
+        thread_ident = loop.run_until_complete(cch._run_in_db_thread(threading.get_ident))
+        self.assertNotEqual(thread_ident, threading.get_ident())
+
+    def test_run_in_db_thread_exception(self):
+        """Exceptions raised by the blocking call are raised to the caller."""
+        cch = Handler()
+        loop = asyncio.get_event_loop()
+        with self.assertRaises(ZeroDivisionError):
+            loop.run_until_complete(cch._run_in_db_thread(divmod, 1, 0))
+
+
+class SharedDownloadTestCase(TestCase):
+    def test_follow(self):
+        """Followers receive all the data published, then the end of the download."""
+
+        async def run():
+            shared_download = SharedDownload()
+            queue = shared_download.follow()
+            shared_download.set_headers({"Content-Length": "6"})
+            await shared_download.publish(b"abc")
+            await shared_download.publish(b"def")
+            await shared_download.finish(None)
+            return [queue.get_nowait() for i in range(queue.qsize())], shared_download
+
+        data, shared_download = asyncio.get_event_loop().run_until_complete(run())
+        self.assertEqual(data, [b"abc", b"def", None])
+        self.assertTrue(shared_download.started)
+        self.assertEqual(shared_download.headers.result(), {"Content-Length": "6"})
+        self.assertIsNone(shared_download.result.result())
+
+    def test_fail(self):
+        """Followers receive the exception the download failed with."""
+
+        async def run():
+            shared_download = SharedDownload()
+            queue = shared_download.follow()
+            await shared_download.publish(b"abc")
+            shared_download.fail(ZeroDivisionError())
+            return [queue.get_nowait() for i in range(queue.qsize())], shared_download
+
+        data, shared_download = asyncio.get_event_loop().run_until_complete(run())
+        self.assertEqual(len(data), 1)
+        self.assertIsInstance(data[0], ZeroDivisionError)
+        with self.assertRaises(ZeroDivisionError):
+            shared_download.result.result()
+
+    def test_unfollow(self):
+        """Requests that stop following do not hold the download back."""
+
+        async def run():
+            shared_download = SharedDownload()
+            queue = shared_download.follow()
+            for i in range(shared_download.max_lag):
+                await shared_download.publish(b"abc")
+            shared_download.unfollow(queue)
+            await shared_download.publish(b"abc")
+            return queue, shared_download
+
+        queue, shared_download = asyncio.get_event_loop().run_until_complete(run())
+        self.assertTrue(queue.empty())
+        self.assertFalse(shared_download.has_followers)
+
+
+class SharedDownloadReplayTestCase(TestCase):
+    def setUp(self):
+        # Downloads are written to the current working directory.
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(directory.name)
+        self.chunks = [os.urandom(1000) for i in range(20)]
+
+    async def download(self, shared_download, data_handler):
+        for chunk in self.chunks:
+            await shared_download.publish(chunk)
+            await data_handler.handle_data(chunk)
+            await asyncio.sleep(0)
+        await data_handler.finalize()
+        shared_download.data_handler = None
+        await shared_download.finish(None)
+
+    async def read(self, reader):
+        data = []
+        try:
+            while True:
+                chunk = await reader.read()
+                if chunk is None:
+                    return b"".join(data)
+                data.append(chunk)
+        finally:
+            reader.close()
+
+    def test_replay(self):
+        """Late requests replay the data from the file, then follow the download."""
+
+        async def run():
+            shared_download = SharedDownload()
+            data_handler = OffloadedDataHandler(BaseDownloader("http://example.com"))
+            shared_download.data_handler = data_handler
+            await shared_download.publish(self.chunks[0])
+            await data_handler.handle_data(self.chunks[0])
+            reader = await shared_download.replay()
+            reader.chunk_size = 700
+            reader.catch_up = 2500
+            data, _ = await asyncio.gather(
+                self.read(reader), self.download(shared_download, data_handler)
+            )
+            return data, reader
+
+        data, reader = asyncio.get_event_loop().run_until_complete(run())
+        self.assertEqual(data, self.chunks[0] + b"".join(self.chunks))
+        self.assertIsNotNone(reader._queue)
+
+    def test_replay_complete(self):
+        """Requests replaying a download which completed meanwhile read the rest from the file."""
+
+        async def run():
+            shared_download = SharedDownload()
+            data_handler = OffloadedDataHandler(BaseDownloader("http://example.com"))
+            shared_download.data_handler = data_handler
+            await shared_download.publish(self.chunks[0])
+            await data_handler.handle_data(self.chunks[0])
+            reader = await shared_download.replay()
+            await self.download(shared_download, data_handler)
+            return await self.read(reader), reader
+
+        data, reader = asyncio.get_event_loop().run_until_complete(run())
+        self.assertEqual(data, self.chunks[0] + b"".join(self.chunks))
+        self.assertIsNone(reader._queue)
+
+    def test_lagging(self):
+        """Requests lagging behind the download replay the rest of it from the file."""
+
+        async def run():
+            shared_download = SharedDownload()
+            shared_download.max_lag = 4
+            data_handler = OffloadedDataHandler(BaseDownloader("http://example.com"))
+            shared_download.data_handler = data_handler
+            reader = SharedDownloadReader(shared_download)
+            first = await asyncio.gather(reader.read(), shared_download.publish(self.chunks[0]))
+            await data_handler.handle_data(self.chunks[0])
+            # The download does not wait for the reader.
+            await self.download(shared_download, data_handler)
+            self.assertFalse(shared_download.has_followers)
+            return first[0] + await self.read(reader)
+
+        data = asyncio.get_event_loop().run_until_complete(run())
+        self.assertEqual(data, self.chunks[0] + b"".join(self.chunks))
+
+    def test_lagging_unavailable(self):
+        """Requests lagging behind a download which cannot be replayed fail."""
+
+        async def run():
+            shared_download = SharedDownload()
+            shared_download.max_lag = 4
+            reader = SharedDownloadReader(shared_download)
+            for chunk in self.chunks:
+                await shared_download.publish(chunk)
+            await shared_download.finish(None)
+            return await self.read(reader)
+
+        with self.assertRaises(FollowerLagging):
+            asyncio.get_event_loop().run_until_complete(run())
+
+    def test_replay_unavailable(self):
+        """Downloads which are not written to a file cannot be replayed."""
+
+        async def run():
+            shared_download = SharedDownload()
+            await shared_download.publish(b"abc")
+            return await shared_download.replay()
+
+        self.assertIsNone(asyncio.get_event_loop().run_until_complete(run()))
+
+
+class HandlerConditionalRequestTestCase(TestCase):
+    def setUp(self):
+        self.handler = Handler()
+        self.headers = {"ETag": '"abc"', "Last-Modified": "Wed, 21 Oct 2015 07:28:00 GMT"}
+
+    def request(self, **headers):
+        return make_mocked_request("GET", "/", headers=headers)
+
+    def test_not_modified(self):
+        """Matching validators allow a "304 Not Modified" response."""
+        for headers in (
+            {"If-None-Match": '"abc"'},
+            {"If-None-Match": 'W/"abc", "def"'},
+            {"If-None-Match": "*"},
+            {"If-Modified-Since": "Wed, 21 Oct 2015 07:28:00 GMT"},
+        ):
+            self.assertTrue(self.handler._not_modified(self.request(**headers), self.headers))
+
+    def test_modified(self):
+        """Other validators require the full response."""
+        for headers in (
+            {},
+            {"If-None-Match": '"def"'},
+            {"If-None-Match": '"def"', "If-Modified-Since": "Wed, 21 Oct 2015 07:28:00 GMT"},
+            {"If-Modified-Since": "Tue, 20 Oct 2015 07:28:00 GMT"},
+        ):
+            self.assertFalse(self.handler._not_modified(self.request(**headers), self.headers))
+
+    def test_byte_range(self):
+        """The Range header is honored when the size is known and If-Range matches."""
+        byte_range = self.handler._byte_range
+        self.assertEqual(byte_range(self.request(Range="bytes=0-9"), '"abc"', 100), (0, 10))
+        self.assertEqual(byte_range(self.request(Range="bytes=90-"), '"abc"', 100), (90, 100))
+        self.assertEqual(byte_range(self.request(Range="bytes=-5"), '"abc"', 100), (95, 100))
+        self.assertEqual(byte_range(self.request(Range="bytes=90-200"), '"abc"', 100), (90, 100))
+        request = self.request(Range="bytes=0-9", **{"If-Range": '"abc"'})
+        self.assertEqual(byte_range(request, '"abc"', 100), (0, 10))
+
+    def test_byte_range_ignored(self):
+        """The whole content is served when the Range header cannot be honored."""
+        byte_range = self.handler._byte_range
+        self.assertIsNone(byte_range(self.request(), '"abc"', 100))
+        self.assertIsNone(byte_range(self.request(Range="bytes=0-9"), '"abc"', None))
+        self.assertIsNone(byte_range(self.request(Range="bytes=0-1,5-6"), '"abc"', 100))
+        request = self.request(Range="bytes=0-9", **{"If-Range": '"def"'})
+        self.assertIsNone(byte_range(request, '"abc"', 100))
+
+    def test_byte_range_not_satisfiable(self):
+        """Ranges beyond the content cannot be served."""
+        with self.assertRaises(HTTPRequestRangeNotSatisfiable):
+            self.handler._byte_range(self.request(Range="bytes=100-"), '"abc"', 100)
+
+
+class OffloadedDataHandlerTestCase(TestCase):
+    def test_handle_data(self):
+        """Data is written and hashed in order."""
+        chunks = [bytes([i]) * 1000 for i in range(20)]
+        with tempfile.TemporaryDirectory() as working_dir:
+            path = os.path.join(working_dir, "data")
+            downloader = BaseDownloader("http://example.com", custom_file_object=open(path, "wb"))
+
+            async def run():
+                data_handler = OffloadedDataHandler(downloader)
+                for chunk in chunks:
+                    await data_handler.handle_data(chunk)
+                await data_handler.finalize()
+
+            asyncio.get_event_loop().run_until_complete(run())
+            with open(path, "rb") as written:
+                self.assertEqual(written.read(), b"".join(chunks))
+        self.assertEqual(
+            downloader.artifact_attributes["sha256"], hashlib.sha256(b"".join(chunks)).hexdigest()
+        )
+        self.assertEqual(downloader.artifact_attributes["size"], 20000)
+
+    def test_offloadable(self):
+        """Downloaders handling data their own way are not offloaded."""
+
+        class CustomDownloader(HttpDownloader):
+            async def handle_data(self, data):
+                pass
+
+        self.assertTrue(
+            OffloadedDataHandler.offloadable(HttpDownloader("http://example.com", session=Mock()))
+        )
+        self.assertFalse(
+            OffloadedDataHandler.offloadable(CustomDownloader("http://example.com", session=Mock()))
+        )
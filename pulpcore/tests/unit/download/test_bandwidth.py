@@ -0,0 +1,48 @@
+import asyncio
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from pulpcore.download.bandwidth import TokenBucket
+
+
+class TokenBucketTestCase(SimpleTestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.clock = 0.0
+        patcher = patch("pulpcore.download.bandwidth.time.monotonic", lambda: self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.delays = []
+        patcher = patch("pulpcore.download.bandwidth.asyncio.sleep", self.sleep)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(asyncio.new_event_loop())
+
+    async def sleep(self, delay):
+        self.delays.append(delay)
+
+    def consume(self, bucket, *amounts):
+        for amount in amounts:
+            self.loop.run_until_complete(bucket.consume(amount))
+
+    def test_burst(self):
+        """Up to the capacity is consumed without waiting."""
+        bucket = TokenBucket(100, capacity=300)
+        self.consume(bucket, 100, 200)
+        self.assertEqual(self.delays, [])
+        self.consume(bucket, 50)
+        self.assertEqual(self.delays, [0.5])
+
+    def test_rate(self):
+        """Consumers wait in turn for the tokens they took, at the rate of the bucket."""
+        bucket = TokenBucket(100)
+        self.consume(bucket, 100, 100, 100)
+        self.assertEqual(self.delays, [1.0, 2.0])
+        self.clock = 10.0
+        self.consume(bucket, 100)
+        self.assertEqual(self.delays, [1.0, 2.0])
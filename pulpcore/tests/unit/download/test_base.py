@@ -0,0 +1,66 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+
+from django.test import SimpleTestCase, override_settings
+
+from pulpcore.download import BaseDownloader, DownloadResult
+
+
+class BaseDownloaderDigestsTestCase(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def download(self, chunks=(b"data",), **kwargs):
+        """Pass chunks of data through a downloader, and return the downloader."""
+        path = os.path.join(self.directory.name, "download")
+        with open(path, "wb") as file:
+            downloader = BaseDownloader("http://example.com", custom_file_object=file, **kwargs)
+            loop = asyncio.get_event_loop()
+            for chunk in chunks:
+                loop.run_until_complete(downloader.handle_data(chunk))
+            loop.run_until_complete(downloader.finalize())
+        return downloader
+
+    def test_all_digests(self):
+        """All the allowed digests are computed by default."""
+        attributes = self.download().artifact_attributes
+        self.assertEqual(attributes["sha512"], hashlib.sha512(b"data").hexdigest())
+        self.assertEqual(attributes["md5"], hashlib.md5(b"data").hexdigest())
+
+    @override_settings(LAZY_ARTIFACT_DIGESTS=True)
+    def test_lazy_digests(self):
+        """Only sha256 and the expected digests are computed with LAZY_ARTIFACT_DIGESTS."""
+        downloader = self.download(expected_digests={"md5": hashlib.md5(b"data").hexdigest()})
+        attributes = downloader.artifact_attributes
+        self.assertEqual(
+            attributes,
+            {
+                "size": 4,
+                "md5": hashlib.md5(b"data").hexdigest(),
+                "sha256": hashlib.sha256(b"data").hexdigest(),
+            },
+        )
+
+    def test_offloaded_digests(self):
+        """The digests of large chunks are computed in threads, in the order of the chunks."""
+        chunks = [bytes([i]) * BaseDownloader.hashing_offload_size for i in range(3)] + [b"end"]
+        downloader = self.download(chunks)
+        attributes = downloader.artifact_attributes
+        self.assertEqual(attributes["size"], len(b"".join(chunks)))
+        self.assertEqual(attributes["sha256"], hashlib.sha256(b"".join(chunks)).hexdigest())
+        self.assertEqual(attributes["sha1"], hashlib.sha1(b"".join(chunks)).hexdigest())
+        self.assertEqual(set(downloader.timings), {"network", "hash", "disk"})
+        self.assertGreater(downloader.timings["hash"], 0)
+        self.assertGreater(downloader.timings["disk"], 0)
+
+
+class DownloadResultTestCase(SimpleTestCase):
+    def test_owned_by_default(self):
+        """The files of downloaders building their own results may be moved into the storage."""
+        result = DownloadResult(
+            url="http://example.com", artifact_attributes={}, path="/tmp/download", headers=None
+        )
+        self.assertTrue(result.owned)
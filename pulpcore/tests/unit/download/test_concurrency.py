@@ -0,0 +1,136 @@
+import asyncio
+from unittest.mock import Mock, patch
+
+import aiohttp
+from django.test import SimpleTestCase
+
+from pulpcore.download.concurrency import AdaptiveSemaphore, is_congestion_error
+
+
+def response_error(status):
+    return aiohttp.ClientResponseError(Mock(), (), status=status)
+
+
+class AdaptiveSemaphoreTestCase(SimpleTestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.clock = 0.0
+        patcher = patch("pulpcore.download.concurrency.time.monotonic", lambda: self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(asyncio.new_event_loop())
+
+    def run_round(self, semaphore, duration=1.0, exc=None, sizes=None):
+        """
+        Acquire the semaphore up to its limit, then release it after `duration` seconds, reporting
+        the `sizes` of the downloads if they succeeded.
+        """
+
+        async def run():
+            count = semaphore.limit
+            for _ in range(count):
+                await semaphore.acquire()
+            self.clock += duration
+            for i in range(count):
+                if sizes and exc is None:
+                    semaphore.downloaded(sizes[i % len(sizes)])
+                semaphore.release(exc)
+
+        self.loop.run_until_complete(run())
+
+    def test_slow_start(self):
+        """The limit doubles while the downloads complete faster, up to the maximum."""
+        semaphore = AdaptiveSemaphore(10)
+        self.assertEqual(semaphore.limit, 4)
+        self.run_round(semaphore)
+        self.assertEqual(semaphore.limit, 8)
+        self.run_round(semaphore)
+        self.assertEqual(semaphore.limit, 10)
+        self.assertEqual(AdaptiveSemaphore(3).limit, 3)
+
+    def test_congestion_avoidance(self):
+        """Once the rate stops beating the best rate, the limit only grows by one."""
+        semaphore = AdaptiveSemaphore(16, initial=2)
+        self.run_round(semaphore, duration=1.0)
+        self.run_round(semaphore, duration=2.0)
+        self.assertEqual(semaphore.limit, 4)
+        self.run_round(semaphore, duration=1.0)
+        self.assertEqual(semaphore.limit, 5)
+
+    def test_best_rate(self):
+        """The limit only grows when the rate beats the best one, not just the previous one."""
+        semaphore = AdaptiveSemaphore(16, initial=4)
+        self.run_round(semaphore, duration=1.0)
+        self.assertEqual(semaphore.limit, 8)
+        # 8 downloads in 4 seconds, 2 per second.
+        self.run_round(semaphore, duration=4.0)
+        self.assertEqual(semaphore.limit, 8)
+        # 8 downloads in 2 seconds, faster than the previous round but not than the first one.
+        self.run_round(semaphore, duration=2.0)
+        self.assertEqual(semaphore.limit, 8)
+        self.run_round(semaphore, duration=1.0)
+        self.assertEqual(semaphore.limit, 9)
+
+    def test_uneven_sizes(self):
+        """The rate is measured in bytes, so rounds of small downloads do not grow the limit."""
+        semaphore = AdaptiveSemaphore(16, initial=4)
+        self.run_round(semaphore, duration=1.0, sizes=[1000000, 10, 10, 10])
+        self.assertEqual(semaphore.limit, 8)
+        # Twice as many downloads per second, but a thousandth of the bytes.
+        self.run_round(semaphore, duration=1.0, sizes=[100, 200])
+        self.assertEqual(semaphore.limit, 8)
+        # Fewer downloads per second, but more bytes.
+        self.run_round(semaphore, duration=2.0, sizes=[1000000, 1000000])
+        self.assertEqual(semaphore.limit, 9)
+
+    def test_congested(self):
+        """Congestion halves the limit once for the downloads already running."""
+        semaphore = AdaptiveSemaphore(16, initial=8)
+
+        async def run():
+            for _ in range(8):
+                await semaphore.acquire()
+            for _ in range(7):
+                semaphore.release(response_error(503))
+            self.assertEqual(semaphore.limit, 4)
+            semaphore.release()
+            await semaphore.acquire()
+            semaphore.release(asyncio.TimeoutError())
+            self.assertEqual(semaphore.limit, 2)
+
+        self.loop.run_until_complete(run())
+
+    def test_errors(self):
+        """Other errors leave the limit alone, and the limit is never lower than one."""
+        semaphore = AdaptiveSemaphore(4, initial=1)
+        self.run_round(semaphore, exc=response_error(404))
+        self.assertEqual(semaphore.limit, 1)
+        self.run_round(semaphore, exc=response_error(503))
+        self.assertEqual(semaphore.limit, 1)
+
+    def test_limit(self):
+        """Downloads wait for the running ones to release the semaphore."""
+        parent = asyncio.Semaphore(5)
+        semaphore = AdaptiveSemaphore(4, initial=2, semaphore=parent)
+        running = []
+
+        async def download(number):
+            async with semaphore:
+                running.append(number)
+                await asyncio.sleep(0)
+                self.assertLessEqual(semaphore._active, semaphore.limit)
+
+        self.loop.run_until_complete(asyncio.gather(*(download(i) for i in range(6))))
+        self.assertEqual(sorted(running), list(range(6)))
+        self.assertEqual(semaphore._active, 0)
+        self.assertEqual(parent._value, 5)
+
+    def test_is_congestion_error(self):
+        self.assertTrue(is_congestion_error(asyncio.TimeoutError()))
+        self.assertTrue(is_congestion_error(response_error(429)))
+        self.assertFalse(is_congestion_error(response_error(404)))
+        self.assertFalse(is_congestion_error(ValueError()))
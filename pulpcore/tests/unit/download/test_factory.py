@@ -0,0 +1,111 @@
+import asyncio
+import os
+import tempfile
+from unittest.mock import Mock, patch
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from django.test import SimpleTestCase, override_settings
+
+from pulpcore.download import DownloaderFactory
+
+
+def make_remote(**kwargs):
+    options = {
+        "ca_cert": None,
+        "client_cert": None,
+        "client_key": None,
+        "tls_validation": True,
+        "proxy_url": None,
+        "username": None,
+        "password": None,
+        "download_concurrency": 5,
+        "keep_alive": True,
+        "bandwidth_limit": None,
+    }
+    options.update(kwargs)
+    return Mock(**options)
+
+
+class DownloaderFactoryTestCase(SimpleTestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        # Downloads are written to the current working directory.
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(directory.name)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(asyncio.new_event_loop())
+
+    def download(self, remote, count):
+        """Download a file `count` times in a row, and return the factory and connector used."""
+
+        async def handler(request):
+            return web.Response(body=b"content")
+
+        async def run():
+            app = web.Application()
+            app.router.add_get("/file", handler)
+            server = TestServer(app)
+            await server.start_server()
+            factory = DownloaderFactory(remote)
+            connector = factory._session.connector
+            try:
+                for _ in range(count):
+                    await factory.build(str(server.make_url("/file"))).run()
+            finally:
+                await factory._session.close()
+                await server.close()
+            return factory, connector
+
+        return self.loop.run_until_complete(run())
+
+    def test_keep_alive(self):
+        """Connections are reused, up to download_concurrency per host."""
+        factory, connector = self.download(make_remote(), 3)
+        self.assertFalse(connector.force_close)
+        self.assertEqual(connector.limit_per_host, 5)
+        self.assertEqual(factory.connections_created, 1)
+        self.assertEqual(factory.connections_reused, 2)
+
+    def test_keep_alive_disabled(self):
+        """A new connection is created for each request when keep_alive is disabled."""
+        factory, connector = self.download(make_remote(keep_alive=False), 3)
+        self.assertTrue(connector.force_close)
+        self.assertEqual(factory.connections_created, 3)
+        self.assertEqual(factory.connections_reused, 0)
+
+    def build_factories(self, *remotes):
+        async def build():
+            factories = [DownloaderFactory(remote) for remote in remotes]
+            for factory in factories:
+                await factory._session.close()
+            return factories
+
+        return self.loop.run_until_complete(build())
+
+    def test_bandwidth_limit(self):
+        """The downloaders built share the bucket of the remote and the one of the worker."""
+        remote = make_remote(bandwidth_limit=100)
+        with override_settings(DOWNLOAD_BANDWIDTH_LIMIT=1000):
+            with patch("pulpcore.download.bandwidth.get_current_job", Mock):
+                factory, other = self.build_factories(remote, make_remote())
+        first = factory.build("http://example.com/first")
+        second = factory.build("https://example.org/second")
+        self.assertEqual([bucket.rate for bucket in first.buckets], [100, 1000])
+        self.assertEqual(first.buckets, second.buckets)
+        self.assertEqual(other._buckets, first.buckets[1:])
+
+    def test_bandwidth_limit_outside_tasks(self):
+        """Downloads outside of tasks are only limited per remote, across factories."""
+        remote = make_remote(bandwidth_limit=100)
+        with override_settings(DOWNLOAD_BANDWIDTH_LIMIT=1000):
+            factory, other = self.build_factories(
+                remote, make_remote(pk=remote.pk, bandwidth_limit=100)
+            )
+        self.assertEqual([bucket.rate for bucket in factory._buckets], [100])
+        self.assertEqual(other._buckets, factory._buckets)
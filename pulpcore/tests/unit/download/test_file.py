@@ -0,0 +1,42 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from pulpcore.app import settings
+from pulpcore.download import FileDownloader
+from pulpcore.exceptions import DigestValidationError
+
+
+class FileDownloaderTestCase(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "file")
+        self.data = os.urandom(3 * 1048576 + 10)
+        with open(self.path, "wb") as file:
+            file.write(self.data)
+        allowed_import_paths = patch.object(settings, "ALLOWED_IMPORT_PATHS", [directory.name])
+        allowed_import_paths.start()
+        self.addCleanup(allowed_import_paths.stop)
+
+    def test_run(self):
+        """The file is hashed in place, without being copied."""
+        downloader = FileDownloader("file://" + self.path)
+        result = asyncio.get_event_loop().run_until_complete(downloader.run())
+        self.assertEqual(result.path, self.path)
+        self.assertFalse(result.owned)
+        self.assertIsNone(downloader.path)
+        self.assertEqual(result.artifact_attributes["size"], len(self.data))
+        self.assertEqual(
+            result.artifact_attributes["sha256"], hashlib.sha256(self.data).hexdigest()
+        )
+
+    def test_run_invalid(self):
+        """The file is validated against the expected digests."""
+        downloader = FileDownloader("file://" + self.path, expected_digests={"sha256": "0" * 64})
+        with self.assertRaises(DigestValidationError):
+            asyncio.get_event_loop().run_until_complete(downloader.run())
@@ -0,0 +1,134 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from django.test import SimpleTestCase, override_settings
+
+from pulpcore.download import HttpDownloader
+from pulpcore.download.partial import get_partial_download_path
+from pulpcore.exceptions import DigestValidationError
+
+DATA = os.urandom(3 * 1048576 + 1000)
+
+
+class HttpDownloaderResumeTestCase(SimpleTestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        # Downloads are written to the current working directory.
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(directory.name)
+        settings = override_settings(WORKING_DIRECTORY=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.ranges = []
+        self.ignore_range = False
+        self.interrupts = []
+        self.server = None
+        self.downloaders = []
+
+    def tearDown(self):
+        if self.server is not None:
+            self.loop.run_until_complete(self.server.close())
+        self.loop.close()
+        asyncio.set_event_loop(asyncio.new_event_loop())
+
+    async def handler(self, request):
+        self.ranges.append(request.headers.get("Range"))
+        start = 0
+        if request.http_range.start and not self.ignore_range:
+            start = request.http_range.start
+        response = web.StreamResponse(status=206 if start else 200)
+        response.content_length = len(DATA) - start
+        if start:
+            response.headers["Content-Range"] = "bytes {}-{}/{}".format(
+                start, len(DATA) - 1, len(DATA)
+            )
+        await response.prepare(request)
+        if self.interrupts:
+            interrupt_at = self.interrupts.pop(0)
+            await response.write(DATA[start:interrupt_at])
+            await response.drain()
+            request.transport.close()
+            return response
+        await response.write(DATA[start:])
+        return response
+
+    def download(self, expected_digests=None, partial=b""):
+        expected_digests = expected_digests or {"sha256": hashlib.sha256(DATA).hexdigest()}
+
+        async def run():
+            if self.server is None:
+                app = web.Application()
+                app.router.add_get("/file", self.handler)
+                self.server = TestServer(app)
+                await self.server.start_server()
+            url = str(self.server.make_url("/file"))
+            self.partial_path = get_partial_download_path(url, expected_digests)
+            if partial:
+                os.makedirs(os.path.dirname(self.partial_path))
+                with open(self.partial_path, "wb") as f:
+                    f.write(partial)
+            async with aiohttp.ClientSession() as session:
+                downloader = HttpDownloader(url, session=session, expected_digests=expected_digests)
+                downloader.resume_tries = 1
+                # Failed downloaders are kept, so they are not closed by the garbage collector.
+                self.downloaders.append(downloader)
+                return await downloader.run()
+
+        return self.loop.run_until_complete(run())
+
+    def assert_downloaded(self, result):
+        with open(result.path, "rb") as f:
+            self.assertEqual(f.read(), DATA)
+        self.assertEqual(os.path.dirname(result.path), os.getcwd())
+        self.assertTrue(result.owned)
+        self.assertEqual(result.artifact_attributes["sha256"], hashlib.sha256(DATA).hexdigest())
+        self.assertFalse(os.path.exists(self.partial_path))
+
+    def test_download(self):
+        """A download without partial data is requested whole."""
+        self.assert_downloaded(self.download())
+        self.assertEqual(self.ranges, [None])
+
+    def test_resume(self):
+        """A download is resumed from the data of the partial download file."""
+        self.assert_downloaded(self.download(partial=DATA[:1500000]))
+        self.assertEqual(self.ranges, ["bytes=1500000-"])
+
+    def test_range_ignored(self):
+        """The download starts over when the server sends all of the data."""
+        self.ignore_range = True
+        self.assert_downloaded(self.download(partial=DATA[:1500000]))
+        self.assertEqual(self.ranges, ["bytes=1500000-"])
+
+    def test_interrupted(self):
+        """A transfer interrupted by a connection error is resumed."""
+        self.interrupts = [1048576 + 100]
+        self.assert_downloaded(self.download())
+        self.assertEqual(len(self.ranges), 2)
+        self.assertIsNone(self.ranges[0])
+        self.assertTrue(self.ranges[1].startswith("bytes="))
+
+    def test_failed(self):
+        """A download which failed is resumed by the next download of the url."""
+        self.interrupts = [1048576 + 100, 2 * 1048576 + 100]
+        with self.assertRaises(aiohttp.ClientError):
+            self.download()
+        self.assertTrue(os.path.exists(self.partial_path))
+        self.assert_downloaded(self.download())
+        self.assertEqual(len(self.ranges), 3)
+        self.assertTrue(self.ranges[2].startswith("bytes="))
+
+    def test_invalid(self):
+        """The partial download file is deleted when the download is invalid."""
+        with self.assertRaises(DigestValidationError):
+            self.download(expected_digests={"sha256": "0" * 64}, partial=b"not the data")
+        self.assertEqual(self.ranges, ["bytes=12-"])
+        self.assertFalse(os.path.exists(self.partial_path))
@@ -1,9 +1,13 @@
+import hashlib
 import os
 import tempfile
+from unittest.mock import MagicMock, patch
 
 from django.core.files.storage import default_storage as storage
 from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
+from pulpcore.app.tasks import fill_missing_artifact_digests
 from pulpcore.plugin.models import (
     Artifact,
     Content,
@@ -72,6 +76,39 @@ class PulpTemporaryFileTestCase(TestCase):
         assert b"temp file test" in temp_file.file.read()
 
 
+class ArtifactFillMissingDigestsTestCase(TestCase):
+    def test_fill_missing_digests(self):
+        """The digests which are not set are computed from the file and stored."""
+        artifact = Artifact.objects.create(
+            file=SimpleUploadedFile("artifact", b"data"),
+            size=4,
+            sha256=hashlib.sha256(b"data").hexdigest(),
+        )
+        filled = artifact.fill_missing_digests()
+
+        self.assertIn("sha512", filled)
+        self.assertNotIn("sha256", filled)
+        artifact = Artifact.objects.get(pk=artifact.pk)
+        self.assertEqual(artifact.sha512, hashlib.sha512(b"data").hexdigest())
+        self.assertEqual(artifact.fill_missing_digests(), [])
+
+    @patch("pulpcore.app.tasks.artifact.ProgressReport", MagicMock())
+    def test_fill_missing_artifact_digests(self):
+        """The task only fills the digests of the artifacts it is given."""
+        artifacts = [
+            Artifact.objects.create(
+                file=SimpleUploadedFile("artifact", data),
+                size=len(data),
+                sha256=hashlib.sha256(data).hexdigest(),
+            )
+            for data in (b"data", b"other data")
+        ]
+        fill_missing_artifact_digests(artifact_pks=[str(artifacts[0].pk)])
+
+        self.assertIsNotNone(Artifact.objects.get(pk=artifacts[0].pk).sha512)
+        self.assertIsNone(Artifact.objects.get(pk=artifacts[1].pk).sha512)
+
+
 class ArtifactAlgorithmTestCase(TestCase):
     def test_set_forbidden(self):
         # This will only fire on a Pulp instance that has forbidden md5 in settings.py
@@ -80,3 +117,37 @@ class ArtifactAlgorithmTestCase(TestCase):
                 a = Artifact(md5="asdf")  # noqa
         else:
             pass
+
+
+class BulkGetOrCreateTestCase(TestCase):
+    def setUp(self):
+        self.content = Content.objects.create(pulp_type="core.content")
+        self.existing = ContentArtifact.objects.create(content=self.content, relative_path="a")
+
+    def test_bulk_get_or_create(self):
+        """Conflicting objects are replaced by the existing ones, the others are inserted."""
+        objs = [
+            ContentArtifact(content=self.content, relative_path=relative_path)
+            for relative_path in ("a", "b", "c", "b")
+        ]
+        with self.assertNumQueries(2):
+            saved = ContentArtifact.objects.bulk_get_or_create(objs)
+
+        self.assertEqual(saved[0].pk, self.existing.pk)
+        self.assertIs(saved[1], objs[1])
+        self.assertIs(saved[2], objs[2])
+        self.assertEqual(saved[3].pk, objs[1].pk)
+        self.assertFalse(objs[1]._state.adding)
+        self.assertEqual(ContentArtifact.objects.filter(content=self.content).count(), 3)
+
+    def test_bulk_get_or_create_without_conflicts(self):
+        """Objects are inserted with a single query when none exist."""
+        objs = [
+            ContentArtifact(content=self.content, relative_path=relative_path)
+            for relative_path in ("b", "c")
+        ]
+        with self.assertNumQueries(1):
+            saved = ContentArtifact.objects.bulk_get_or_create(objs)
+
+        self.assertEqual(saved, objs)
+        self.assertEqual(ContentArtifact.objects.filter(content=self.content).count(), 3)
@@ -1,6 +1,7 @@
 from itertools import compress
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from pulpcore.app.models import RepositoryVersionContentSnapshot
 from pulpcore.plugin.models import Content, Repository, RepositoryVersion
 
 
@@ -105,6 +106,16 @@ class RepositoryVersionTestCase(TestCase):
             self.repository.latest_version(), latest_version, msg="Empty version1 must not exist."
         )
 
+    def test_changes_through_another_instance(self):
+        """Verify changes not made through the finalized instance are detected."""
+        version1 = self.repository.new_version()
+        RepositoryVersion.objects.get(pk=version1.pk).add_content(self.content_qs(self.pks[:1]))
+        with version1:
+            pass
+
+        self.assertEqual(self.repository.latest_version(), version1)
+        self.verify_content_sets(version1, content=[1], added=[1], removed=[])
+
     def test_remove_add(self):
         """Verify that removing and then adding content units is handled properly."""
         with self.repository.new_version() as version1:
@@ -183,6 +194,57 @@ class RepositoryVersionTestCase(TestCase):
             version2, content=[1, 1, 0, 1, 0], added=[0, 1, 0, 1, 0], removed=[0, 0, 1, 0, 1]
         )
 
+    def test_undone_changes(self):
+        """Verify a version whose changes were all undone is not kept."""
+        with self.repository.new_version() as version1:
+            version1.add_content(self.content_qs(self.pks[:2]))
+
+        with self.repository.new_version() as version2:
+            version2.add_content(self.content_qs(self.pks[2:3]))
+            version2.remove_content(self.content_qs(self.pks[:1]))
+            version2.remove_content(self.content_qs(self.pks[2:3]))
+            version2.add_content(self.content_qs(self.pks[:1]))
+            self.assertFalse(version2._has_changes())
+
+        self.assertFalse(RepositoryVersion.objects.filter(pk=version2.pk).exists())
+        self.assertEqual(self.repository.latest_version(), version1)
+
+    def test_add_and_remove_content_queries(self):
+        """Verify content is added and removed with a constant number of queries."""
+        with self.repository.new_version() as version1:
+            with self.assertNumQueries(2):
+                version1.add_content(self.content_qs(self.pks))
+            with self.assertNumQueries(2):
+                version1.remove_content(self.content_qs(self.pks[:2]))
+            self.verify_content_sets(
+                version1, content=[0, 0, 1, 1, 1], added=[0, 0, 1, 1, 1], removed=[]
+            )
+
+    def counts(self, version):
+        return {(c.count_type, c.content_type): c.count for c in version.counts.all()}
+
+    def test_counts(self):
+        """Verify the counts are derived from the counts of the previous version."""
+        with self.repository.new_version() as version1:
+            version1.add_content(self.content_qs(self.pks[:3]))
+        self.assertDictEqual(
+            self.counts(version1), {("A", "core.content"): 3, ("P", "core.content"): 3}
+        )
+
+        with self.repository.new_version() as version2:
+            version2.remove_content(self.content_qs(self.pks[:1]))
+            version2.add_content(self.content_qs(self.pks[3:]))
+        self.assertDictEqual(
+            self.counts(version2),
+            {("A", "core.content"): 2, ("P", "core.content"): 4, ("R", "core.content"): 1},
+        )
+
+        # The present count is recounted when the previous version has no counts.
+        version2.counts.all().delete()
+        with self.repository.new_version() as version3:
+            version3.remove_content(self.content_qs(self.pks[1:]))
+        self.assertDictEqual(self.counts(version3), {("R", "core.content"): 4})
+
     @staticmethod
     def pks_of_next_qs(qs_generator):
         """Iterate qs_generator one step and return the list of pks in the qs."""
@@ -213,6 +275,34 @@ class RepositoryVersionTestCase(TestCase):
         with self.assertRaises(StopIteration):
             self.pks_of_next_qs(qs_generator)
 
+    def test_content_batch_qs_ordering_ties(self):
+        """Verify content_batch_qs() on an ordering with ties, broken by the primary key."""
+        contents = Content.objects.filter(pk__in=self.pks[:5])
+        with self.repository.new_version() as version1:
+            version1.add_content(contents)
+
+        # All content has the same pulp_type, the batches are ordered by decreasing pk.
+        reverse_pks = sorted(self.pks[:5], reverse=True)
+        qs_generator = version1.content_batch_qs(order_by_params=("pulp_type", "-pk"), batch_size=2)
+        self.assertListEqual(self.pks_of_next_qs(qs_generator), reverse_pks[:2])
+        self.assertListEqual(self.pks_of_next_qs(qs_generator), reverse_pks[2:4])
+        self.assertListEqual(self.pks_of_next_qs(qs_generator), reverse_pks[4:])
+        with self.assertRaises(StopIteration):
+            self.pks_of_next_qs(qs_generator)
+
+    def test_content_batch_qs_nullable_ordering(self):
+        """Verify content_batch_qs() on an ordering by a nullable field holding nulls."""
+        contents = Content.objects.filter(pk__in=self.pks[:5])
+        with self.repository.new_version() as version1:
+            version1.add_content(contents)
+        Content.objects.filter(pk__in=self.pks[:2]).update(pulp_last_updated=None)
+
+        qs_generator = version1.content_batch_qs(
+            order_by_params=("pulp_last_updated", "pk"), batch_size=2
+        )
+        pks = [pk for qs in qs_generator for pk in qs.values_list("pk", flat=True)]
+        self.assertCountEqual(pks, self.pks[:5])
+
     def test_content_batch_qs_using_filter(self):
         """Verify that a plugin can define a filtering query set for content_batch_qs()."""
         contents = Content.objects.filter(pk__in=self.pks[:4])
@@ -231,6 +321,37 @@ class RepositoryVersionTestCase(TestCase):
             self.pks_of_next_qs(qs_generator)
 
 
+@override_settings(REPOSITORY_VERSION_CONTENT_SNAPSHOTS=True)
+class RepositoryVersionContentSnapshotTestCase(RepositoryVersionTestCase):
+    """Run the RepositoryVersion tests on versions with content snapshots."""
+
+    def test_content_snapshot(self):
+        """Verify the snapshot is stored and used once the version is complete."""
+        with self.repository.new_version() as version1:
+            version1.add_content(self.content_qs(self.pks[:3]))
+            self.assertFalse(version1._has_content_snapshot())
+
+        snapshot = RepositoryVersionContentSnapshot.objects.get(repository_version=version1)
+        self.assertListEqual(snapshot.content_ids, sorted(self.pks[:3]))
+
+        version1 = RepositoryVersion.objects.get(pk=version1.pk)
+        self.assertTrue(version1._has_content_snapshot())
+        self.assertTrue(version1.contains(Content.objects.get(pk=self.pks[0])))
+        self.assertFalse(version1.contains(Content.objects.get(pk=self.pks[3])))
+        self.verify_content_sets(version1, content=[1, 1, 1], added=[1, 1, 1], removed=[])
+
+    def test_content_snapshot_disabled(self):
+        """Verify snapshots are not looked up while the setting is off."""
+        with self.repository.new_version() as version1:
+            version1.add_content(self.content_qs(self.pks[:3]))
+
+        version1 = RepositoryVersion.objects.select_related("repository").get(pk=version1.pk)
+        with override_settings(REPOSITORY_VERSION_CONTENT_SNAPSHOTS=False):
+            with self.assertNumQueries(1):
+                self.assertEqual(version1.content.count(), 3)
+            self.assertFalse(version1._has_content_snapshot())
+
+
 class RepositoryTestCase(TestCase):
     def setUp(self):
         self.repository = Repository.objects.create()
@@ -0,0 +1,79 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+from pulpcore.plugin.models import Artifact
+
+
+class FileSystemTestCase(TestCase):
+    def setUp(self):
+        self.path = self.create_file()
+
+    def create_file(self, directory=None):
+        directory = tempfile.TemporaryDirectory(dir=directory)
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "file")
+        with open(path, "wb") as file:
+            file.write(os.urandom(1024))
+        with open(path, "rb") as file:
+            self.data = file.read()
+        return path
+
+    def save_artifact(self, owned=True):
+        artifact = Artifact.init_and_validate(self.path)
+        artifact.file = self.path
+        artifact.file.owned = owned
+        artifact.save()
+        self.addCleanup(artifact.delete)
+        return artifact
+
+    def assert_saved(self, artifact):
+        with artifact.file.open("rb"):
+            self.assertEqual(artifact.file.read(), self.data)
+
+    def test_copy(self):
+        """Files outside of MEDIA_ROOT are copied into the artifact storage."""
+        artifact = self.save_artifact()
+        with open(self.path, "rb") as source, artifact.file.open("rb"):
+            self.assertEqual(artifact.file.read(), source.read())
+        self.assertNotEqual(os.stat(artifact.file.path).st_ino, os.stat(self.path).st_ino)
+
+    @override_settings(ARTIFACT_HARDLINKS=True)
+    def test_hardlink(self):
+        """Files outside of MEDIA_ROOT are hard linked with ARTIFACT_HARDLINKS."""
+        artifact = self.save_artifact()
+        if os.stat(artifact.file.path).st_dev != os.stat(self.path).st_dev:
+            self.skipTest("The temporary directory is on another filesystem.")
+        self.assertEqual(os.stat(artifact.file.path).st_ino, os.stat(self.path).st_ino)
+
+    def test_move(self):
+        """Files owned by Pulp in MEDIA_ROOT are moved into the artifact storage."""
+        os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
+        self.path = self.create_file(settings.MEDIA_ROOT)
+        artifact = self.save_artifact()
+        self.assert_saved(artifact)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_not_owned_in_media_root(self):
+        """Files in MEDIA_ROOT not owned by Pulp, e.g. read from a file:// remote, are copied."""
+        os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
+        self.path = self.create_file(settings.MEDIA_ROOT)
+        artifact = self.save_artifact(owned=False)
+        self.assert_saved(artifact)
+        with open(self.path, "rb") as source:
+            self.assertEqual(source.read(), self.data)
+
+    def test_media_root_sibling(self):
+        """Files in a directory whose path starts with the path of MEDIA_ROOT are copied."""
+        directory = os.path.dirname(self.path)
+        media_root = override_settings(MEDIA_ROOT=os.path.join(directory, "pulp"))
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        os.makedirs(os.path.join(directory, "pulp-mirror"))
+        self.path = os.path.join(directory, "pulp-mirror", "file")
+        os.rename(os.path.join(directory, "file"), self.path)
+        artifact = self.save_artifact()
+        self.assert_saved(artifact)
+        self.assertTrue(os.path.exists(self.path))
@@ -0,0 +1,140 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+from unittest.mock import Mock
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+
+from pulpcore.plugin.download import DownloadResult
+from pulpcore.plugin.models import Artifact, Content
+from pulpcore.plugin.stages import (
+    ArtifactSaver,
+    DeclarativeArtifact,
+    DeclarativeContent,
+    QueryExistingArtifacts,
+)
+
+
+class QueryExistingArtifactsTestCase(TestCase):
+    def test_query_existing_artifacts(self):
+        """Unsaved artifacts are replaced by the saved artifacts with the same digest."""
+        existing = [
+            Artifact.objects.create(
+                size=i,
+                file=SimpleUploadedFile("artifact-{}".format(i), b""),
+                sha256="{:064d}".format(i),
+                md5=str(i),
+            )
+            for i in range(3)
+        ]
+        d_contents = [
+            DeclarativeContent(
+                content=Content(),
+                d_artifacts=[
+                    DeclarativeArtifact(
+                        artifact=Artifact(**digests),
+                        url="http://example.com",
+                        relative_path="a",
+                        remote=Mock(),
+                    )
+                ],
+            )
+            for digests in ({"sha256": "{:064d}".format(1)}, {"md5": "2"}, {"sha256": "3" * 64})
+        ]
+
+        in_q, out_q = asyncio.Queue(), asyncio.Queue()
+        for d_content in d_contents:
+            in_q.put_nowait(d_content)
+        in_q.put_nowait(None)
+        stage = QueryExistingArtifacts()
+        stage._connect(in_q, out_q)
+        asyncio.get_event_loop().run_until_complete(stage())
+
+        artifacts = [d_content.d_artifacts[0].artifact for d_content in d_contents]
+        self.assertEqual(artifacts[0].pk, existing[1].pk)
+        self.assertEqual(artifacts[1].pk, existing[2].pk)
+        self.assertTrue(artifacts[2]._state.adding)
+        self.assertEqual(out_q.qsize(), 4)
+
+
+class ArtifactSaverTestCase(TestCase):
+    def test_not_owned_file(self):
+        """Files the downloader did not create are left in place, even within MEDIA_ROOT."""
+        os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
+        directory = tempfile.TemporaryDirectory(dir=settings.MEDIA_ROOT)
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "file")
+        data = os.urandom(1024)
+        with open(path, "wb") as file:
+            file.write(data)
+
+        async def run(**kwargs):
+            return DownloadResult(
+                url="file://" + path,
+                artifact_attributes={"size": len(data), "sha256": hashlib.sha256(data).hexdigest()},
+                path=path,
+                headers=None,
+                owned=False,
+            )
+
+        remote = Mock()
+        remote.get_downloader.return_value.run = run
+        d_artifact = DeclarativeArtifact(
+            artifact=Artifact(), url="file://" + path, relative_path="file", remote=remote
+        )
+        d_content = DeclarativeContent(content=Content(), d_artifacts=[d_artifact])
+        asyncio.get_event_loop().run_until_complete(d_artifact.download())
+
+        in_q, out_q = asyncio.Queue(), asyncio.Queue()
+        in_q.put_nowait(d_content)
+        in_q.put_nowait(None)
+        stage = ArtifactSaver()
+        stage._connect(in_q, out_q)
+        asyncio.get_event_loop().run_until_complete(stage())
+
+        artifact = Artifact.objects.get(pk=d_artifact.artifact.pk)
+        self.addCleanup(artifact.delete)
+        with open(path, "rb") as source, artifact.file.open("rb"):
+            self.assertEqual(source.read(), data)
+            self.assertEqual(artifact.file.read(), data)
+
+    def test_artifacts_missing_digests(self):
+        """The saved artifacts missing digests are recorded."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        paths = []
+        for i in range(2):
+            paths.append(os.path.join(directory.name, str(i)))
+            open(paths[i], "wb").close()
+        complete = {digest: "0" * 8 for digest in Artifact.DIGEST_FIELDS}
+        d_contents = [
+            DeclarativeContent(
+                content=Content(),
+                d_artifacts=[
+                    DeclarativeArtifact(
+                        artifact=Artifact(file=paths[i], size=0, **digests),
+                        url="http://example.com",
+                        relative_path="a",
+                        remote=Mock(),
+                    )
+                ],
+            )
+            for i, digests in enumerate(({"sha256": "1" * 64}, dict(complete, sha256="2" * 64)))
+        ]
+
+        in_q, out_q = asyncio.Queue(), asyncio.Queue()
+        for d_content in d_contents:
+            in_q.put_nowait(d_content)
+        in_q.put_nowait(None)
+        stage = ArtifactSaver()
+        stage._connect(in_q, out_q)
+        asyncio.get_event_loop().run_until_complete(stage())
+
+        artifact = d_contents[0].d_artifacts[0].artifact
+        self.addCleanup(artifact.delete)
+        self.addCleanup(d_contents[1].d_artifacts[0].artifact.delete)
+        self.assertFalse(artifact._state.adding)
+        self.assertEqual(stage.artifacts_missing_digests, [artifact.pk])
@@ -1,9 +1,21 @@
 import asyncio
+import threading
+import time
+import unittest
 
 import asynctest
 import mock
+from django.test import override_settings
 
-from pulpcore.plugin.stages import Stage, EndStage, DeclarativeContent
+from pulpcore.plugin.stages import (
+    DeclarativeContent,
+    EndStage,
+    Histogram,
+    MemoryBoundedQueue,
+    Stage,
+    approximate_size,
+    create_pipeline,
+)
 
 
 class TestStage(asynctest.TestCase):
@@ -137,3 +149,234 @@ class TestMultipleStages(asynctest.TestCase):
                     last_stage._connect(queues[1], queues[2])
                     end_stage._connect(queues[2], None)
                     await asyncio.gather(last_stage(), middle_stage(), first_stage(), end_stage())
+
+
+class TestMemoryBoundedQueue(asynctest.TestCase):
+    def test_approximate_size(self):
+        """The size of a DeclarativeContent covers its extra_data, and is computed once."""
+        small = DeclarativeContent(mock.Mock())
+        large = DeclarativeContent(mock.Mock(), extra_data={"metadata": "x" * 100000})
+        self.assertGreater(approximate_size(large), approximate_size(small) + 100000)
+        size = approximate_size(large)
+        large.extra_data["more"] = "x" * 100000
+        self.assertEqual(approximate_size(large), size)
+
+    async def test_maxbytes(self):
+        """Puts wait while the items in the queue take maxbytes, unless the queue is empty."""
+        queue = MemoryBoundedQueue(maxsize=10, maxbytes=150000)
+        queue.put_nowait(DeclarativeContent(mock.Mock(), extra_data={"data": "x" * 200000}))
+        self.assertTrue(queue.full())
+        put = asyncio.ensure_future(queue.put(DeclarativeContent(mock.Mock())))
+        await asyncio.sleep(0)
+        self.assertFalse(put.done())
+        await queue.get()
+        await put
+        self.assertEqual(queue.qsize(), 1)
+        self.assertFalse(queue.full())
+        await queue.get()
+        self.assertEqual(queue.bytes, 0)
+
+    async def test_batches_maxbytes(self):
+        """Batches are yielded once their items take as much memory as the queue may hold."""
+        queue = MemoryBoundedQueue(maxbytes=150000)
+        stage = Stage()
+        stage._connect(queue, None)
+        contents = [
+            DeclarativeContent(mock.Mock(), extra_data={"data": "x" * 100000}) for i in range(3)
+        ]
+
+        async def produce():
+            for content in contents:
+                await queue.put(content)
+
+        producer = asyncio.ensure_future(produce())
+        batch_it = stage.batches()
+        self.assertEqual(contents[:2], await batch_it.__anext__())
+        await producer
+
+
+class TestAdaptiveBatchSize(unittest.TestCase):
+    def setUp(self):
+        self.stage = Stage()
+
+    def test_grow(self):
+        """Batches processed in less than half of batch_latency double, up to max_batch_size."""
+        self.assertEqual(self.stage._adapt_batch_size(500, 0.1), 1000)
+        self.assertEqual(self.stage._adapt_batch_size(500, 0.7), 500)
+        self.assertEqual(self.stage._adapt_batch_size(8000, 0.1), 10000)
+
+    def test_shrink(self):
+        """Batches processed in more than batch_latency shrink, down to min_batch_size."""
+        self.assertEqual(self.stage._adapt_batch_size(500, 2.0), 250)
+        self.assertEqual(self.stage._adapt_batch_size(500, 1000.0), 10)
+
+
+class TestAdaptiveBatches(asynctest.TestCase):
+    async def test_put_wait(self):
+        """The time waiting for the next stage does not count as processing time."""
+        in_q, out_q = asyncio.Queue(), asyncio.Queue(maxsize=1)
+        stage = Stage()
+        stage.initial_batch_size = stage.min_batch_size = stage.max_batch_size = 2
+        stage.batch_latency = 0.04
+        stage._connect(in_q, out_q)
+
+        async def produce():
+            for i in range(4):
+                in_q.put_nowait(mock.Mock())
+                in_q.put_nowait(mock.Mock())
+                await asyncio.sleep(0.01)
+            in_q.put_nowait(None)
+
+        async def process():
+            async for batch in stage.batches():
+                for item in batch:
+                    await stage.put(item)
+
+        async def consume():
+            for i in range(8):
+                await asyncio.sleep(0.03)
+                out_q.get_nowait()
+
+        with mock.patch.object(stage, "_adapt_batch_size", wraps=stage._adapt_batch_size) as adapt:
+            await asyncio.gather(produce(), process(), consume())
+        self.assertTrue(adapt.call_args_list)
+        for call in adapt.call_args_list:
+            self.assertLess(call[0][1], stage.batch_latency)
+
+
+class TestProcessBatches(asynctest.TestCase):
+    async def test_process_batches(self):
+        """Batches are processed in threads, at most STAGES_API_DB_BATCHES at once, in order."""
+        in_q, out_q = asyncio.Queue(), asyncio.Queue()
+        stage = Stage()
+        stage.initial_batch_size = stage.min_batch_size = stage.max_batch_size = 2
+        stage._connect(in_q, out_q)
+        items = [mock.Mock() for i in range(10)]
+        running = []
+        overlapping = []
+        lock = threading.Lock()
+
+        def process(batch):
+            with lock:
+                running.append(batch)
+                overlapping.append(len(running))
+            # The first batches take longest, so later batches finish first.
+            time.sleep(0.01 * (10 - items.index(batch[0])))
+            with lock:
+                running.remove(batch)
+
+        async def produce():
+            for i in range(0, 10, 2):
+                in_q.put_nowait(items[i])
+                in_q.put_nowait(items[i + 1])
+                await asyncio.sleep(0.005)
+            in_q.put_nowait(None)
+
+        with override_settings(STAGES_API_DB_BATCHES=2):
+            await asyncio.gather(produce(), stage._process_batches(process))
+        self.assertEqual([out_q.get_nowait() for i in range(10)], items)
+        self.assertEqual(max(overlapping), 2)
+
+    async def test_db_connections(self):
+        """Threads keep their connection open until the pipeline finishes."""
+        local = threading.local()
+        db_connections = []
+        closed = []
+
+        def get_connection(alias):
+            if not hasattr(local, "connection"):
+                local.connection = mock.Mock(errors_occurred=False)
+                db_connections.append(local.connection)
+            return local.connection
+
+        class ProducerStage(Stage):
+            async def run(self):
+                for i in range(20):
+                    await self.put(mock.Mock())
+
+        class ProcessStage(Stage):
+            initial_batch_size = min_batch_size = max_batch_size = 2
+
+            async def run(self):
+                def process(batch):
+                    closed.extend(c for c in db_connections if c.close.called)
+
+                await self._process_batches(process)
+
+        stages = [ProducerStage(), ProcessStage(), EndStage()]
+        with mock.patch("pulpcore.plugin.stages.api.connections") as connections:
+            connections.__getitem__.side_effect = get_connection
+            await create_pipeline(stages)
+        self.assertFalse(closed)
+        self.assertTrue(db_connections)
+        for db_connection in db_connections:
+            db_connection.close.assert_called_once_with()
+
+
+class TestHistogram(unittest.TestCase):
+    def test_percentiles(self):
+        """Percentiles are within the precision of the buckets."""
+        histogram = Histogram()
+        for i in range(1, 1001):
+            histogram.record(i / 1000)
+        summary = histogram.summary()
+        self.assertEqual(summary["count"], 1000)
+        self.assertAlmostEqual(summary["mean"], 0.5005)
+        self.assertAlmostEqual(summary["p50"], 0.5, delta=0.05)
+        self.assertAlmostEqual(summary["p90"], 0.9, delta=0.09)
+        self.assertAlmostEqual(summary["p99"], 0.99, delta=0.09)
+        self.assertEqual(summary["max"], 1.0)
+
+    def test_zeros(self):
+        histogram = Histogram()
+        self.assertEqual(histogram.percentile(50), 0)
+        for value in (0, 0, 0, 5):
+            histogram.record(value)
+        self.assertEqual(histogram.percentile(50), 0)
+        self.assertEqual(histogram.percentile(100), 5)
+
+
+class TestProfiler(asynctest.TestCase):
+    class ProducerStage(Stage):
+        async def run(self):
+            for i in range(20):
+                await self.put(mock.Mock())
+
+    class BatchStage(Stage):
+        async def run(self):
+            async for batch in self.batches(minsize=5):
+                for item in batch:
+                    await self.put(item)
+
+    async def test_profile(self):
+        """The statistics of each stage are recorded and saved at the end of the pipeline."""
+        stages = [self.ProducerStage(), self.BatchStage(), EndStage()]
+        with override_settings(PROFILE_STAGES_API=True):
+            with mock.patch("pulpcore.plugin.stages.api._save_profile") as save_profile:
+                await create_pipeline(stages)
+        summary = save_profile.call_args[0][0]
+        producer, batch, end = summary["stages"]
+        self.assertTrue(producer["name"].endswith("ProducerStage"))
+        self.assertNotIn("queue_wait", producer)
+        self.assertEqual(batch["queue_wait"]["count"], 20)
+        self.assertEqual(batch["service_time"]["count"], 20)
+        batch_size = batch["batch_size"]
+        self.assertAlmostEqual(batch_size["mean"] * batch_size["count"], 20)
+        self.assertEqual(end["queue_length"]["count"], 20)
+        self.assertNotIn("service_time", end)
+        self.assertFalse(stages[1]._profile._started)
+
+    async def test_profile_save_failure(self):
+        """Failing to save the profile does not hide the error of the pipeline."""
+
+        class FailingStage(Stage):
+            async def run(self):
+                raise ValueError("pipeline error")
+
+        stages = [self.ProducerStage(), FailingStage(), EndStage()]
+        with override_settings(PROFILE_STAGES_API=True):
+            with mock.patch(
+                "pulpcore.plugin.stages.api._save_profile", side_effect=RuntimeError("save error")
+            ):
+                with self.assertRaisesRegex(ValueError, "pipeline error"):
+                    await create_pipeline(stages)